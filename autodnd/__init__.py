@@ -0,0 +1,58 @@
+"""The D&D 5e rules as processed tables, and the indexes and tools built over them.
+
+The public API is loaded lazily: `from autodnd import roll_dice` only imports the module defining roll_dice,
+pandas, pyarrow, numpy and requests are only imported by the first name that needs them.
+"""
+
+import importlib
+from typing import Any
+
+# Public name -> module defining it
+_exports = {
+    "RuleSet": "autodnd.utils.ruleset_enum",
+    "roll_dice": "autodnd.utils.game_utils",
+    "compile_dice": "autodnd.utils.dice",
+    "roll_many": "autodnd.utils.dice",
+    "distribution": "autodnd.utils.dice",
+    "expected_value": "autodnd.utils.dice",
+    "download_files": "autodnd.utils.fetch_tools",
+    "load": "autodnd.utils.dataset_cache",
+    "load_json": "autodnd.utils.dataset_cache",
+    "open_table": "autodnd.tables",
+    "read_frame": "autodnd.tables",
+    "run_pipeline": "autodnd.pipeline",
+    "build_index": "autodnd.search",
+    "get_index": "autodnd.search",
+    "build_context": "autodnd.context",
+    "find_monsters": "autodnd.monsters",
+    "get_monster_index": "autodnd.monsters",
+    "find_spells": "autodnd.spells",
+    "get_spell_index": "autodnd.spells",
+    "build_encounters": "autodnd.encounters",
+    "simulate_duel": "autodnd.simulation",
+    "sweep_weapons": "autodnd.simulation",
+    "level_progression": "autodnd.progression",
+    "get_progression_table": "autodnd.progression",
+    "resolve_character": "autodnd.characters",
+    "get_character_resolver": "autodnd.characters",
+    "get_prerequisite_graph": "autodnd.prerequisites",
+    "get_query_index": "autodnd.server",
+    "get_sources": "autodnd.utils.sources",
+    "get_layered_index": "autodnd.layers",
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name: str) -> Any:
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    # Later accesses are plain module attribute lookups
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
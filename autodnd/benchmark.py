@@ -0,0 +1,470 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import autodnd
+from autodnd.pipeline import STAGES, Stage, select_stages
+from autodnd.utils.backend import backend_env_var, backends as backend_names
+from autodnd.utils.project_root import get_project_root
+from autodnd.utils.ruleset_enum import RuleSet
+
+# folder where the benchmark results and the baseline they're gated against are saved
+benchmark_folder = get_project_root() / "data" / "benchmarks"
+
+# Small SRD shaped source JSONs the benchmark scales by default, so it runs the same on any checkout and
+# doesn't need the SRD downloaded
+fixture_folder = get_project_root() / "tests" / "fixtures" / "jsonrules"
+
+# How many times the source JSONs are replicated, the fixtures have a handful of records per table
+default_scales = (1, 100, 1000)
+
+# A stage regresses when it takes this fraction more time (or memory) than in the baseline...
+default_threshold = 0.25
+
+# ...and at least this much more, below that it's noise of the timer and the allocator
+min_seconds = 0.05
+min_rss_mib = 16.0
+
+# Top level fields made unique in the synthetic copies of a record
+unique_fields = ("index", "name", "url")
+
+# Closed sets of records the stages check against hand written tables, these are never scaled
+fixed_sources = (RuleSet.DAMAGE_TYPES,)
+
+# Dependencies an import must not pull in unless the imported name needs them
+heavy_modules = ("numpy", "pandas", "pyarrow", "requests")
+
+# Public names of the package that must import without any heavy module, for the CLI tools and the short lived
+# workers that only roll dice or look up a ruleset
+light_names = ("RuleSet", "roll_dice", "compile_dice", "download_files")
+
+# Times every import is repeated in a fresh interpreter, the fastest counts
+import_repeats = 5
+
+# Times `from autodnd import <name>` in a fresh interpreter, and lists the heavy modules it imported
+_import_runner = """
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "heavy": [i for i in sys.argv[2:] if i in sys.modules]}))
+"""
+
+# Run in a fresh interpreter per stage so the peak RSS is the stage's own. pandas and pyarrow are imported
+# before the clock starts since every stage needs them anyway
+_runner = """
+import json, resource, runpy, sys, time
+import pandas, pyarrow.parquet
+start = time.perf_counter()
+runpy.run_path(sys.argv[1], run_name="__main__")
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": seconds, "peak_rss_mib": rss / (1024**2 if sys.platform == "darwin" else 1024)}))
+"""
+
+
+def scale_records(records: list[Any], factor: int) -> list[Any]:
+    """The records followed by factor - 1 synthetic copies, their index, name and url suffixed with the copy.
+
+    References between the tables keep pointing at the original records, so every stage resolves them as
+    usual and only has factor times more rows to go through.
+    """
+    scaled = list(records)
+    for copy in range(1, factor):
+        for record in records:
+            if isinstance(record, dict):
+                record = {
+                    i: f"{j} ({copy})"
+                    if i in unique_fields and isinstance(j, str)
+                    else j
+                    for i, j in record.items()
+                }
+            scaled.append(record)
+    return scaled
+
+
+def make_root(
+    root: Path,
+    factor: int,
+    sources: Iterable[RuleSet],
+    source_folder: Path = fixture_folder,
+) -> dict[RuleSet, int]:
+    """Lay out a copy of the project under root with the source JSONs of source_folder scaled by factor.
+
+    The stages write next to the code they run from (see autodnd.utils.project_root), so the code is copied
+    too and the processed data of the project is never touched. Returns the number of records per source.
+    """
+    ignore = shutil.ignore_patterns("__pycache__")
+    for folder in ("autodnd", "scripts"):
+        shutil.copytree(get_project_root() / folder, root / folder, ignore=ignore)
+    (root / "data" / "jsonrules").mkdir(parents=True)
+
+    counts = {}
+    for ruleset in sources:
+        records = json.loads((source_folder / f"{ruleset.value}.json").read_text())
+        scaled = scale_records(records, 1 if ruleset in fixed_sources else factor)
+        (root / "data" / "jsonrules" / f"{ruleset.value}.json").write_text(
+            json.dumps(scaled)
+        )
+        counts[ruleset] = len(scaled)
+    return counts
+
+
+def run_stage(
+    root: Path, stage: Stage, backend: Optional[str] = None
+) -> dict[str, Any]:
+    """Run one stage script of the project copy under root and measure it, on a backend if one is given."""
+    env = {**os.environ, "PYTHONPATH": str(root)}
+    if backend is not None:
+        env[backend_env_var] = backend
+    result = subprocess.run(
+        [sys.executable, "-c", _runner, str(root / "scripts" / stage.script)],
+        cwd=root,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Stage {stage.name} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark(
+    scales: Iterable[int] = default_scales,
+    targets: Optional[Iterable[RuleSet]] = None,
+    source_folder: Path = fixture_folder,
+) -> list[dict[str, Any]]:
+    """Wall time, peak RSS and throughput of the target stages (all by default) at every scale.
+
+    The upstream stages of a target run too, they're needed for its input. A stage that fails is recorded with
+    its error and its dependents are left out at that scale.
+    """
+    stages = select_stages(targets, STAGES)
+    sources = sorted(
+        {i for stage in stages for i in stage.sources}, key=lambda x: x.value
+    )
+    results = []
+    for factor in scales:
+        with tempfile.TemporaryDirectory(prefix="autodnd-benchmark-") as folder:
+            root = Path(folder)
+            counts = make_root(root, factor, sources, source_folder)
+            failed: set[RuleSet] = set()
+            for stage in stages:
+                if failed.intersection(stage.upstream):
+                    failed.add(stage.output)
+                    continue
+                row: dict[str, Any] = {"stage": stage.name, "scale": factor}
+                try:
+                    row.update(run_stage(root, stage))
+                except RuntimeError as error:
+                    failed.add(stage.output)
+                    row["error"] = str(error)
+                    results.append(row)
+                    print(f"{stage.name:<22} x{factor:<4} failed")
+                    continue
+                row["input_rows"] = sum(counts[i] for i in stage.sources)
+                row["output_rows"] = pq.read_metadata(
+                    root / "data" / "processed" / f"{stage.name}.parquet"
+                ).num_rows
+                row["rows_per_second"] = row["input_rows"] / max(row["seconds"], 1e-9)
+                results.append(row)
+                print(
+                    f"{stage.name:<22} x{factor:<4} {row['seconds']:8.3f}s "
+                    f"{row['peak_rss_mib']:8.1f} MiB {row['rows_per_second']:12.0f} rows/s"
+                )
+    return results
+
+
+def backend_stages(stages: Iterable[Stage] = STAGES) -> list[Stage]:
+    """The stages running list operations on a backend of autodnd.utils.backend, stage specs included."""
+    return [
+        i
+        for i in stages
+        if any(
+            j in (get_project_root() / "scripts" / i.script).read_text()
+            for j in ("get_backend(", "run_spec(")
+        )
+    ]
+
+
+def backend_benchmark(
+    scales: Iterable[int] = default_scales,
+    targets: Optional[Iterable[RuleSet]] = None,
+    backends: Iterable[str] = tuple(backend_names),
+    source_folder: Path = fixture_folder,
+) -> list[dict[str, Any]]:
+    """Wall time and peak RSS of the backend stages (or the targets) on every backend, at every scale.
+
+    Every backend runs the stages and their upstream on the same scaled sources. The output of a stage on each
+    backend is compared with the one of the reference backend (first in backends), "identical" says if they
+    match. Like in benchmark, a stage that fails is recorded with its error and its dependents are left out.
+    """
+    stages = select_stages(
+        [i.output for i in backend_stages()] if targets is None else targets, STAGES
+    )
+    measured = {i.output for i in backend_stages(stages)}
+    sources = sorted(
+        {i for stage in stages for i in stage.sources}, key=lambda x: x.value
+    )
+    results = []
+    for factor in scales:
+        with tempfile.TemporaryDirectory(prefix="autodnd-benchmark-") as folder:
+            root = Path(folder)
+            counts = make_root(root, factor, sources, source_folder)
+            reference: dict[RuleSet, pa.Table] = {}
+            for backend in backends:
+                failed: set[RuleSet] = set()
+                for stage in stages:
+                    if failed.intersection(stage.upstream):
+                        failed.add(stage.output)
+                        continue
+                    row: dict[str, Any] = {
+                        "stage": stage.name,
+                        "scale": factor,
+                        "backend": backend,
+                    }
+                    try:
+                        row.update(run_stage(root, stage, backend))
+                    except RuntimeError as error:
+                        failed.add(stage.output)
+                        row["error"] = str(error)
+                        results.append(row)
+                        print(f"{stage.name:<22} x{factor:<4} {backend:<8} failed")
+                        continue
+                    if stage.output not in measured:
+                        continue
+                    output = pq.read_table(
+                        root / "data" / "processed" / f"{stage.name}.parquet"
+                    )
+                    reference.setdefault(stage.output, output)
+                    row["identical"] = output.equals(reference[stage.output])
+                    row["input_rows"] = sum(counts[i] for i in stage.sources)
+                    row["rows_per_second"] = row["input_rows"] / max(
+                        row["seconds"], 1e-9
+                    )
+                    results.append(row)
+                    print(
+                        f"{stage.name:<22} x{factor:<4} {backend:<8} {row['seconds']:8.3f}s "
+                        f"{row['peak_rss_mib']:8.1f} MiB {row['rows_per_second']:12.0f} rows/s"
+                        + ("" if row["identical"] else "  output differs")
+                    )
+    return results
+
+
+def import_benchmark(
+    names: Optional[Iterable[str]] = None, repeats: int = import_repeats
+) -> list[dict[str, Any]]:
+    """Import time of the package and of every public name of it (all by default), each in a fresh interpreter.
+
+    Records the time of the import itself, of the whole process (interpreter start up included) and the heavy
+    modules the import loaded, the fastest of repeats runs.
+    """
+    statements = {"autodnd": "import autodnd"} | {
+        i: f"from autodnd import {i}"
+        for i in (autodnd.__all__ if names is None else names)
+    }
+    results = []
+    for name, statement in statements.items():
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-c", _import_runner, statement, *heavy_modules],
+                cwd=get_project_root(),
+                env={**os.environ, "PYTHONPATH": str(get_project_root())},
+                capture_output=True,
+                text=True,
+            )
+            process_seconds = time.perf_counter() - start
+            if result.returncode != 0:
+                raise RuntimeError(f"{statement} failed:\n{result.stderr[-2000:]}")
+            runs.append(
+                {
+                    **json.loads(result.stdout.strip().splitlines()[-1]),
+                    "process_seconds": process_seconds,
+                }
+            )
+        row = {
+            "name": name,
+            "import_ms": min(i["seconds"] for i in runs) * 1000,
+            "process_ms": min(i["process_seconds"] for i in runs) * 1000,
+            "heavy": runs[0]["heavy"],
+        }
+        results.append(row)
+        print(
+            f"{name:<24} {row['import_ms']:8.1f} ms import {row['process_ms']:8.1f} ms process"
+            + (f"  loads {', '.join(row['heavy'])}" if row["heavy"] else "")
+        )
+    return results
+
+
+def heavy_imports(results: list[dict[str, Any]]) -> list[str]:
+    """The light names (and the package itself) whose import loaded a heavy module."""
+    return [
+        f"{i['name']} loads {', '.join(i['heavy'])}"
+        for i in results
+        if i["heavy"] and i["name"] in ("autodnd", *light_names)
+    ]
+
+
+def regressions(
+    results: list[dict[str, Any]],
+    baseline: list[dict[str, Any]],
+    threshold: float = default_threshold,
+) -> list[str]:
+    """What got slower or bigger than the baseline by more than the threshold, one line per stage and scale.
+
+    A stage that fails where the baseline had a result is a regression too. Stages and scales the baseline
+    doesn't have are not gated.
+    """
+    before = {(i["stage"], i["scale"]): i for i in baseline if "error" not in i}
+    found = []
+    for row in results:
+        old = before.get((row["stage"], row["scale"]))
+        if old is None:
+            continue
+        label = f"{row['stage']} x{row['scale']}"
+        if "error" in row:
+            found.append(f"{label} failed")
+            continue
+        for key, floor in (("seconds", min_seconds), ("peak_rss_mib", min_rss_mib)):
+            if row[key] > old[key] * (1 + threshold) and row[key] - old[key] > floor:
+                found.append(
+                    f"{label} {key} {old[key]:.3f} -> {row[key]:.3f} "
+                    f"(+{row[key] / old[key] - 1:.0%})"
+                )
+    return found
+
+
+def save_results(path: Path, results: list[dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+def load_results(path: Path) -> list[dict[str, Any]]:
+    return json.loads(path.read_text())["results"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the transform stages on synthetic copies of the source JSONs."
+    )
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        type=RuleSet,
+        metavar="RULESET",
+        help="Only benchmark these stages, e.g. Proficiencies, and what they depend on. All by default.",
+    )
+    parser.add_argument(
+        "--scales",
+        nargs="+",
+        type=int,
+        default=list(default_scales),
+        help="How many times the source JSONs are replicated.",
+    )
+    parser.add_argument(
+        "--sources",
+        type=Path,
+        default=fixture_folder,
+        help="Folder of the source JSONs that are scaled, the small fixtures by default (data/jsonrules for the "
+        "downloaded SRD).",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=benchmark_folder / "results.json",
+        help="Where the results are saved.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=benchmark_folder / "baseline.json",
+        help="Results the run is gated against, if the file exists.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=default_threshold,
+        help="Fraction of extra time or memory over the baseline that fails the run.",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the new baseline instead of gating against it.",
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=sorted(backend_names),
+        help="Compare the stages using a backend (or the targets) on these backends, the first is the reference.",
+    )
+    parser.add_argument(
+        "--imports",
+        action="store_true",
+        help="Benchmark the import time of the public names of the package instead of the stages.",
+    )
+    args = parser.parse_args()
+
+    if args.imports:
+        found = heavy_imports(import_benchmark())
+        if found:
+            print("Heavy imports:\n" + "\n".join(found))
+            sys.exit(1)
+        print(f"No heavy import in {['autodnd', *light_names]}")
+        sys.exit(0)
+
+    if args.backends:
+        results = backend_benchmark(
+            args.scales, args.targets or None, args.backends, args.sources
+        )
+        save_results(args.output.with_name("backends.json"), results)
+        failures = sorted({i["stage"] for i in results if "error" in i})
+        if failures:
+            print(f"Failed stages {failures}")
+        different = sorted(
+            {i["stage"] for i in results if "error" not in i and not i["identical"]}
+        )
+        if different:
+            print(f"Outputs differ between the backends for {different}")
+        if failures or different:
+            sys.exit(1)
+        print(f"Identical outputs on {args.backends}")
+        sys.exit(0)
+
+    results = benchmark(args.scales, args.targets or None, args.sources)
+    save_results(args.output, results)
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print(f"Saved the baseline to {args.baseline}")
+    elif args.baseline.exists():
+        found = regressions(results, load_results(args.baseline), args.threshold)
+        if found:
+            print("Regressions against the baseline:\n" + "\n".join(found))
+            sys.exit(1)
+        print("No regression against the baseline")
+    failures = [i["stage"] for i in results if "error" in i]
+    if failures:
+        print(f"Failed stages {sorted(set(failures))}")
+        sys.exit(1)
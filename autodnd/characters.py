@@ -0,0 +1,416 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterable, Mapping, Optional
+
+import pandas as pd
+
+from autodnd.progression import LevelProgression, ProgressionTable
+from autodnd.utils.dataset_cache import DerivedCache, load
+from autodnd.utils.reference_resolver import ReferenceIndex
+from autodnd.utils.ruleset_enum import RuleSet
+
+# Processed tables a character is resolved from
+character_tables = (
+    RuleSet.RACES,
+    RuleSet.SUBRACES,
+    RuleSet.BACKGROUNDS,
+    RuleSet.FEATS,
+    RuleSet.CLASSES,
+    RuleSet.LEVELS,
+    RuleSet.PROFICIENCIES,
+    RuleSet.SKILLS,
+    RuleSet.ABILITY_SCORES,
+)
+
+# Number of results kept per layer, a layer only depends on a few choices so this covers a whole session
+layer_cache_size = 1024
+
+# Scores of the abilities a character doesn't give
+default_score = 10
+
+
+def modifier(score: int) -> int:
+    """The ability modifier of a score, e.g. +2 for 14 and -1 for 9."""
+    return (score - 10) // 2
+
+
+@dataclass(frozen=True)
+class RaceLayer:
+    """What a race and subrace give."""
+
+    race: str
+    subrace: Optional[str]
+    speed: int
+    size: str
+    # Fixed ability bonuses by ability name (STR, DEX...)
+    ability_bonuses: tuple[tuple[str, int], ...]
+    # Abilities the character can pick bonuses from, and how many
+    ability_bonus_options: tuple[tuple[str, int], ...]
+    ability_bonus_choose: int
+    traits: tuple[str, ...]
+    proficiencies: tuple[str, ...]
+    languages: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class ClassLayer:
+    """What a class, or a subclass of it, gives at a level."""
+
+    class_name: str
+    subclass: Optional[str]
+    level: int
+    hit_die: int
+    saving_throws: tuple[str, ...]
+    proficiencies: tuple[str, ...]
+    progression: LevelProgression
+
+
+@dataclass(frozen=True)
+class AbilityLayer:
+    """The final ability scores and their modifiers, by ability name."""
+
+    scores: tuple[tuple[str, int], ...]
+    modifiers: tuple[tuple[str, int], ...]
+
+
+@dataclass(frozen=True)
+class ProficiencyLayer:
+    """Every proficiency of the character, split into the skills and the rest."""
+
+    proficiencies: tuple[str, ...]
+    skills: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class CharacterSheet:
+    """The derived sheet of a character."""
+
+    race: RaceLayer
+    character_class: ClassLayer
+    background: Optional[str]
+    background_feature: Optional[str]
+    ability_scores: dict[str, int]
+    ability_modifiers: dict[str, int]
+    proficiency_bonus: int
+    hit_points: int
+    proficiencies: tuple[str, ...]
+    # Skill and saving throw bonuses, proficiency included
+    skills: dict[str, int]
+    saving_throws: dict[str, int]
+    features: tuple[str, ...]
+    feats: tuple[str, ...]
+    # Feats and classes (to multiclass into) whose ability score prerequisites the character meets
+    available_feats: tuple[str, ...]
+    multiclass_options: tuple[str, ...]
+
+
+def _names(values: Any) -> tuple[str, ...]:
+    return tuple(values) if values is not None else ()
+
+
+def _bonuses(values: Any) -> tuple[tuple[str, int], ...]:
+    return tuple(
+        (i["ability_score"], int(i["bonus"]))
+        for i in (values if values is not None else [])
+    )
+
+
+def _meets(scores: Mapping[str, int], prerequisites: Any, any_of: bool = False) -> bool:
+    """Whether ability scores meet all (or any_of) the ability_score/minimum_score prerequisites."""
+    met = [
+        scores.get(i["ability_score"], default_score) >= i["minimum_score"]
+        for i in (prerequisites if prerequisites is not None else [])
+    ]
+    return any(met) if any_of else all(met)
+
+
+class CharacterResolver:
+    """Resolves character choices into a derived sheet, one memoized layer at a time.
+
+    The sheet is composed of layers that each depend on a few of the choices: the race layer on the race and
+    subrace, the class layer on the class, subclass and level, the ability layer on the base scores and the
+    racial bonuses, the proficiency layer on the proficiency sources, and so on. Every layer is cached by its
+    own inputs, so changing the background of a character only rebuilds the proficiency and skill layers while
+    the race, class and ability layers are served from their caches. See cache_info for the hits.
+    """
+
+    def __init__(self, tables: Mapping[RuleSet, pd.DataFrame]):
+        self._races = ReferenceIndex(tables[RuleSet.RACES], "name")
+        self._subraces = ReferenceIndex(tables[RuleSet.SUBRACES], "name")
+        self._backgrounds = ReferenceIndex(tables[RuleSet.BACKGROUNDS], "name")
+        self._classes = ReferenceIndex(tables[RuleSet.CLASSES], "name")
+        self.progression = ProgressionTable(tables[RuleSet.LEVELS])
+
+        self.abilities = tuple(tables[RuleSet.ABILITY_SCORES]["ability_name"])
+        skills = tables[RuleSet.SKILLS]
+        self.skill_abilities = dict(zip(skills["name"], skills["ability_score_name"]))
+
+        # Skill proficiencies by proficiency name, e.g. "Skill: Stealth" is the Stealth skill
+        proficiencies = tables[RuleSet.PROFICIENCIES].drop_duplicates("name")
+        is_skill = proficiencies["type"] == "Skills"
+        self._skill_of = dict(
+            zip(
+                proficiencies.loc[is_skill, "name"],
+                proficiencies.loc[is_skill, "reference_name"],
+            )
+        )
+
+        feats = tables[RuleSet.FEATS]
+        self._feats = dict(zip(feats["name"], feats["prerequisites"]))
+        classes = tables[RuleSet.CLASSES]
+        self._multiclass = list(
+            zip(
+                classes["name"],
+                classes["multiclass_prerequisites"],
+                classes["multiclass_prerequisite_options"],
+            )
+        )
+
+        # The layers, memoized per resolver so a new resolver (new tables) starts with empty caches
+        self.race_layer = lru_cache(maxsize=layer_cache_size)(self._race_layer)
+        self.class_layer = lru_cache(maxsize=layer_cache_size)(self._class_layer)
+        self.background_layer = lru_cache(maxsize=layer_cache_size)(
+            self._background_layer
+        )
+        self.ability_layer = lru_cache(maxsize=layer_cache_size)(self._ability_layer)
+        self.proficiency_layer = lru_cache(maxsize=layer_cache_size)(
+            self._proficiency_layer
+        )
+        self.skill_layer = lru_cache(maxsize=layer_cache_size)(self._skill_layer)
+        self.prerequisite_layer = lru_cache(maxsize=layer_cache_size)(
+            self._prerequisite_layer
+        )
+
+    def _race_layer(self, race: str, subrace: Optional[str]) -> RaceLayer:
+        record = self._races.record(race)
+        bonuses = _bonuses(record["ability_bonuses"])
+        traits = _names(record["traits"])
+        proficiencies = _names(record["proficiencies"])
+        languages = _names(record["languages"])
+        if subrace is not None:
+            sub = self._subraces.record(subrace)
+            if sub["race_name"] != record["name"]:
+                raise ValueError(f"{subrace} isn't a subrace of {race}")
+            bonuses += _bonuses(sub["ability_bonuses"])
+            traits += _names(sub["traits"])
+            proficiencies += _names(sub["proficiencies"])
+            languages += _names(sub["languages"])
+        return RaceLayer(
+            race=record["name"],
+            subrace=None if subrace is None else sub["name"],
+            speed=int(record["speed"]),
+            size=record["size"],
+            ability_bonuses=bonuses,
+            ability_bonus_options=_bonuses(record["ability_bonus_options"]),
+            ability_bonus_choose=int(record["ability_bonus_choose"]),
+            traits=traits,
+            proficiencies=proficiencies,
+            languages=languages,
+        )
+
+    def _class_layer(
+        self, class_name: str, subclass: Optional[str], level: int
+    ) -> ClassLayer:
+        record = self._classes.record(class_name)
+        saving_throws = _names(record["saving_throws"])
+        progression = self.progression.lookup(record["name"], level, subclass)
+        return ClassLayer(
+            class_name=record["name"],
+            subclass=progression.subclass_name,
+            level=level,
+            hit_die=int(record["hit_die"]),
+            saving_throws=saving_throws,
+            proficiencies=_names(record["proficiencies"])
+            + tuple(f"Saving Throw: {i}" for i in saving_throws),
+            progression=progression,
+        )
+
+    def _background_layer(
+        self, background: Optional[str]
+    ) -> tuple[tuple[str, ...], Optional[str]]:
+        """The proficiencies and the feature name of a background."""
+        if background is None:
+            return (), None
+        record = self._backgrounds.record(background)
+        return _names(record["proficiencies"]), record["feature_name"]
+
+    def _ability_layer(
+        self,
+        base_scores: tuple[tuple[str, int], ...],
+        bonuses: tuple[tuple[str, int], ...],
+    ) -> AbilityLayer:
+        scores = dict.fromkeys(self.abilities, default_score)
+        scores.update(base_scores)
+        for ability, bonus in bonuses:
+            scores[ability] = scores.get(ability, default_score) + bonus
+        return AbilityLayer(
+            scores=tuple(scores.items()),
+            modifiers=tuple((i, modifier(j)) for i, j in scores.items()),
+        )
+
+    def _proficiency_layer(self, *sources: tuple[str, ...]) -> ProficiencyLayer:
+        proficiencies = tuple(dict.fromkeys(j for i in sources for j in i))
+        return ProficiencyLayer(
+            proficiencies=proficiencies,
+            skills=tuple(
+                self._skill_of[i] for i in proficiencies if i in self._skill_of
+            ),
+        )
+
+    def _skill_layer(
+        self,
+        modifiers: tuple[tuple[str, int], ...],
+        skills: tuple[str, ...],
+        saving_throws: tuple[str, ...],
+        proficiency_bonus: int,
+    ) -> tuple[dict[str, int], dict[str, int]]:
+        """Skill and saving throw bonuses, the ability modifier plus the proficiency bonus if proficient."""
+        by_ability = dict(modifiers)
+        skill_bonuses = {
+            i: by_ability.get(j, 0) + (proficiency_bonus if i in skills else 0)
+            for i, j in self.skill_abilities.items()
+        }
+        saving_throw_bonuses = {
+            i: j + (proficiency_bonus if i in saving_throws else 0)
+            for i, j in by_ability.items()
+        }
+        return skill_bonuses, saving_throw_bonuses
+
+    def _prerequisite_layer(
+        self, scores: tuple[tuple[str, int], ...]
+    ) -> tuple[tuple[str, ...], tuple[str, ...]]:
+        """The feats and the classes to multiclass into whose ability score prerequisites are met."""
+        by_ability = dict(scores)
+        feats = tuple(i for i, j in self._feats.items() if _meets(by_ability, j))
+        classes = tuple(
+            name
+            for name, required, options in self._multiclass
+            if _meets(by_ability, required)
+            and (
+                options is None
+                or len(options) == 0
+                or _meets(by_ability, options, True)
+            )
+        )
+        return feats, classes
+
+    def resolve(
+        self,
+        race: str,
+        class_name: str,
+        level: int = 1,
+        subrace: Optional[str] = None,
+        subclass: Optional[str] = None,
+        background: Optional[str] = None,
+        ability_scores: Optional[Mapping[str, int]] = None,
+        ability_bonus_choices: Iterable[str] = (),
+        chosen_proficiencies: Iterable[str] = (),
+        feats: Iterable[str] = (),
+    ) -> CharacterSheet:
+        """The derived sheet of a character.
+
+        ability_scores are the base scores by ability name (STR, DEX...), before racial bonuses. A race with
+        ability bonus options (like the Half-Elf) takes the abilities picked in ability_bonus_choices.
+        chosen_proficiencies are the proficiencies picked from the class, race or background choices, e.g.
+        "Skill: Stealth". Raises a KeyError for an unknown race, class, background or feat and a ValueError for
+        choices the rules don't allow.
+        """
+        race_layer = self.race_layer(race, subrace)
+        class_layer = self.class_layer(class_name, subclass, level)
+        background_proficiencies, background_feature = self.background_layer(background)
+
+        picked = tuple(ability_bonus_choices)
+        options = dict(race_layer.ability_bonus_options)
+        if len(picked) > race_layer.ability_bonus_choose or any(
+            i not in options for i in picked
+        ):
+            raise ValueError(
+                f"{race_layer.race} picks {race_layer.ability_bonus_choose} ability bonuses from "
+                f"{sorted(options)}, not {list(picked)}"
+            )
+        feats = tuple(feats)
+        unknown = [i for i in feats if i not in self._feats]
+        if unknown:
+            raise KeyError(f"Unknown feats {unknown}")
+
+        abilities = self.ability_layer(
+            tuple(sorted((ability_scores or {}).items())),
+            race_layer.ability_bonuses + tuple((i, options[i]) for i in picked),
+        )
+        proficiencies = self.proficiency_layer(
+            race_layer.proficiencies,
+            class_layer.proficiencies,
+            background_proficiencies,
+            tuple(chosen_proficiencies),
+        )
+        progression = class_layer.progression
+        proficiency_bonus = progression.prof_bonus or 0
+        skills, saving_throws = self.skill_layer(
+            abilities.modifiers,
+            proficiencies.skills,
+            class_layer.saving_throws,
+            proficiency_bonus,
+        )
+        available_feats, multiclass_options = self.prerequisite_layer(abilities.scores)
+        not_met = [i for i in feats if i not in available_feats]
+        if not_met:
+            raise ValueError(f"Prerequisites of the feats {not_met} aren't met")
+
+        modifiers = dict(abilities.modifiers)
+        constitution = modifiers.get("CON", 0)
+        # Full hit die at level 1 then the fixed average of the die at every level after that
+        hit_points = class_layer.hit_die + constitution
+        hit_points += (level - 1) * (class_layer.hit_die // 2 + 1 + constitution)
+
+        return CharacterSheet(
+            race=race_layer,
+            character_class=class_layer,
+            background=background,
+            background_feature=background_feature,
+            ability_scores=dict(abilities.scores),
+            ability_modifiers=modifiers,
+            proficiency_bonus=proficiency_bonus,
+            hit_points=max(hit_points, level),
+            proficiencies=proficiencies.proficiencies,
+            skills=dict(skills),
+            saving_throws=dict(saving_throws),
+            features=progression.features_up_to,
+            feats=feats,
+            available_feats=available_feats,
+            multiclass_options=multiclass_options,
+        )
+
+    def cache_info(self) -> dict[str, Any]:
+        """Hits and misses of every layer cache."""
+        return {
+            i: getattr(self, i).cache_info()._asdict()
+            for i in (
+                "race_layer",
+                "class_layer",
+                "background_layer",
+                "ability_layer",
+                "proficiency_layer",
+                "skill_layer",
+                "prerequisite_layer",
+            )
+        }
+
+
+# Resolver of every source of this process, rebuilt when one of the parquets of its layers changes
+_resolver = DerivedCache(
+    character_tables,
+    lambda source: CharacterResolver(
+        {i: load(i, source=source) for i in character_tables}
+    ),
+)
+
+
+def get_character_resolver() -> CharacterResolver:
+    """The resolver of the processed tables of the active source, built once per process while the parquets
+    don't change."""
+    return _resolver.get()
+
+
+def resolve_character(race: str, class_name: str, **choices: Any) -> CharacterSheet:
+    """The derived sheet of a character, see CharacterResolver.resolve."""
+    return get_character_resolver().resolve(race, class_name, **choices)
@@ -0,0 +1,200 @@
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, cast
+
+from autodnd.search import field_text, get_index, text_columns, tokenize
+from autodnd.tables import open_table
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import get_source
+
+# Tables a rules context is assembled from by default
+default_tables = (
+    RuleSet.RULE_SECTIONS,
+    RuleSet.RULES,
+    RuleSet.CONDITIONS,
+    RuleSet.FEATURES,
+    RuleSet.TRAITS,
+)
+
+# Order the prose fields of a row are offered in. A field mapped in alternative_fields is a rewrite of
+# another one, only the first of the two that has text makes it into a pack.
+field_order = ("rule_section_as_instructions",) + tuple(
+    i for i in text_columns if i != "rule_section_as_instructions"
+)
+alternative_fields = {"desc": "rule_section_as_instructions"}
+
+# Number of ranked rows considered for a pack
+candidate_rows = 50
+
+# A snippet sharing this fraction of its word shingles with the pack so far is a duplicate
+duplicate_overlap = 0.8
+shingle_words = 5
+
+# A snippet that doesn't fit is cut down to the remaining budget, unless less than this many tokens are left
+min_snippet_tokens = 32
+
+# Number of packs kept in the cache
+cache_size = 256
+
+TokenCounter = Callable[[str], int]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of English text for LLM tokenizers, about 4 characters per token."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+@dataclass(frozen=True)
+class Snippet:
+    table: str
+    row: int
+    name: str
+    field: str
+    text: str
+    score: float
+    tokens: int
+
+    @property
+    def rendered(self) -> str:
+        return f"[{self.table}: {self.name}] {self.text}"
+
+
+@dataclass(frozen=True)
+class ContextPack:
+    """The snippets picked for a query within a token budget, best first."""
+
+    query: str
+    budget: int
+    snippets: tuple[Snippet, ...]
+    # tokens of the whole rows the snippets come from, what concatenating them would have cost
+    source_tokens: int
+
+    @property
+    def tokens(self) -> int:
+        return sum(i.tokens for i in self.snippets)
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(i.rendered for i in self.snippets)
+
+
+def _shingles(text: str) -> set[str]:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    if len(words) <= shingle_words:
+        return {" ".join(words)}
+    return {
+        " ".join(words[i : i + shingle_words])
+        for i in range(len(words) - shingle_words + 1)
+    }
+
+
+def _truncate(text: str, max_tokens: int, count_tokens: TokenCounter) -> str:
+    """Keep the leading sentences of text that fit in max_tokens, with an ellipsis."""
+    kept = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        candidate = f"{kept} {sentence}".strip()
+        if count_tokens(f"{candidate} ...") > max_tokens:
+            break
+        kept = candidate
+    return f"{kept} ..." if kept else ""
+
+
+def fingerprint(query: str) -> str:
+    """Queries with the same search terms, in any order or case, share a fingerprint and so a pack."""
+    return hashlib.sha1(" ".join(sorted(tokenize(query))).encode()).hexdigest()
+
+
+def _build(
+    query: str,
+    budget: int,
+    tables: tuple[RuleSet, ...],
+    count_tokens: TokenCounter,
+) -> ContextPack:
+    hits = get_index().search(query, k=candidate_rows, tables=tables)
+
+    picked: list[Snippet] = []
+    covered: set[str] = set()
+    used = 0
+    source_tokens = 0
+    for hit in hits.itertuples():
+        ruleset = RuleSet(hit.table)
+        table = open_table(ruleset)
+        fields = {
+            i: field_text(table.column(i)[hit.row].as_py())
+            for i in field_order
+            if i in table.column_names
+        }
+        fields = {i: j for i, j in fields.items() if j.strip()}
+        source_tokens += count_tokens(" ".join(fields.values()))
+
+        for field, text in fields.items():
+            if fields.get(alternative_fields.get(field, "")):
+                continue
+            shingles = _shingles(text)
+            if len(shingles & covered) >= duplicate_overlap * len(shingles):
+                continue
+            prefix = f"[{hit.table}: {hit.name}] "
+            tokens = count_tokens(prefix + text)
+            if used + tokens > budget:
+                left = budget - used - count_tokens(prefix)
+                if left < min_snippet_tokens:
+                    continue
+                text = _truncate(text, left, count_tokens)
+                tokens = count_tokens(prefix + text)
+                if not text or used + tokens > budget:
+                    continue
+            picked.append(
+                Snippet(
+                    cast(str, hit.table),
+                    cast(int, hit.row),
+                    cast(str, hit.name),
+                    field,
+                    text,
+                    cast(float, hit.score),
+                    tokens,
+                )
+            )
+            covered |= shingles
+            used += tokens
+        if budget - used < min_snippet_tokens:
+            break
+    return ContextPack(query, budget, tuple(picked), source_tokens)
+
+
+_packs: OrderedDict[tuple, ContextPack] = OrderedDict()
+_lock = threading.Lock()
+
+
+def build_context(
+    query: str,
+    budget: int = 1000,
+    tables: Optional[Iterable[RuleSet]] = None,
+    count_tokens: TokenCounter = estimate_tokens,
+) -> ContextPack:
+    """Assemble the most relevant rule snippets for a query that fit in a token budget.
+
+    Rows are ranked with the BM25 search index and offered field by field, best first. A field that is a
+    rewrite of another field of the row (desc vs rule_section_as_instructions) or that mostly repeats text
+    already in the pack (like the spellcasting references shared by features) is left out, and the last
+    snippet is cut at a sentence boundary to fill the budget. Packs are cached per query fingerprint and
+    budget until the search index of the active source changes.
+    """
+    tables = default_tables if tables is None else tuple(tables)
+    index = get_index()
+    version = tuple((i.value, j.mtime) for i, j in index.segments.items())
+    key = (fingerprint(query), budget, tables, count_tokens, get_source().name, version)
+    with _lock:
+        if key in _packs:
+            _packs.move_to_end(key)
+            return _packs[key]
+
+    pack = _build(query, budget, tables, count_tokens)
+    with _lock:
+        _packs[key] = pack
+        while len(_packs) > cache_size:
+            _packs.popitem(last=False)
+    return pack
@@ -0,0 +1,496 @@
+import argparse
+import heapq
+import itertools
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from autodnd.monsters import MonsterIndex, get_monster_index
+from autodnd.utils.dice import RandomState, compile_dice
+
+# XP thresholds of one character by level (rows, levels 1 to 20), Dungeon Master's Guide chapter 3
+difficulties = ("easy", "medium", "hard", "deadly")
+xp_thresholds = np.array(
+    [
+        [25, 50, 75, 100],
+        [50, 100, 150, 200],
+        [75, 150, 225, 400],
+        [125, 250, 375, 500],
+        [250, 500, 750, 1100],
+        [300, 600, 900, 1400],
+        [350, 750, 1100, 1700],
+        [450, 900, 1400, 2100],
+        [550, 1100, 1600, 2400],
+        [600, 1200, 1900, 2800],
+        [800, 1600, 2400, 3600],
+        [1000, 2000, 3000, 4500],
+        [1100, 2200, 3400, 5100],
+        [1250, 2500, 3800, 5700],
+        [1400, 2800, 4300, 6400],
+        [1600, 3200, 4800, 7200],
+        [2000, 3900, 5900, 8800],
+        [2100, 4200, 6300, 9500],
+        [2400, 4900, 7300, 10900],
+        [2800, 5700, 8500, 12700],
+    ]
+)
+
+# An encounter is deadly from the deadly threshold up to this many times it, above that it's not considered
+deadly_ceiling = 1.5
+
+# Encounter multipliers of the monsters' XP by number of monsters. A party of fewer than 3 characters uses the
+# next multiplier up and a party of 6 or more the next one down, hence the two extra ends.
+multipliers = (0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0)
+multiplier_monster_counts = (1, 2, 3, 7, 11, 15)
+
+# Damage dealt to a monster vulnerable, resistant or immune to its type
+vulnerable_damage = 2.0
+resistant_damage = 0.5
+immune_damage = 0.0
+
+# Half of a challenge rating comes from the monster's defense, so its XP is scaled by the square root of how
+# much tougher the party's damage types make it, within these bounds
+min_damage_factor = 0.5
+max_damage_factor = 2.0
+
+# Score penalties of a balanced encounter, on top of its relative distance to the middle of the XP band: per
+# monster kind after the first and per unit of coefficient of variation of the monsters' total hit points
+kind_penalty = 0.1
+hit_points_penalty = 0.5
+
+
+def party_thresholds(party_levels: Iterable[int]) -> np.ndarray:
+    """The easy, medium, hard and deadly XP thresholds of a party, the sum of its characters' thresholds."""
+    levels = np.asarray(list(party_levels))
+    if len(levels) == 0 or levels.min() < 1 or levels.max() > 20:
+        raise ValueError(
+            f"Party levels must be between 1 and 20, got {levels.tolist()}"
+        )
+    return xp_thresholds[levels - 1].sum(axis=0)
+
+
+def encounter_multiplier(monster_count: int, party_size: int) -> float:
+    """The multiplier of the monsters' XP for the number of monsters and the size of the party."""
+    step = 1 + sum(monster_count >= i for i in multiplier_monster_counts[1:])
+    if party_size < 3:
+        step += 1
+    elif party_size >= 6:
+        step -= 1
+    return multipliers[step]
+
+
+def _hit_points_moments(hit_points_roll: Any, hit_points: Any) -> tuple[float, float]:
+    """Mean and variance of a monster's hit points roll, its fixed hit points if the roll can't be parsed."""
+    try:
+        distribution = compile_dice(hit_points_roll).distribution
+    except (TypeError, ValueError, AttributeError):
+        return float(hit_points), 0.0
+    return distribution.mean, distribution.variance
+
+
+@dataclass(frozen=True)
+class EncounterGroup:
+    """Monsters of one kind in an encounter."""
+
+    name: str
+    count: int
+    xp: int
+    challenge_rating: float
+    hit_points_roll: str
+    # other monsters with the same (effective) XP that can take this group's place
+    alternatives: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Encounter:
+    groups: tuple[EncounterGroup, ...]
+    # XP awarded for the encounter, and the XP its difficulty is judged by: the monsters' XP scaled for the
+    # party's damage types, times the encounter multiplier
+    xp: int
+    adjusted_xp: float
+    difficulty: str
+    hit_points_mean: float
+    hit_points_std: float
+    score: float
+
+    @property
+    def monster_count(self) -> int:
+        return sum(i.count for i in self.groups)
+
+    def roll_hit_points(self, seed: RandomState = None) -> dict[str, np.ndarray]:
+        """Roll the hit points of every monster of the encounter, by monster name."""
+        rng = (
+            seed
+            if isinstance(seed, np.random.Generator)
+            else np.random.default_rng(seed)
+        )
+        return {
+            i.name: compile_dice(i.hit_points_roll).roll_many(i.count, rng)
+            for i in self.groups
+        }
+
+
+class EncounterBuilder:
+    """Finds the best balanced monster encounters for a party.
+
+    The monsters are indexed once by XP: XP, challenge rating and the mean and variance of their hit points
+    rolls are held as arrays sorted by XP. A query keeps the monsters matching its filters, scales their XP
+    for the party's damage types and groups them into tiers of equal XP. Encounters of up to max_kinds kinds
+    of monsters are then enumerated tier by tier with the tiers a partial encounter can still be completed
+    with found by binary search, so only encounters inside the XP band of the asked difficulty are ever
+    visited, and the last kind is scored for all its tiers at once. Encounters with more kinds are only
+    searched while their kind penalty can still beat the k best found so far (branch and bound).
+    """
+
+    def __init__(self, monsters: Optional[MonsterIndex] = None):
+        self.monsters = get_monster_index() if monsters is None else monsters
+        frame = self.monsters.monsters
+        xp = self.monsters.numeric["xp"]
+        # Monsters worth no XP can be added to any encounter for free, they are never picked
+        self.order = np.flatnonzero(xp > 0)
+        self.order = self.order[np.argsort(xp[self.order], kind="stable")]
+        self.xp = xp[self.order]
+        self.challenge_rating = self.monsters.numeric["challenge_rating"][self.order]
+        self.names = frame["name"].to_numpy(dtype=object)[self.order]
+        # A monster without a hit points roll always has its fixed hit points
+        self.hit_points_rolls = np.array(
+            [
+                i if isinstance(i, str) else str(int(j))
+                for i, j in zip(frame["hit_points_roll"], frame["hit_points"])
+            ],
+            dtype=object,
+        )[self.order]
+        moments = [
+            _hit_points_moments(i, j)
+            for i, j in zip(
+                self.hit_points_rolls, frame["hit_points"].to_numpy()[self.order]
+            )
+        ]
+        self.hit_points_mean = np.array([i[0] for i in moments])
+        self.hit_points_var = np.array([i[1] for i in moments])
+
+    def damage_factors(self, party_damage: Iterable[str]) -> np.ndarray:
+        """How much tougher every indexed monster is against the party's damage types, as an XP factor."""
+        party_damage = list(party_damage)
+        dealt = np.zeros(len(self.order))
+        for name in party_damage:
+            key = name.casefold()
+            factor = np.ones(len(self.order))
+            for col, scale in (
+                ("vulnerable_to", vulnerable_damage),
+                ("resistant_to", resistant_damage),
+            ):
+                mask = self.monsters.damage[col].get(key)
+                if mask is not None:
+                    factor[mask[self.order]] *= scale
+            immune = self.monsters.damage["immune_to"].get(key)
+            if immune is not None:
+                factor[immune[self.order]] = immune_damage
+            dealt += factor
+        dealt /= len(party_damage)
+        with np.errstate(divide="ignore"):
+            toughness = np.where(dealt > 0, 1 / dealt, np.inf)
+        return np.clip(np.sqrt(toughness), min_damage_factor, max_damage_factor)
+
+    def build(
+        self,
+        party_levels: Iterable[int],
+        difficulty: str = "medium",
+        k: int = 10,
+        max_monsters: int = 8,
+        max_kinds: int = 3,
+        party_damage: Optional[Iterable[str]] = None,
+        max_challenge_rating: Optional[float] = None,
+        **filters: Any,
+    ) -> list[Encounter]:
+        """The k best balanced encounters of the given difficulty for a party, best first.
+
+        party_levels holds the level of every character. Monsters can be restricted with the filters of
+        MonsterIndex.rows (e.g. type="undead") and by challenge rating, which defaults to the highest level of
+        the party. With party_damage (the damage types the party deals, e.g. ["Fire", "Slashing"]) monsters
+        weak to them are worth less and monsters resisting them more when judging the difficulty.
+        """
+        if difficulty not in difficulties:
+            raise ValueError(
+                f"Unknown difficulty {difficulty}, use one of {difficulties}"
+            )
+        party_levels = list(party_levels)
+        thresholds = party_thresholds(party_levels)
+        level = difficulties.index(difficulty)
+        low = float(thresholds[level])
+        high = (
+            float(thresholds[level + 1])
+            if level + 1 < len(thresholds)
+            else deadly_ceiling * low
+        )
+        # The band excludes the next threshold, which belongs to the next difficulty
+        high = math.nextafter(high, -math.inf)
+        target = (low + high) / 2
+
+        # Candidate monsters, in the XP order of the index
+        keep = np.isin(self.order, self.monsters.rows(**filters))
+        cap = (
+            max(party_levels) if max_challenge_rating is None else max_challenge_rating
+        )
+        keep &= self.challenge_rating <= cap
+        positions = np.flatnonzero(keep)
+        effective = self.xp[positions]
+        if party_damage:
+            effective = effective * self.damage_factors(party_damage)[positions]
+            resorted = np.argsort(effective, kind="stable")
+            positions, effective = positions[resorted], effective[resorted]
+
+        # Tiers of monsters worth the same effective XP, the first monster of a tier stands for it
+        tier_xp, tier_start = np.unique(effective, return_index=True)
+        tier_end = np.append(tier_start[1:], len(positions))
+        first = positions[tier_start]
+        search = _Search(
+            xp=tier_xp,
+            hit_points_mean=self.hit_points_mean[first],
+            hit_points_var=self.hit_points_var[first],
+            target=target,
+            k=k,
+        )
+        for kinds in range(1, max_kinds + 1):
+            if search.worst() <= kind_penalty * (kinds - 1):
+                break
+            for count in range(kinds, max_monsters + 1):
+                multiplier = encounter_multiplier(count, len(party_levels))
+                search.run(
+                    low / multiplier, high / multiplier, multiplier, count, kinds
+                )
+
+        encounters = []
+        for score, composition, adjusted in search.best():
+            groups = []
+            for tier, count in composition:
+                members = positions[tier_start[tier] : tier_end[tier]]
+                lead = members[0]
+                groups.append(
+                    EncounterGroup(
+                        name=str(self.names[lead]),
+                        count=count,
+                        xp=int(self.xp[lead]),
+                        challenge_rating=float(self.challenge_rating[lead]),
+                        hit_points_roll=self.hit_points_rolls[lead],
+                        alternatives=tuple(str(i) for i in self.names[members[1:]]),
+                    )
+                )
+            mean = sum(
+                self.hit_points_mean[positions[tier_start[t]]] * c
+                for t, c in composition
+            )
+            var = sum(
+                self.hit_points_var[positions[tier_start[t]]] * c
+                for t, c in composition
+            )
+            encounters.append(
+                Encounter(
+                    groups=tuple(groups),
+                    xp=sum(i.xp * i.count for i in groups),
+                    adjusted_xp=adjusted,
+                    difficulty=difficulty,
+                    hit_points_mean=float(mean),
+                    hit_points_std=float(math.sqrt(var)),
+                    score=score,
+                )
+            )
+        return encounters
+
+
+class _Search:
+    """Branch and bound search of the k best tier compositions of one query."""
+
+    def __init__(
+        self,
+        xp: np.ndarray,
+        hit_points_mean: np.ndarray,
+        hit_points_var: np.ndarray,
+        target: float,
+        k: int,
+    ):
+        self.xp = xp
+        self.hit_points_mean = hit_points_mean
+        self.hit_points_var = hit_points_var
+        self.target = target
+        self.k = k
+        # max-heap of the k best by score, as (-score, tie breaker, composition, adjusted XP)
+        self.heap: list[tuple[float, int, tuple, float]] = []
+        self.counter = itertools.count()
+
+    def worst(self) -> float:
+        return -self.heap[0][0] if len(self.heap) >= self.k else math.inf
+
+    def best(self) -> list[tuple[float, tuple, float]]:
+        return [(-i[0], i[2], i[3]) for i in sorted(self.heap, reverse=True)]
+
+    def run(
+        self, low: float, high: float, multiplier: float, count: int, kinds: int
+    ) -> None:
+        """Visit the compositions of exactly count monsters of exactly kinds tiers, whose XP is in [low, high]."""
+        if len(self.xp) == 0:
+            return
+        self.multiplier = multiplier
+        self.penalty = kind_penalty * (kinds - 1)
+        self._extend(low, high, count, kinds, 0, (), 0.0, 0.0, 0.0)
+
+    def _extend(
+        self,
+        low: float,
+        high: float,
+        left: int,
+        kinds: int,
+        start: int,
+        composition: tuple,
+        xp: float,
+        mean: float,
+        var: float,
+    ) -> None:
+        tiers = self.xp
+        if kinds == 1:
+            # All the remaining monsters are of the last kind: the tiers that land in the band are one slice
+            first = max(start, int(np.searchsorted(tiers, (low - xp) / left, "left")))
+            last = int(np.searchsorted(tiers, (high - xp) / left, "right"))
+            if first < last:
+                self._offer(composition, np.arange(first, last), left, xp, mean, var)
+            return
+        # The kinds after this one are worth more XP than it, so it must stay below (high - xp) / left; and the
+        # band must be reachable filling the other monsters with the most valuable tier
+        last = int(np.searchsorted(tiers, (high - xp) / left, "left"))
+        for count in range(1, left - kinds + 2):
+            rest = left - count
+            first = max(
+                start,
+                int(
+                    np.searchsorted(
+                        tiers, (low - xp - rest * tiers[-1]) / count, "left"
+                    )
+                ),
+            )
+            for tier in range(first, last):
+                self._extend(
+                    low,
+                    high,
+                    rest,
+                    kinds - 1,
+                    tier + 1,
+                    composition + ((tier, count),),
+                    xp + count * tiers[tier],
+                    mean + count * self.hit_points_mean[tier],
+                    var + count * self.hit_points_var[tier],
+                )
+
+    def _offer(
+        self,
+        composition: tuple,
+        tiers: np.ndarray,
+        count: int,
+        xp: float,
+        mean: float,
+        var: float,
+    ) -> None:
+        # Bound: the closest the slice gets to the target, the XP grows along it
+        lowest = (xp + count * self.xp[tiers[0]]) * self.multiplier
+        highest = (xp + count * self.xp[tiers[-1]]) * self.multiplier
+        closest = max(lowest - self.target, self.target - highest, 0.0)
+        if closest / self.target + self.penalty >= self.worst():
+            return
+
+        adjusted = (xp + count * self.xp[tiers]) * self.multiplier
+        means = mean + count * self.hit_points_mean[tiers]
+        stds = np.sqrt(var + count * self.hit_points_var[tiers])
+        variation = np.divide(stds, means, out=np.zeros_like(stds), where=means > 0)
+        scores = (
+            np.abs(adjusted - self.target) / self.target
+            + self.penalty
+            + hit_points_penalty * variation
+        )
+        candidates = np.flatnonzero(scores < self.worst())
+        if len(candidates) > self.k:
+            candidates = candidates[
+                np.argpartition(scores[candidates], self.k)[: self.k]
+            ]
+        for i in candidates:
+            if scores[i] >= self.worst():
+                continue
+            entry = (
+                -float(scores[i]),
+                next(self.counter),
+                composition + ((int(tiers[i]), count),),
+                float(adjusted[i]),
+            )
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, entry)
+            else:
+                heapq.heapreplace(self.heap, entry)
+
+
+# Builder of this process, rebuilt when the monster index is
+_builder: Optional[EncounterBuilder] = None
+_lock = threading.Lock()
+
+
+def build_encounters(
+    party_levels: Iterable[int], difficulty: str = "medium", k: int = 10, **options: Any
+) -> list[Encounter]:
+    """The k best balanced encounters for a party, see EncounterBuilder.build."""
+    global _builder
+    monsters = get_monster_index()
+    with _lock:
+        if _builder is None or _builder.monsters is not monsters:
+            _builder = EncounterBuilder(monsters)
+        builder = _builder
+    return builder.build(party_levels, difficulty, k, **options)
+
+
+def benchmark(
+    party_sizes: Iterable[int] = range(1, 9),
+    levels: Iterable[int] = range(1, 21),
+    difficulty_names: Iterable[str] = difficulties,
+    k: int = 10,
+    builder: Optional[EncounterBuilder] = None,
+) -> pd.DataFrame:
+    """Time build over parties of every size and (uniform) level, one row per party and difficulty."""
+    builder = EncounterBuilder() if builder is None else builder
+    rows = []
+    for size, level, difficulty in itertools.product(
+        party_sizes, levels, difficulty_names
+    ):
+        start = time.perf_counter()
+        found = builder.build([level] * size, difficulty, k)
+        rows.append(
+            {
+                "party_size": size,
+                "level": level,
+                "difficulty": difficulty,
+                "encounters": len(found),
+                "best_score": found[0].score if found else np.nan,
+                "ms": (time.perf_counter() - start) * 1000,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the encounter builder over party sizes 1-8 and levels 1-20."
+    )
+    parser.add_argument("-k", type=int, default=10, help="Encounters per party.")
+    args = parser.parse_args()
+
+    results = benchmark(k=args.k)
+    print(
+        results.groupby("difficulty", sort=False)["ms"]
+        .describe(percentiles=[0.5, 0.95])
+        .round(2)
+        .to_string()
+    )
+    print(
+        f"{len(results)} parties in {results['ms'].sum() / 1000:.2f}s, "
+        f"{(results['encounters'] == 0).sum()} without any encounter"
+    )
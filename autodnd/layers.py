@@ -0,0 +1,172 @@
+import argparse
+import json
+import threading
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from autodnd.utils.dataset_cache import DerivedCache
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import Source, merge_layers, override_key, source_layers
+
+# Columns a row can be looked up by, besides its override key (see autodnd.utils.sources.override_columns)
+key_columns = ("index", "url", "name", "ability_name", "equipment_category")
+
+# Columns pandas writes for the index of a frame, never returned
+hidden_column_prefix = "__index_level_"
+
+
+def _key(value: Any) -> str:
+    return str(value).strip().casefold()
+
+
+class _Layer:
+    """The processed table of one source, as records with a hash index over their keys."""
+
+    def __init__(self, source: Source, path: Path):
+        table = pq.read_table(path)
+        self.source = source
+        self.columns = [
+            i for i in table.column_names if not i.startswith(hidden_column_prefix)
+        ]
+        self.schema = table.select(self.columns).schema
+        self.records = table.select(self.columns).to_pylist()
+        self.override_key = override_key(self.columns)
+        # Override key value -> rows, what the sources above look into to know if a row is overridden
+        self.overrides: dict[Any, list[int]] = {}
+        if self.override_key is not None:
+            for row, record in enumerate(self.records):
+                if record[self.override_key] is not None:
+                    self.overrides.setdefault(record[self.override_key], []).append(row)
+        # Rows of every key, case insensitive
+        self.keys: dict[str, list[int]] = {}
+        for col in (i for i in key_columns if i in self.columns):
+            for row, record in enumerate(self.records):
+                value = record[col]
+                if isinstance(value, str):
+                    rows = self.keys.setdefault(_key(value), [])
+                    if not rows or rows[-1] != row:
+                        rows.append(row)
+
+
+# Layers loaded by this process, with the mtime of the parquet they were read from. A layer is shared by
+# every index it's part of, so adding a source only reads that source's tables
+_layers: dict[Path, tuple[int, _Layer]] = {}
+_layers_lock = threading.Lock()
+
+
+def _get_layer(source: Source, path: Path) -> _Layer:
+    mtime = path.stat().st_mtime_ns
+    with _layers_lock:
+        cached = _layers.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, _Layer(source, path))
+            _layers[path] = cached
+        return cached[1]
+
+
+class LayeredIndex:
+    """Lookups over the processed tables of a stack of rule sources, without merging the tables.
+
+    Every source keeps its own processed tables. A row of a source overrides the rows of the sources below it
+    sharing its override key (index, url or title), a lookup goes down the sources from the highest one and
+    stops at the first that has a row for the key that no source above overrides.
+    """
+
+    def __init__(self, layers: dict[RuleSet, list[_Layer]]):
+        # The layers of every table, lowest source first
+        self.layers = layers
+
+    def table(self, ruleset: RuleSet) -> list[_Layer]:
+        if ruleset not in self.layers:
+            raise ValueError(f"No source has a processed {ruleset.value} table")
+        return self.layers[ruleset]
+
+    @staticmethod
+    def _overridden(layer: _Layer, row: int, above: list[_Layer]) -> bool:
+        if layer.override_key is None:
+            return False
+        value = layer.records[row][layer.override_key]
+        return any(value in i.overrides for i in above)
+
+    def resolve(self, ruleset: RuleSet, key: Any) -> list[dict[str, Any]]:
+        """The rows of a key (a title, an index or a url, case insensitive) with the source they come from."""
+        layers = self.table(ruleset)
+        normalized = _key(key)
+        for position in range(len(layers) - 1, -1, -1):
+            layer = layers[position]
+            rows = [
+                i
+                for i in layer.keys.get(normalized, ())
+                if not self._overridden(layer, i, layers[position + 1 :])
+            ]
+            if rows:
+                return [
+                    {"source": layer.source.name, "row": i, "record": layer.records[i]}
+                    for i in rows
+                ]
+        return []
+
+    def rows(self, ruleset: RuleSet) -> Iterator[tuple[str, int, dict[str, Any]]]:
+        """(source, row in the source's table, record) of every row of the merged table, lowest source first."""
+        layers = self.table(ruleset)
+        for position, layer in enumerate(layers):
+            above = layers[position + 1 :]
+            for row, record in enumerate(layer.records):
+                if not self._overridden(layer, row, above):
+                    yield layer.source.name, row, record
+
+    def frame(self, ruleset: RuleSet) -> pd.DataFrame:
+        """The merged table, same as autodnd.utils.dataset_cache.load under the top source."""
+        return merge_layers(
+            [pd.DataFrame(i.records, columns=i.columns) for i in self.table(ruleset)]
+        )
+
+    def sources(self, ruleset: RuleSet) -> dict[str, int]:
+        """Number of rows every source contributes to the merged table."""
+        counts = {i.source.name: 0 for i in self.table(ruleset)}
+        for source, _, _ in self.rows(ruleset):
+            counts[source] += 1
+        return counts
+
+
+def _build(source: str) -> LayeredIndex:
+    tables: dict[RuleSet, list[_Layer]] = {}
+    for layer in source_layers(source):
+        for ruleset in RuleSet:
+            path = layer.processed_folder / f"{ruleset.value}.parquet"
+            if path.exists():
+                tables.setdefault(ruleset, []).append(_get_layer(layer, path))
+    return LayeredIndex(tables)
+
+
+# Index of every source of this process, rebuilt when one of its processed parquets changes
+_index = DerivedCache(RuleSet, _build)
+
+
+def get_layered_index(source: Optional[str] = None) -> LayeredIndex:
+    """The layered index of a source (the active one by default) and every source below it.
+
+    Built once per process while the parquets don't change, reusing the tables of the sources that didn't.
+    """
+    return _index.get(source)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Look keys up through the processed tables of a rule source and the sources below it."
+    )
+    parser.add_argument("table", type=RuleSet, metavar="RULESET")
+    parser.add_argument("keys", nargs="*", help="Titles, indexes or urls to resolve.")
+    parser.add_argument(
+        "--source", default=None, help="Top source, the active one by default."
+    )
+    args = parser.parse_args()
+
+    index = get_layered_index(args.source)
+    if not args.keys:
+        print(json.dumps(index.sources(args.table), indent=2))
+    for key in args.keys:
+        print(json.dumps(index.resolve(args.table, key), indent=2, default=str))
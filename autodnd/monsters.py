@@ -0,0 +1,193 @@
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from autodnd.utils.dataset_cache import DerivedCache, load
+from autodnd.utils.ruleset_enum import RuleSet
+
+# Numeric columns of the Monsters table a query can filter and rank on
+numeric_columns = (
+    "challenge_rating",
+    "xp",
+    "armor_class",
+    "hit_points",
+    "strength",
+    "dexterity",
+    "constitution",
+    "intelligence",
+    "wisdom",
+    "charisma",
+    "proficiency_bonus",
+    "speed_walk",
+    "speed_swim",
+    "speed_fly",
+    "speed_burrow",
+    "speed_climb",
+    "darkvision",
+    "passive_perception",
+    "blindsight",
+    "truesight",
+    "tremorsense",
+)
+
+# Text columns filtered on exact (case insensitive) values
+category_columns = ("size", "type", "subtype", "alignment")
+
+# List columns of damage type names
+damage_columns = ("vulnerable_to", "resistant_to", "immune_to")
+
+# List columns of "<damage type>: <creatures>" notes from the Damage-Types table, filtered on the damage type
+noted_columns = ("noted_strong_against", "noted_weak_against")
+
+# A filter value, one accepted value or several of them
+Accepted = Union[str, Iterable[str], None]
+
+
+def _accepted(value: Union[str, Iterable[str]]) -> list[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+class MonsterIndex:
+    """Vectorized queries over the processed Monsters table.
+
+    The numeric stats are held as float arrays (missing values are NaN and never match a bound), the
+    categories as arrays of casefolded strings and every damage type has a row mask per damage and noted column. A
+    query is a handful of numpy comparisons over the whole table, so filtering and ranking thousands of
+    monsters takes a fraction of a millisecond, most of a query's time goes to building the result frame.
+    """
+
+    def __init__(self, monsters: pd.DataFrame):
+        # Sorted once here so results come out by challenge rating, the index keeps the row numbers of the table
+        self.monsters = monsters.sort_values(
+            ["challenge_rating", "name"], kind="stable"
+        )
+        self.numeric = {
+            i: self.monsters[i].to_numpy(dtype=np.float64, na_value=np.nan)
+            for i in numeric_columns
+        }
+        self.categories = {
+            i: np.array(
+                [j.casefold() if isinstance(j, str) else "" for j in self.monsters[i]]
+            )
+            for i in category_columns
+        }
+        self.damage = {
+            i: self._masks(self.monsters[i]) for i in damage_columns + noted_columns
+        }
+
+    def _masks(self, values: pd.Series) -> dict[str, np.ndarray]:
+        """Row mask of every damage type of a list column, keyed case insensitively.
+
+        A noted entry "Necrotic: Most Undead" is keyed by its damage type, "necrotic".
+        """
+        masks: dict[str, np.ndarray] = {}
+        for row, names in enumerate(values):
+            for name in names if names is not None else []:
+                key = name.split(":", 1)[0].strip().casefold()
+                if key not in masks:
+                    masks[key] = np.zeros(len(values), dtype=bool)
+                masks[key][row] = True
+        return masks
+
+    def rows(
+        self,
+        vulnerable_to: Accepted = None,
+        resistant_to: Accepted = None,
+        immune_to: Accepted = None,
+        noted_strong_against: Accepted = None,
+        noted_weak_against: Accepted = None,
+        **filters: Any,
+    ) -> np.ndarray:
+        """Positions (in self.monsters) of the monsters matching every filter given.
+
+        Filters are keyword arguments named after a column. A numeric column takes a value or a (low, high)
+        range where None is unbounded, e.g. challenge_rating=(3, 5). A category column (size, type, subtype,
+        alignment) takes a value or a list of accepted values. The damage filters keep monsters with any of the
+        damage types given, e.g. vulnerable_to="radiant". The noted filters do the same on the damage types the
+        Damage-Types table notes the monster is strong or weak against, e.g. noted_weak_against="necrotic".
+        """
+        unknown = set(filters) - set(numeric_columns) - set(category_columns)
+        if unknown:
+            raise ValueError(
+                f"Can't filter on {sorted(unknown)}, only on {numeric_columns + category_columns} and the damage "
+                f"columns {damage_columns + noted_columns}"
+            )
+        mask = np.ones(len(self.monsters), dtype=bool)
+        for col, value in filters.items():
+            if value is None:
+                continue
+            if col in category_columns:
+                mask &= np.isin(
+                    self.categories[col], [i.casefold() for i in _accepted(value)]
+                )
+                continue
+            low, high = value if isinstance(value, tuple) else (value, value)
+            values = self.numeric[col]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        damage_filters = (
+            vulnerable_to,
+            resistant_to,
+            immune_to,
+            noted_strong_against,
+            noted_weak_against,
+        )
+        for col, value in zip(damage_columns + noted_columns, damage_filters):
+            if value is None:
+                continue
+            found = np.zeros(len(self.monsters), dtype=bool)
+            for name in _accepted(value):
+                found |= self.damage[col].get(name.casefold(), False)
+            mask &= found
+        return np.flatnonzero(mask)
+
+    def query(
+        self,
+        rank_by: Optional[str] = None,
+        ascending: bool = False,
+        k: Optional[int] = None,
+        **filters: Any,
+    ) -> pd.DataFrame:
+        """The monsters matching the filters of rows.
+
+        E.g. query(type="undead", challenge_rating=(3, 5), vulnerable_to="radiant"). Results are ordered by
+        challenge rating and name, or by the numeric column rank_by (highest first unless ascending, missing
+        values last). k keeps only the first k.
+        """
+        rows = self.rows(**filters)
+        if rank_by is not None:
+            if rank_by not in self.numeric:
+                raise ValueError(f"Can't rank by {rank_by}, only by {numeric_columns}")
+            values = self.numeric[rank_by][rows]
+            keys = values if ascending else -values
+            # NaN sorts last either way
+            rows = rows[np.argsort(keys, kind="stable")]
+        if k is not None:
+            rows = rows[:k]
+        return self.monsters.iloc[rows]
+
+
+# Index of every source of this process, rebuilt when a Monsters parquet of its layers changes
+_index = DerivedCache(
+    [RuleSet.MONSTERS],
+    lambda source: MonsterIndex(load(RuleSet.MONSTERS, source=source)),
+)
+
+
+def get_monster_index() -> MonsterIndex:
+    """The index of the processed Monsters table of the active source, built once per process while its parquets
+    don't change."""
+    return _index.get()
+
+
+def find_monsters(
+    rank_by: Optional[str] = None,
+    ascending: bool = False,
+    k: Optional[int] = None,
+    **filters: Any,
+) -> pd.DataFrame:
+    """Monsters by stats, category and damage types, see MonsterIndex.query."""
+    return get_monster_index().query(rank_by, ascending, k, **filters)
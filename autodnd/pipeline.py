@@ -0,0 +1,415 @@
+import argparse
+import os
+import runpy
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from autodnd.search import index_table
+from autodnd.tables import export_arrow
+from autodnd.utils.dataset_cache import cache_info
+from autodnd.utils.manifest import (
+    code_dependencies,
+    fingerprint,
+    is_up_to_date,
+    write_manifest,
+)
+from autodnd.utils.project_root import get_project_root
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import (
+    base_source,
+    get_source,
+    source_env_var,
+    source_layers,
+)
+
+# folder where the process_*.py stage scripts reside
+scripts_folder = get_project_root() / "scripts"
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A transform stage: a script turning source JSONs (and upstream parquets) into one parquet.
+
+    source is the rule source (see autodnd.utils.sources) whose JSONs the stage processes, into that source's
+    processed folder. The upstream parquets of a homebrew source are merged with those of the sources below it.
+    """
+
+    output: RuleSet
+    script: str
+    sources: tuple[RuleSet, ...]
+    upstream: tuple[RuleSet, ...] = ()
+    source: str = base_source
+
+    @property
+    def name(self) -> str:
+        return self.output.value
+
+    @property
+    def script_path(self) -> Path:
+        return scripts_folder / self.script
+
+    @property
+    def output_path(self) -> Path:
+        return get_source(self.source).processed_folder / f"{self.output.value}.parquet"
+
+    def upstream_paths(self) -> list[Path]:
+        """The upstream parquets the stage merges: those of the SRD and of the homebrew sources up to its own.
+
+        Homebrew sources only have the tables of the JSONs they provide, the ones they don't have are left out.
+        """
+        return [
+            layer.processed_folder / f"{i.value}.parquet"
+            for i in self.upstream
+            for layer in source_layers(self.source)
+            if layer.name == base_source
+            or (layer.processed_folder / f"{i.value}.parquet").exists()
+        ]
+
+    def fingerprint(self) -> dict:
+        """Hash the stage's source JSONs, upstream parquets and code, see autodnd.utils.manifest."""
+        json_folder = get_source(self.source).json_folder
+        return fingerprint(
+            sources=[json_folder / f"{i.value}.json" for i in self.sources],
+            upstream=self.upstream_paths(),
+            code=code_dependencies(self.script_path),
+        )
+
+
+# Every stage of the transform, declared by the RuleSet JSONs it reads and the processed parquets it needs
+STAGES: tuple[Stage, ...] = (
+    Stage(
+        RuleSet.ABILITY_SCORES,
+        "process_abilities-scores.py",
+        (RuleSet.ABILITY_SCORES,),
+    ),
+    Stage(RuleSet.ALIGNMENTS, "process_allignments.py", (RuleSet.ALIGNMENTS,)),
+    Stage(RuleSet.CONDITIONS, "process_conditions.py", (RuleSet.CONDITIONS,)),
+    Stage(RuleSet.DAMAGE_TYPES, "process_damage-types.py", (RuleSet.DAMAGE_TYPES,)),
+    Stage(
+        RuleSet.EQUIPMENT_CATEGORIES,
+        "process_equipment-categories.py",
+        (RuleSet.EQUIPMENT_CATEGORIES,),
+    ),
+    Stage(RuleSet.LANGUAGES, "process_languages.py", (RuleSet.LANGUAGES,)),
+    Stage(RuleSet.MAGIC_ITEMS, "process_magic-items.py", (RuleSet.MAGIC_ITEMS,)),
+    Stage(RuleSet.MAGIC_SCHOOLS, "process_magic-schools.py", (RuleSet.MAGIC_SCHOOLS,)),
+    Stage(
+        RuleSet.SKILLS,
+        "process_skills.py",
+        (RuleSet.SKILLS,),
+        (RuleSet.ABILITY_SCORES,),
+    ),
+    Stage(
+        RuleSet.WEAPON_PROPERTIES,
+        "process_weapon-properties.py",
+        (RuleSet.WEAPON_PROPERTIES,),
+    ),
+    Stage(
+        RuleSet.EQUIPMENT,
+        "process_equipment.py",
+        (RuleSet.EQUIPMENT,),
+        (RuleSet.DAMAGE_TYPES, RuleSet.WEAPON_PROPERTIES),
+    ),
+    Stage(RuleSet.SPELLS, "process_spells.py", (RuleSet.SPELLS,)),
+    Stage(
+        RuleSet.MONSTERS,
+        "process_monsters.py",
+        (RuleSet.MONSTERS,),
+        (RuleSet.DAMAGE_TYPES,),
+    ),
+    Stage(RuleSet.CLASSES, "process_classes.py", (RuleSet.CLASSES,)),
+    Stage(
+        RuleSet.FEATURES,
+        "process_features.py",
+        (RuleSet.FEATURES,),
+        (RuleSet.SPELLS, RuleSet.CLASSES),
+    ),
+    Stage(
+        RuleSet.LEVELS,
+        "process_levels.py",
+        (RuleSet.LEVELS,),
+        (RuleSet.CLASSES, RuleSet.FEATURES),
+    ),
+    Stage(RuleSet.RULE_SECTIONS, "process_rule-sections.py", (RuleSet.RULE_SECTIONS,)),
+    Stage(
+        RuleSet.RULES,
+        "process_rules.py",
+        (RuleSet.RULES,),
+        (RuleSet.RULE_SECTIONS,),
+    ),
+    Stage(
+        RuleSet.PROFICIENCIES,
+        "process_proficiencies.py",
+        (RuleSet.PROFICIENCIES,),
+        (
+            RuleSet.EQUIPMENT_CATEGORIES,
+            RuleSet.EQUIPMENT,
+            RuleSet.ABILITY_SCORES,
+            RuleSet.SKILLS,
+        ),
+    ),
+    Stage(
+        RuleSet.TRAITS,
+        "process_traits.py",
+        (RuleSet.TRAITS,),
+        (RuleSet.PROFICIENCIES,),
+    ),
+    Stage(RuleSet.SUBCLASSES, "process_subclasses.py", (RuleSet.SUBCLASSES,)),
+    Stage(RuleSet.RACES, "process_races.py", (RuleSet.RACES,)),
+    Stage(RuleSet.SUBRACES, "process_subraces.py", (RuleSet.SUBRACES,)),
+    Stage(RuleSet.BACKGROUNDS, "process_backgrounds.py", (RuleSet.BACKGROUNDS,)),
+    Stage(RuleSet.FEATS, "process_feats.py", (RuleSet.FEATS,)),
+)
+
+
+def source_stages(source: str, stages: Iterable[Stage] = STAGES) -> list[Stage]:
+    """The stages of a rule source: those whose source JSONs it has, processing them for that source.
+
+    A homebrew source usually only has a few of the rule JSONs, only their stages run for it. Its other
+    upstream tables come from the sources below it, already processed.
+    """
+    available = set(get_source(source).available())
+    return [
+        replace(stage, source=source)
+        for stage in stages
+        if set(stage.sources) <= available
+    ]
+
+
+def topological_order(stages: Iterable[Stage]) -> list[Stage]:
+    """Order the stages so every stage comes after the stages producing its upstream parquets.
+
+    Homebrew source stages may need upstream parquets no stage produces, those of the sources below them.
+    """
+    stages = list(stages)
+    by_output = {stage.output: stage for stage in stages}
+    assert len(by_output) == len(stages), "Two stages write the same output parquet"
+
+    for stage in stages:
+        if stage.source != base_source:
+            continue
+        missing = [i.value for i in stage.upstream if i not in by_output]
+        assert not missing, (
+            f"Stage {stage.name} needs {missing} but no stage produces it"
+        )
+
+    # Kahn's algorithm, keeping the declaration order among stages that are ready at the same time
+    remaining = {stage.output: set(stage.upstream) & set(by_output) for stage in stages}
+    ordered: list[Stage] = []
+    while remaining:
+        ready = [stage for stage in stages if remaining.get(stage.output) == set()]
+        if not ready:
+            raise ValueError(
+                f"Cyclic stage dependencies between {sorted(i.value for i in remaining)}"
+            )
+        for stage in ready:
+            del remaining[stage.output]
+            ordered.append(stage)
+            for deps in remaining.values():
+                deps.discard(stage.output)
+    return ordered
+
+
+def select_stages(
+    targets: Optional[Iterable[RuleSet]] = None, stages: Iterable[Stage] = STAGES
+) -> list[Stage]:
+    """Return the target stages plus everything they transitively depend on, in dependency order."""
+    ordered = topological_order(stages)
+    if targets is None:
+        return ordered
+
+    by_output = {stage.output: stage for stage in ordered}
+    needed: set[RuleSet] = set()
+    pending = list(targets)
+    while pending:
+        output = pending.pop()
+        if output in needed:
+            continue
+        assert output in by_output, f"No transform stage produces {output.value}"
+        needed.add(output)
+        pending.extend(i for i in by_output[output].upstream if i in by_output)
+    return [stage for stage in ordered if stage.output in needed]
+
+
+@contextmanager
+def _active_source(source: str) -> Iterator[None]:
+    """Make source the active rule source of this process and of the workers it starts."""
+    # The stage scripts find the folders of their source through the environment, workers inherit it
+    previous = os.environ.get(source_env_var)
+    os.environ[source_env_var] = source
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ[source_env_var]
+        else:
+            os.environ[source_env_var] = previous
+
+
+def _run_stage_script(script_path: str) -> float:
+    """Run a stage script as if it was launched from the command line and return its wall time."""
+    start = time.perf_counter()
+    runpy.run_path(script_path, run_name="__main__")
+    return time.perf_counter() - start
+
+
+def run_pipeline(
+    targets: Optional[Iterable[RuleSet]] = None,
+    max_workers: Optional[int] = None,
+    stages: Iterable[Stage] = STAGES,
+    force: bool = False,
+    source: Optional[str] = None,
+) -> dict[RuleSet, float]:
+    """Run the transform stages in a process pool, starting each one as soon as its upstream stages finish.
+
+    The pool's worker processes live for the whole run so pandas and friends are only imported once per worker.
+    With max_workers=1 the stages run one after the other in this process instead, so every source JSON and
+    upstream parquet loaded through autodnd.utils.dataset_cache is parsed once per run rather than once per
+    consuming stage.
+    A stage whose source JSONs, upstream parquets and code all hash the same as recorded in its manifest is
+    skipped unless force is set, so only the dependents of something that changed get rebuilt.
+    Returns the wall time of every stage that ran. If a stage fails, its dependents are not run and a
+    RuntimeError is raised once all the other stages have finished.
+    With a homebrew source (see autodnd.utils.sources) only the stages of the JSONs it has run, writing to its
+    own processed folder and reading the upstream tables it doesn't produce from the sources below it, so
+    adding a small pack never re-runs the SRD stages.
+    """
+    source = get_source(source).name
+    if source != base_source:
+        stages = source_stages(source, stages)
+    ordered = select_stages(targets, stages)
+    produced = {stage.output for stage in ordered}
+    waiting_on = {stage.output: set(stage.upstream) & produced for stage in ordered}
+    timings: dict[RuleSet, float] = {}
+    failed: dict[RuleSet, BaseException] = {}
+    skipped: set[RuleSet] = set()
+    running: dict[Future, tuple[Stage, dict]] = {}
+    up_to_date: list[RuleSet] = []
+
+    def release(output: RuleSet) -> None:
+        for deps in waiting_on.values():
+            deps.discard(output)
+
+    in_process = max_workers == 1
+    pool: Executor = (
+        ThreadPoolExecutor(max_workers=1)
+        if in_process
+        else ProcessPoolExecutor(max_workers=max_workers)
+    )
+
+    start = time.perf_counter()
+    with _active_source(source), pool:
+
+        def submit_ready() -> None:
+            # Skipping an up to date stage can make its dependents ready, so loop until nothing changes
+            changed = True
+            while changed:
+                changed = False
+                for stage in ordered:
+                    if waiting_on.get(stage.output) != set():
+                        continue
+                    del waiting_on[stage.output]
+                    stage_fingerprint = stage.fingerprint()
+                    if not force and is_up_to_date(
+                        stage.output_path, stage_fingerprint
+                    ):
+                        up_to_date.append(stage.output)
+                        release(stage.output)
+                        changed = True
+                        continue
+                    print(f"Starting stage {stage.name} ...")
+                    future = pool.submit(_run_stage_script, str(stage.script_path))
+                    running[future] = (stage, stage_fingerprint)
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, stage_fingerprint = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    print(f"Stage {stage.name} failed: {error!r}")
+                    failed[stage.output] = error
+                    # Nothing downstream of a failed stage can run
+                    blocked = [stage.output]
+                    while blocked:
+                        output = blocked.pop()
+                        for other, deps in list(waiting_on.items()):
+                            if output in deps:
+                                del waiting_on[other]
+                                skipped.add(other)
+                                blocked.append(other)
+                    continue
+                timings[stage.output] = future.result()
+                print(f"Finished stage {stage.name} in {timings[stage.output]:.2f}s")
+                write_manifest(stage.output_path, stage_fingerprint)
+                # Memory-mappable copy for the readers of autodnd.tables and the search index segment, of
+                # the table merged across the layers under a homebrew source
+                export_arrow(stage.output)
+                index_table(stage.output)
+                release(stage.output)
+            submit_ready()
+    if up_to_date:
+        print(f"Skipped up to date stages {sorted(i.value for i in up_to_date)}")
+    if in_process:
+        info = cache_info()
+        print(
+            f"Dataset cache: {info['hits']} hits, {info['misses']} misses, "
+            f"{info['nbytes'] / 1024**2:.1f} MiB held"
+        )
+    print(
+        f"Transform finished in {time.perf_counter() - start:.2f}s "
+        f"(sum of stage times {sum(timings.values()):.2f}s)"
+    )
+    if failed:
+        raise RuntimeError(
+            f"Stages {sorted(i.value for i in failed)} failed, "
+            f"skipped their dependents {sorted(i.value for i in skipped)}"
+        )
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the dnd rules transform stages.")
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        type=RuleSet,
+        metavar="RULESET",
+        help="Only build these outputs, e.g. Traits, and what they depend on. Builds everything by default.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes. 1 runs the stages in this process, sharing loaded datasets.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild the stages even if their manifests say they are up to date.",
+    )
+    parser.add_argument(
+        "--source",
+        default=None,
+        help="Rule source to process, see autodnd.utils.sources. The SRD by default.",
+    )
+    args = parser.parse_args()
+
+    run_pipeline(
+        targets=args.targets or None,
+        max_workers=args.workers,
+        force=args.force,
+        source=args.source,
+    )
@@ -0,0 +1,316 @@
+from typing import Iterable, Mapping, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from autodnd.utils.dataset_cache import DerivedCache, load
+from autodnd.utils.ruleset_enum import RuleSet
+
+# Processed tables the graph is built from
+graph_tables = (RuleSet.FEATURES, RuleSet.SUBCLASSES)
+
+# String the Features stage fills missing values with
+unknown_value_fill_string = "Unknown or Not Applicable"
+
+
+class Node(NamedTuple):
+    """A vertex of the prerequisite graph.
+
+    kind is one of:
+    - "level": a class level, e.g. Node("level", "Wizard 2", "Wizard", 2)
+    - "subclass": a subclass of a class, e.g. Node("subclass", "Evocation", "Wizard")
+    - "spell": a spell the character knows, e.g. Node("spell", "Fireball")
+    - "feature": a class or subclass feature, owned by its subclass or else its class, at the level it's
+      gained (features like Ability Score Improvement come back at several levels)
+    - "subclass_spell": a spell a subclass grants, owned by the subclass, at the class level it's granted
+    The first three are facts of a build, the last two are unlocked by them.
+    """
+
+    kind: str
+    name: str
+    owner: str = ""
+    level: int = 0
+
+
+# Kinds of nodes a build states directly rather than unlocks
+fact_kinds = ("level", "subclass", "spell")
+
+
+def level_node(class_name: str, level: int) -> Node:
+    return Node("level", f"{class_name} {int(level)}", class_name, int(level))
+
+
+class PrerequisiteGraph:
+    """Features and subclass spells with their prerequisites, as a typed DAG with a precomputed closure.
+
+    Nodes get integer ids in topological order (every node comes after all of its prerequisites) and the edges
+    are held as CSR arrays both ways. The transitive closure is a bit matrix, row i holding every node node i
+    transitively needs, so "what chain unlocks X" is one row and "what does this build unlock" is one AND of
+    the matrix against the facts the build is missing. A cycle in the rules is reported when the graph is
+    built instead of looping at query time.
+    """
+
+    def __init__(self, edges: Mapping[Node, Iterable[Node]]):
+        requires = {i: list(dict.fromkeys(j)) for i, j in edges.items()}
+        for node in [j for i in requires.values() for j in i]:
+            requires.setdefault(node, [])
+
+        self.nodes = self._topological_order(requires)
+        self.ids = {j: i for i, j in enumerate(self.nodes)}
+        self.is_fact = np.array([i.kind in fact_kinds for i in self.nodes])
+
+        # The fact nodes by what a build states: the levels of every class and the subclass and spell names
+        levels: dict[str, list[tuple[int, int]]] = {}
+        self._named: dict[tuple[str, str], list[int]] = {}
+        for i, node in enumerate(self.nodes):
+            if node.kind == "level":
+                levels.setdefault(node.owner, []).append((node.level, i))
+            elif node.kind in fact_kinds:
+                self._named.setdefault((node.kind, node.name), []).append(i)
+        self._levels = {
+            i: (np.array([k for k, _ in j]), np.array([k for _, k in j]))
+            for i, j in levels.items()
+        }
+
+        # Direct prerequisites (and dependents) of node i are indices[indptr[i]:indptr[i + 1]]
+        self.requires_indptr, self.requires_indices = self._csr(
+            [[self.ids[j] for j in requires[i]] for i in self.nodes]
+        )
+        # A feature named by a prerequisite but missing from the tables has no prerequisites of its own, it can
+        # never be unlocked and neither can anything needing it
+        self.is_unresolved = ~self.is_fact & (np.diff(self.requires_indptr) == 0)
+
+        unlocks: list[list[int]] = [[] for _ in self.nodes]
+        for dependent, needed in enumerate(
+            self._rows(self.requires_indptr, self.requires_indices)
+        ):
+            for i in needed:
+                unlocks[i].append(dependent)
+        self.unlocks_indptr, self.unlocks_indices = self._csr(unlocks)
+
+        # Ancestors of every node, built in topological order so prerequisites are complete before dependents.
+        # Rows are built straight into the packed bits (as np.packbits lays them out, bit j of a row is the
+        # 0x80 >> j % 8 bit of byte j // 8), never holding the unpacked nodes x nodes matrix
+        self.closure = np.zeros((len(self.nodes), (len(self.nodes) + 7) // 8), np.uint8)
+        for position, needed in enumerate(
+            self._rows(self.requires_indptr, self.requires_indices)
+        ):
+            if len(needed):
+                row = np.bitwise_or.reduce(self.closure[needed], axis=0)
+                np.bitwise_or.at(
+                    row, needed >> 3, (0x80 >> (needed & 7)).astype(np.uint8)
+                )
+                self.closure[position] = row
+
+    @staticmethod
+    def _topological_order(requires: Mapping[Node, list[Node]]) -> list[Node]:
+        """Kahn's algorithm, raising a ValueError naming the nodes of any cycle."""
+        remaining = {i: len(j) for i, j in requires.items()}
+        dependents: dict[Node, list[Node]] = {i: [] for i in requires}
+        for node, needed in requires.items():
+            for i in needed:
+                dependents[i].append(node)
+        ready = sorted(i for i, j in remaining.items() if j == 0)
+        ordered: list[Node] = []
+        while ready:
+            node = ready.pop()
+            ordered.append(node)
+            for i in dependents[node]:
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    ready.append(i)
+        if len(ordered) != len(requires):
+            cyclic = sorted(i for i, j in remaining.items() if j > 0)
+            raise ValueError(f"Cyclic prerequisites between {cyclic}")
+        return ordered
+
+    @staticmethod
+    def _csr(rows: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(i) for i in rows])
+        indices = np.array([j for i in rows for j in i], dtype=np.int64)
+        return indptr, indices
+
+    @staticmethod
+    def _rows(indptr: np.ndarray, indices: np.ndarray) -> Iterable[np.ndarray]:
+        return (indices[indptr[i] : indptr[i + 1]] for i in range(len(indptr) - 1))
+
+    def _id(self, node: Node) -> int:
+        try:
+            return self.ids[node]
+        except KeyError:
+            raise KeyError(
+                f"No {node.kind} {node.name!r} in the prerequisite graph"
+            ) from None
+
+    def prerequisites(self, node: Node) -> list[Node]:
+        """The direct prerequisites of a node."""
+        i = self._id(node)
+        return [
+            self.nodes[j]
+            for j in self.requires_indices[
+                self.requires_indptr[i] : self.requires_indptr[i + 1]
+            ]
+        ]
+
+    def unlocks(self, node: Node) -> list[Node]:
+        """The nodes a node is a direct prerequisite of."""
+        i = self._id(node)
+        return [
+            self.nodes[j]
+            for j in self.unlocks_indices[
+                self.unlocks_indptr[i] : self.unlocks_indptr[i + 1]
+            ]
+        ]
+
+    def chain(self, node: Node) -> list[Node]:
+        """Everything a node transitively needs, in an order they can be gained in."""
+        row = np.unpackbits(self.closure[self._id(node)], count=len(self.nodes))
+        return [self.nodes[i] for i in np.flatnonzero(row)]
+
+    def facts(self, node: Node) -> list[Node]:
+        """The class levels, subclasses and spells a node transitively needs."""
+        return [i for i in self.chain(node) if i.kind in fact_kinds]
+
+    def fact_mask(
+        self,
+        class_levels: Mapping[str, int],
+        subclasses: Iterable[str] = (),
+        spells: Iterable[str] = (),
+    ) -> np.ndarray:
+        """Mask of the fact nodes a build states: its class levels (and the levels below), subclasses and spells."""
+        mask = np.zeros(len(self.nodes), dtype=bool)
+        for class_name, level in class_levels.items():
+            if class_name in self._levels:
+                levels, ids = self._levels[class_name]
+                mask[ids[levels <= level]] = True
+        for kind, names in (("subclass", subclasses), ("spell", spells)):
+            for name in names:
+                mask[self._named.get((kind, name), [])] = True
+        return mask
+
+    def unlocked(
+        self,
+        class_levels: Mapping[str, int],
+        subclasses: Iterable[str] = (),
+        spells: Iterable[str] = (),
+        kind: Optional[str] = None,
+    ) -> list[Node]:
+        """The features and subclass spells a build unlocks, e.g. unlocked({"Wizard": 14}, ["Evocation"]).
+
+        A node is unlocked when the build has every fact it transitively needs. kind keeps only one kind.
+        """
+        missing = self.is_unresolved | (
+            self.is_fact & ~self.fact_mask(class_levels, subclasses, spells)
+        )
+        blocked = missing | (self.closure & np.packbits(missing)).any(axis=1)
+        found = np.flatnonzero(~blocked & ~self.is_fact)
+        return [
+            self.nodes[i] for i in found if kind is None or self.nodes[i].kind == kind
+        ]
+
+
+class _FeatureNames:
+    """Feature nodes by name. Prerequisites name a feature without its class or level, so the feature is looked
+    up in the subclass of the one needing it first, then in its class, then anywhere, earliest level first.
+    """
+
+    def __init__(self, nodes: Iterable[Node]):
+        self._nodes: dict[str, list[Node]] = {}
+        for node in sorted(nodes, key=lambda x: x.level):
+            self._nodes.setdefault(node.name, []).append(node)
+
+    def find(self, name: str, owner: str, class_name: str) -> Node:
+        candidates = self._nodes.get(name)
+        if not candidates:
+            return Node("feature", name)
+        for wanted in (owner, class_name):
+            for candidate in candidates:
+                if candidate.owner == wanted:
+                    return candidate
+        return candidates[0]
+
+
+def _feature_edges(features: pd.DataFrame) -> dict[Node, list[Node]]:
+    """Every feature needs its class level and subclass, its parent feature and its listed prerequisites."""
+    nodes = [
+        Node(
+            "feature",
+            name,
+            class_name if subclass_name == unknown_value_fill_string else subclass_name,
+            int(level),
+        )
+        for name, class_name, subclass_name, level in zip(
+            features["name"],
+            features["class_name"],
+            features["subclass_name"],
+            features["level"],
+        )
+    ]
+    names = _FeatureNames(nodes)
+
+    edges: dict[Node, list[Node]] = {}
+    for node, class_name, subclass_name, parent, prerequisites in zip(
+        nodes,
+        features["class_name"],
+        features["subclass_name"],
+        features["parent_name"],
+        features["prerequisites"],
+    ):
+        needed = edges.setdefault(node, [])
+        needed.append(level_node(class_name, node.level))
+        if subclass_name != unknown_value_fill_string:
+            needed.append(Node("subclass", subclass_name, class_name))
+        if parent != unknown_value_fill_string:
+            needed.append(names.find(parent, node.owner, class_name))
+        prerequisites = prerequisites if isinstance(prerequisites, dict) else {}
+        if prerequisites.get("level") is not None:
+            needed.append(level_node(class_name, prerequisites["level"]))
+        if prerequisites.get("feature") is not None:
+            needed.append(names.find(prerequisites["feature"], node.owner, class_name))
+        if prerequisites.get("spell") is not None:
+            needed.append(Node("spell", prerequisites["spell"]))
+    return edges
+
+
+def _subclass_spell_edges(
+    subclasses: pd.DataFrame, names: _FeatureNames
+) -> dict[Node, list[Node]]:
+    """Every spell a subclass grants needs the subclass, its class level and its prerequisite features."""
+    edges: dict[Node, list[Node]] = {}
+    for subclass_name, class_name, spells in zip(
+        subclasses["name"], subclasses["class_name"], subclasses["spells"]
+    ):
+        for spell in spells if spells is not None else []:
+            level = spell["level"] if spell["level"] is not None else 0
+            needed = edges.setdefault(
+                Node("subclass_spell", spell["name"], subclass_name, int(level)), []
+            )
+            needed.append(Node("subclass", subclass_name, class_name))
+            if level:
+                needed.append(level_node(class_name, level))
+            for name in spell["features"] if spell["features"] is not None else []:
+                needed.append(names.find(name, subclass_name, class_name))
+    return edges
+
+
+def build_graph(features: pd.DataFrame, subclasses: pd.DataFrame) -> PrerequisiteGraph:
+    """The prerequisite graph of the processed Features and Subclasses tables."""
+    edges = _feature_edges(features)
+    edges.update(_subclass_spell_edges(subclasses, _FeatureNames(edges)))
+    return PrerequisiteGraph(edges)
+
+
+# Graph of every source of this process, rebuilt when one of the parquets of its layers changes
+_graph = DerivedCache(
+    graph_tables,
+    lambda source: build_graph(
+        load(RuleSet.FEATURES, source=source), load(RuleSet.SUBCLASSES, source=source)
+    ),
+)
+
+
+def get_prerequisite_graph() -> PrerequisiteGraph:
+    """The graph of the processed tables of the active source, built once per process while the parquets
+    don't change."""
+    return _graph.get()
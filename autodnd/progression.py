@@ -0,0 +1,186 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from autodnd.utils.dataset_cache import DerivedCache, load
+from autodnd.utils.ruleset_enum import RuleSet
+
+# Integer columns of the Levels table, held as (key, level) arrays
+number_columns = (
+    "prof_bonus",
+    "ability_score_bonuses",
+    "cantrips_known",
+    "spells_known",
+)
+spell_slot_columns = tuple(f"spell_slots_level_{i}" for i in range(1, 10))
+
+
+@dataclass(frozen=True)
+class LevelProgression:
+    """What a class, or a subclass of it, has at a level."""
+
+    class_name: str
+    subclass_name: Optional[str]
+    level: int
+    prof_bonus: Optional[int]
+    ability_score_bonuses: Optional[int]
+    cantrips_known: Optional[int]
+    spells_known: Optional[int]
+    # Slots of spell levels 1 to 9
+    spell_slots: tuple[int, ...]
+    # Class and subclass specific counters, e.g. sneak_attack_dice_count
+    counters: dict[str, float]
+    # Features gained at this level
+    features: tuple[str, ...]
+    # Features gained at this level or before
+    features_up_to: tuple[str, ...]
+
+
+def _key(class_name: str, subclass: Optional[str]) -> tuple[str, str]:
+    return class_name.casefold(), "" if subclass is None else subclass.casefold()
+
+
+def _optional(value: int) -> Optional[int]:
+    return None if value < 0 else int(value)
+
+
+class ProgressionTable:
+    """The processed Levels table as dense arrays indexed by (class/subclass code, level - 1).
+
+    Every class and subclass gets an integer code, the numbers of the table are (code, level) integer arrays
+    (missing values are -1) and the spell slots a (code, level, spell level) array. The record of every
+    (class, subclass, level), with its cumulative features, is built once here, so a lookup is a dict access
+    and a list index whatever the size of the table.
+    """
+
+    def __init__(self, levels: pd.DataFrame):
+        self.max_level = int(levels["level"].max())
+        subclasses = [None if pd.isna(i) else i for i in levels["subclass_name"]]
+        self.codes: dict[tuple[str, str], int] = {}
+        for class_name, subclass in zip(levels["class_name"], subclasses):
+            self.codes.setdefault(_key(class_name, subclass), len(self.codes))
+
+        codes = np.array(
+            [self.codes[_key(i, j)] for i, j in zip(levels["class_name"], subclasses)]
+        )
+        positions = (codes, levels["level"].to_numpy(dtype=np.int64) - 1)
+        shape = (len(self.codes), self.max_level)
+        self.numbers = {}
+        for col in number_columns:
+            self.numbers[col] = np.full(shape, -1, dtype=np.int64)
+            self.numbers[col][positions] = levels[col].to_numpy(
+                dtype=np.int64, na_value=-1
+            )
+        self.spell_slots = np.zeros(shape + (len(spell_slot_columns),), dtype=np.int64)
+        self.spell_slots[positions] = levels[list(spell_slot_columns)].to_numpy(
+            dtype=np.int64, na_value=0
+        )
+
+        self._records: list[Optional[LevelProgression]] = [None] * (shape[0] * shape[1])
+        gained: dict[int, list[str]] = {}
+        rows = levels.assign(code=codes).sort_values(["code", "level"], kind="stable")
+        for code, class_name, subclass, level, counters, features in zip(
+            rows["code"],
+            rows["class_name"],
+            rows["subclass_name"],
+            rows["level"],
+            rows["counters"],
+            rows["features"],
+        ):
+            level = int(level)
+            features = tuple(features) if features is not None else ()
+            gained.setdefault(code, []).extend(features)
+            self._records[code * self.max_level + level - 1] = LevelProgression(
+                class_name=class_name,
+                subclass_name=None if pd.isna(subclass) else subclass,
+                level=level,
+                **{
+                    i: _optional(self.numbers[i][code, level - 1])
+                    for i in number_columns
+                },
+                spell_slots=tuple(int(i) for i in self.spell_slots[code, level - 1]),
+                counters={
+                    i["name"]: i["value"]
+                    for i in (counters if counters is not None else [])
+                },
+                features=features,
+                features_up_to=tuple(gained[code]),
+            )
+
+    def code(self, class_name: str, subclass: Optional[str] = None) -> int:
+        """The code of a class, or of a subclass of it. Raises a KeyError if the table doesn't have it."""
+        try:
+            return self.codes[_key(class_name, subclass)]
+        except KeyError:
+            raise KeyError(
+                f"No progression for {class_name}"
+                + ("" if subclass is None else f" ({subclass})")
+            ) from None
+
+    def lookup(
+        self, class_name: str, level: int, subclass: Optional[str] = None
+    ) -> LevelProgression:
+        """What a level-N class (or subclass) gets, e.g. lookup("Wizard", 5, subclass="Evocation")."""
+        if not 1 <= level <= self.max_level:
+            raise ValueError(f"Levels go from 1 to {self.max_level}, not {level}")
+        record = self._records[
+            self.code(class_name, subclass) * self.max_level + level - 1
+        ]
+        if record is None:
+            raise KeyError(
+                f"No progression for {class_name} at level {level}"
+                + ("" if subclass is None else f" ({subclass})")
+            )
+        return record
+
+    def values(
+        self,
+        column: str,
+        class_name: str,
+        levels: Iterable[int],
+        subclass: Optional[str] = None,
+    ) -> np.ndarray:
+        """One number of the table (or the spell slots, column "spell_slots") at many levels, as an array.
+
+        Missing numbers are -1.
+        """
+        code = self.code(class_name, subclass)
+        levels = np.fromiter(levels, dtype=np.int64)
+        if np.any((levels < 1) | (levels > self.max_level)):
+            raise ValueError(f"Levels go from 1 to {self.max_level}, not {levels}")
+        index = levels - 1
+        if column == "spell_slots":
+            return self.spell_slots[code, index]
+        if column not in self.numbers:
+            raise ValueError(
+                f"No {column} column, only {number_columns} and spell_slots"
+            )
+        return self.numbers[column][code, index]
+
+    def features_up_to(
+        self, class_name: str, level: int, subclass: Optional[str] = None
+    ) -> tuple[str, ...]:
+        """The features of a class (or subclass) gained at this level or before."""
+        return self.lookup(class_name, level, subclass).features_up_to
+
+
+# Table of every source of this process, rebuilt when a Levels parquet of its layers changes
+_table = DerivedCache(
+    [RuleSet.LEVELS],
+    lambda source: ProgressionTable(load(RuleSet.LEVELS, source=source)),
+)
+
+
+def get_progression_table() -> ProgressionTable:
+    """The progression table of the processed Levels of the active source, built once per process while its
+    parquets don't change."""
+    return _table.get()
+
+
+def level_progression(
+    class_name: str, level: int, subclass: Optional[str] = None
+) -> LevelProgression:
+    """What a level-N class (or subclass) gets, see ProgressionTable.lookup."""
+    return get_progression_table().lookup(class_name, level, subclass)
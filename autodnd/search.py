@@ -0,0 +1,325 @@
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from autodnd.utils.dataset_cache import load, table_paths
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import get_source
+
+# Subfolder of the processed tables of a source holding one index segment per table
+index_subfolder = "search"
+
+# Prose columns indexed in every table that has them
+text_columns = (
+    "desc",
+    "rule_section_as_instructions",
+    "reference",
+    "examples",
+    "typical_speakers",
+    "ability_desc",
+    "damage_type_desc",
+)
+
+# Columns naming a row, the first one a table has is the title of its documents. Titles count twice.
+title_columns = ("name", "ability_name", "equipment_category")
+
+# Columns a query can be filtered on
+filter_columns = ("class_name", "subclass_name", "level", "rarity_name", "races")
+
+# BM25 parameters
+k1 = 1.2
+b = 0.75
+
+token_pattern = re.compile(r"[a-z0-9]+")
+stop_words = frozenset(
+    "a an and are as at be been but by can do for from has have if in into is it its not of on or so "
+    "that the their them then there these they this to was were what when which while who will with "
+    "you your".split()
+)
+
+
+def _stem(token: str) -> str:
+    """A light suffix stemmer, enough for grapple, grappled, grappling and grapples to match."""
+    for suffix in ("ing", "ed", "es", "s", "e"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            if suffix == "s" and token.endswith("ss"):
+                break
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        _stem(i) for i in token_pattern.findall(text.lower()) if i not in stop_words
+    ]
+
+
+def field_text(value: Any) -> str:
+    """The text of a cell, joining lists of strings."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return " ".join(i for i in value if isinstance(i, str))
+    return ""
+
+
+def documents(df: pd.DataFrame) -> list[tuple[str, str]]:
+    """The title and the prose of every row of a processed table."""
+    title_col = next((i for i in title_columns if i in df.columns), None)
+    titles = (
+        df[title_col].map(field_text) if title_col else pd.Series("", index=df.index)
+    )
+    prose = [df[i].map(field_text) for i in text_columns if i in df.columns]
+    texts = zip(*prose) if prose else [()] * len(df)
+    return [(title, " ".join(i for i in row if i)) for title, row in zip(titles, texts)]
+
+
+def index_folder(source: Optional[str] = None) -> Path:
+    """Folder of the index segments of a source, the active one by default."""
+    return get_source(source).processed_folder / index_subfolder
+
+
+def segment_path(ruleset: RuleSet, source: Optional[str] = None) -> Path:
+    return index_folder(source) / f"{ruleset.value}.npz"
+
+
+def index_table(ruleset: RuleSet, source: Optional[str] = None) -> Path:
+    """Build the index segment of one processed table and write it next to the other segments.
+
+    Under a homebrew source the table merged across its layers is indexed, so its rows line up with
+    autodnd.tables.open_table and autodnd.utils.dataset_cache.load. Every row is a document. A segment holds
+    the sorted terms of the table, the postings (document and term frequency) of every term, the document
+    lengths and the filterable fields, so rebuilding one table never touches the others.
+    """
+    df = load(ruleset, source=source)
+    docs = documents(df)
+
+    postings: dict[str, list[tuple[int, int]]] = {}
+    lengths = np.zeros(len(df), dtype=np.int32)
+    for doc, (title, text) in enumerate(docs):
+        tokens = tokenize(title) * 2 + tokenize(text)
+        lengths[doc] = len(tokens)
+        for term, count in Counter(tokens).items():
+            postings.setdefault(term, []).append((doc, count))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[i]) for i in terms])
+    flat = [j for i in terms for j in postings[i]]
+    # Any-typed values, np.savez also takes its allow_pickle flag as a keyword
+    arrays: dict[str, Any] = {
+        "terms": np.array(terms, dtype=str),
+        "offsets": offsets,
+        "doc_ids": np.array([i[0] for i in flat], dtype=np.int32),
+        "term_freqs": np.array([i[1] for i in flat], dtype=np.int32),
+        "doc_lengths": lengths,
+        "titles": np.array([i[0] for i in docs], dtype=str),
+    }
+    for col in filter_columns:
+        if col in df.columns:
+            arrays[f"filter_{col}"] = np.array(
+                ["" if pd.isna(i) else str(i) for i in df[col]], dtype=str
+            )
+
+    # Written to a temp file and renamed into place so a reader never sees half a segment
+    target = segment_path(ruleset, source)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_file = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, target)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+    return target
+
+
+def build_index(
+    rulesets: Optional[Iterable[RuleSet]] = None, source: Optional[str] = None
+) -> None:
+    """Index every processed table (or the given ones) of a source, the active one by default."""
+    for ruleset in RuleSet if rulesets is None else rulesets:
+        if table_paths(ruleset, source):
+            index_table(ruleset, source)
+
+
+@dataclass
+class _Segment:
+    ruleset: RuleSet
+    mtime: int
+    terms: np.ndarray
+    offsets: np.ndarray
+    doc_ids: np.ndarray
+    term_freqs: np.ndarray
+    doc_lengths: np.ndarray
+    titles: np.ndarray
+    filters: dict[str, np.ndarray]
+
+    @classmethod
+    def read(cls, ruleset: RuleSet, path: Path) -> "_Segment":
+        with np.load(path) as arrays:
+            return cls(
+                ruleset=ruleset,
+                mtime=path.stat().st_mtime_ns,
+                terms=arrays["terms"],
+                offsets=arrays["offsets"],
+                doc_ids=arrays["doc_ids"],
+                term_freqs=arrays["term_freqs"],
+                doc_lengths=arrays["doc_lengths"],
+                titles=arrays["titles"],
+                filters={
+                    i.removeprefix("filter_"): arrays[i]
+                    for i in arrays.files
+                    if i.startswith("filter_")
+                },
+            )
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(self.terms, term))
+        if i == len(self.terms) or self.terms[i] != term:
+            return self.doc_ids[:0], self.term_freqs[:0]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.doc_ids[start:end], self.term_freqs[start:end]
+
+
+class SearchIndex:
+    """BM25 ranked search over the index segments of the processed tables."""
+
+    def __init__(self, segments: Iterable[_Segment]):
+        self.segments = {i.ruleset: i for i in segments}
+        self.num_docs = sum(len(i.doc_lengths) for i in self.segments.values())
+        total_length = sum(int(i.doc_lengths.sum()) for i in self.segments.values())
+        self.avg_length = total_length / self.num_docs if self.num_docs else 0.0
+        # The length normalization of the BM25 term frequency, per document
+        self._norms = {
+            ruleset: k1 * (1 - b + b * i.doc_lengths / (self.avg_length or 1.0))
+            for ruleset, i in self.segments.items()
+        }
+
+    def _idf(self, term: str) -> float:
+        doc_freq = sum(len(i.postings(term)[0]) for i in self.segments.values())
+        return math.log(1 + (self.num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        tables: Optional[Iterable[RuleSet]] = None,
+        **filters: Any,
+    ) -> pd.DataFrame:
+        """The k best matching rows, as a frame of table, row (position in the table), name and score.
+
+        Filters are exact matches on the filter_columns, e.g. class_name="Wizard", level=3, or a list/range of
+        accepted values. Tables without a filtered column don't match.
+        """
+        unknown = set(filters) - set(filter_columns)
+        if unknown:
+            raise ValueError(
+                f"Can't filter on {sorted(unknown)}, only {filter_columns}"
+            )
+        terms = Counter(tokenize(query))
+        idfs = {term: self._idf(term) for term in terms}
+        tables = set(self.segments if tables is None else tables)
+
+        found = []
+        for ruleset, segment in self.segments.items():
+            if ruleset not in tables or not set(filters) <= set(segment.filters):
+                continue
+            scores = np.zeros(len(segment.doc_lengths))
+            norms = self._norms[ruleset]
+            for term, weight in terms.items():
+                doc_ids, term_freqs = segment.postings(term)
+                # A document appears once in the postings of a term, so this fancy indexed add is safe
+                scores[doc_ids] += (
+                    weight
+                    * idfs[term]
+                    * term_freqs
+                    * (k1 + 1)
+                    / (term_freqs + norms[doc_ids])
+                )
+            mask = scores > 0
+            for col, value in filters.items():
+                accepted = (
+                    [str(i) for i in value]
+                    if isinstance(value, (list, tuple, set, range))
+                    else [str(value)]
+                )
+                mask &= np.isin(segment.filters[col], accepted)
+            rows = np.flatnonzero(mask)
+            found.append((ruleset, rows, scores[rows], segment.titles[rows]))
+
+        columns = ["table", "row", "name", "score"]
+        if not found or not sum(len(i[1]) for i in found):
+            return pd.DataFrame(columns=columns)
+        table = np.concatenate([np.full(len(i[1]), i[0].value) for i in found])
+        rows = np.concatenate([i[1] for i in found])
+        scores = np.concatenate([i[2] for i in found])
+        titles = np.concatenate([i[3] for i in found])
+        top = np.argsort(-scores, kind="stable")[:k]
+        return pd.DataFrame(
+            {
+                "table": table[top],
+                "row": rows[top],
+                "name": titles[top],
+                "score": scores[top],
+            },
+            columns=columns,
+        )
+
+
+# Segments loaded by this process, reloaded when their file changes, and the index of every source
+_segments: dict[Path, _Segment] = {}
+_indexes: dict[str, SearchIndex] = {}
+_lock = threading.Lock()
+
+
+def get_index(source: Optional[str] = None) -> SearchIndex:
+    """The index over every processed table of a source (the active one by default), refreshed when a segment is
+    rewritten.
+
+    A table processed before it had a segment, or re-processed since in any of the layers of the source, is
+    indexed on the fly.
+    """
+    name = get_source(source).name
+    with _lock:
+        segments = []
+        for ruleset in RuleSet:
+            parquet_paths = table_paths(ruleset, name)
+            path = segment_path(ruleset, name)
+            if not parquet_paths:
+                _segments.pop(path, None)
+                continue
+            if not path.exists() or path.stat().st_mtime_ns < max(
+                i.stat().st_mtime_ns for i in parquet_paths
+            ):
+                index_table(ruleset, name)
+            cached = _segments.get(path)
+            if cached is None or cached.mtime != path.stat().st_mtime_ns:
+                cached = _Segment.read(ruleset, path)
+                _segments[path] = cached
+            segments.append(cached)
+        index = _indexes.get(name)
+        if index is None or [id(i) for i in index.segments.values()] != [
+            id(i) for i in segments
+        ]:
+            index = SearchIndex(segments)
+            _indexes[name] = index
+        return index
+
+
+def search(
+    query: str, k: int = 10, tables: Optional[Iterable[RuleSet]] = None, **filters: Any
+) -> pd.DataFrame:
+    """Ranked full-text search over all processed tables of the active source, see SearchIndex.search."""
+    return get_index().search(query, k, tables, **filters)
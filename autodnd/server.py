@@ -0,0 +1,563 @@
+import argparse
+import asyncio
+import bisect
+import http.client
+import json
+import socket
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Union
+
+import pyarrow as pa
+
+from autodnd.layers import LayeredIndex, get_layered_index, key_columns
+from autodnd.search import get_index
+from autodnd.utils.dataset_cache import DerivedCache
+from autodnd.utils.ruleset_enum import RuleSet
+
+default_host = "127.0.0.1"
+default_port = 8765
+
+# Number of encoded responses kept in the cache
+cache_size = 1024
+
+# The processed tables are checked for changes at most this often, in seconds
+refresh_interval = 1.0
+
+# Largest request body accepted, in bytes
+max_body_bytes = 16 * 1024**2
+
+# Upper bounds of the latency histogram buckets in milliseconds, doubling from 50µs to about 13s
+latency_buckets_ms = tuple(0.05 * 2**i for i in range(19))
+
+Address = Union[tuple[str, int], str, Path]
+
+
+def _key(value: Any) -> str:
+    return str(value).strip().casefold()
+
+
+def _is_scalar(data_type: pa.DataType) -> bool:
+    return not (
+        pa.types.is_list(data_type)
+        or pa.types.is_large_list(data_type)
+        or pa.types.is_struct(data_type)
+        or pa.types.is_map(data_type)
+    )
+
+
+class _Table:
+    """A processed table merged across the layers of a source, with hash indexes over its filtered columns.
+
+    The records are those of autodnd.layers, keys are resolved through the layered index.
+    """
+
+    def __init__(self, ruleset: RuleSet, layered: LayeredIndex):
+        self.ruleset = ruleset
+        self.layered = layered
+        layers = layered.table(ruleset)
+        self.columns = list(dict.fromkeys(j for i in layers for j in i.columns))
+        self.scalar_columns = {
+            i
+            for i in self.columns
+            if all(_is_scalar(j.schema.field(i).type) for j in layers if i in j.columns)
+        }
+        self.key_columns = [i for i in key_columns if i in self.scalar_columns]
+        self.records: list[dict[str, Any]] = []
+        self.sources: list[str] = []
+        # Row of the merged table of every (source, row of the source's table)
+        self.positions: dict[tuple[str, int], int] = {}
+        for source, row, record in layered.rows(ruleset):
+            self.positions[source, row] = len(self.records)
+            self.records.append(record)
+            self.sources.append(source)
+        # Secondary indexes of the scalar columns, built the first time a column is filtered on
+        self._secondary: dict[str, dict[Any, list[int]]] = {}
+
+    def resolve(self, key: Any) -> list[int]:
+        """Rows of a key (titles, index and url), case insensitive. Several rows can share a title, e.g. the
+        Ability Score Improvement features."""
+        return [
+            self.positions[i["source"], i["row"]]
+            for i in self.layered.resolve(self.ruleset, key)
+        ]
+
+    def secondary(self, column: str) -> dict[Any, list[int]]:
+        if column not in self.scalar_columns:
+            raise ValueError(
+                f"Can't select {self.ruleset.value} rows by {column}, only by {sorted(self.scalar_columns)}"
+            )
+        index = self._secondary.get(column)
+        if index is None:
+            index = {}
+            for row, record in enumerate(self.records):
+                value = record.get(column)
+                index.setdefault(
+                    _key(value) if isinstance(value, str) else value, []
+                ).append(row)
+            self._secondary[column] = index
+        return index
+
+    def record(self, row: int, columns: Optional[list[str]]) -> dict[str, Any]:
+        record = self.records[row]
+        if columns is None:
+            return record
+        return {i: record[i] for i in columns if i in record}
+
+
+class QueryIndex:
+    """Every processed table of a source and the sources below it, loaded once through autodnd.layers.
+
+    A key is a title (name, ability_name, equipment_category), an index or a url, matched case insensitively
+    and resolved through the layered index, so a homebrew row overrides the rows it replaces. Lookups of any
+    number of keys over any number of tables are dict accesses, no table is scanned.
+    """
+
+    def __init__(self, layered: LayeredIndex):
+        self.tables = {ruleset: _Table(ruleset, layered) for ruleset in layered.layers}
+
+    def table(self, name: str) -> _Table:
+        try:
+            ruleset = RuleSet(name)
+        except ValueError:
+            raise ValueError(f"No table {name}, only {RuleSet.to_list()}") from None
+        if ruleset not in self.tables:
+            raise ValueError(f"Table {name} hasn't been processed")
+        return self.tables[ruleset]
+
+    def _tables(self, names: Optional[Iterable[str]]) -> list[_Table]:
+        if names is None:
+            return list(self.tables.values())
+        return [self.table(i) for i in names]
+
+    def resolve(
+        self,
+        keys: Iterable[Any],
+        tables: Optional[Iterable[str]] = None,
+        columns: Optional[list[str]] = None,
+    ) -> list[dict[str, Any]]:
+        """The rows of every key, in the order of the keys, e.g. 500 names over Equipment, Spells and Conditions."""
+        searched = self._tables(tables)
+        results = []
+        for key in keys:
+            matches = [
+                {
+                    "table": i.ruleset.value,
+                    "row": row,
+                    "source": i.sources[row],
+                    "record": i.record(row, columns),
+                }
+                for i in searched
+                for row in i.resolve(key)
+            ]
+            results.append({"key": key, "matches": matches})
+        return results
+
+    def records(
+        self, table: str, rows: Iterable[int], columns: Optional[list[str]] = None
+    ) -> list[Optional[dict[str, Any]]]:
+        """The records at positions of a table, None where a position is out of range."""
+        found = self.table(table)
+        return [
+            found.record(i, columns) if 0 <= i < len(found.records) else None
+            for i in rows
+        ]
+
+    def select(
+        self,
+        table: str,
+        where: dict[str, Any],
+        columns: Optional[list[str]] = None,
+        limit: Optional[int] = None,
+    ) -> list[dict[str, Any]]:
+        """The rows of a table whose scalar columns equal the values of where, or one of them for a list.
+
+        E.g. select("Spells", {"level": [1, 2], "school_name": "Evocation"}). Rows come in table order.
+        """
+        found = self.table(table)
+        selected: Optional[set[int]] = None
+        for column, value in where.items():
+            index = found.secondary(column)
+            accepted = value if isinstance(value, list) else [value]
+            matching: set[int] = set()
+            for i in accepted:
+                matching.update(index.get(_key(i) if isinstance(i, str) else i, ()))
+            selected = matching if selected is None else selected & matching
+        ordered = sorted(range(len(found.records)) if selected is None else selected)
+        return [
+            {"row": row, "record": found.record(row, columns)}
+            for row in ordered[:limit]
+        ]
+
+
+# Index of every source of this process, rebuilt when one of the processed parquets of its layers changes
+_index = DerivedCache(RuleSet, lambda source: QueryIndex(get_layered_index(source)))
+
+
+def get_query_index() -> QueryIndex:
+    """The query index of every processed table of the active source, built once per process while the
+    parquets don't change."""
+    return _index.get()
+
+
+class LatencyHistogram:
+    """Counts of request latencies in the latency_buckets_ms buckets, the last one open ended."""
+
+    def __init__(self):
+        self.counts = [0] * (len(latency_buckets_ms) + 1)
+        self.total_ms = 0.0
+
+    def record(self, seconds: float) -> None:
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(latency_buckets_ms, ms)] += 1
+        self.total_ms += ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q quantile, in milliseconds."""
+        rank = q * sum(self.counts)
+        seen = 0
+        for bound, count in zip(latency_buckets_ms, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> dict[str, Any]:
+        count = sum(self.counts)
+        return {
+            "count": count,
+            "mean_ms": self.total_ms / count if count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                f"le_{bound:g}ms": count
+                for bound, count in zip(latency_buckets_ms, self.counts)
+                if count
+            }
+            | ({"le_infms": self.counts[-1]} if self.counts[-1] else {}),
+        }
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _list(payload: dict[str, Any], name: str) -> list[Any]:
+    value = payload.get(name)
+    if not isinstance(value, list):
+        raise ValueError(f"{name} must be a list")
+    return value
+
+
+def _optional_list(payload: dict[str, Any], name: str) -> Optional[list[Any]]:
+    return None if payload.get(name) is None else _list(payload, name)
+
+
+class QueryServer:
+    """The processed tables served over HTTP from one asyncio loop, with a response cache and latency histograms.
+
+    Every endpoint answers a batch: POST /resolve {"keys": [...], "tables": [...], "columns": [...]}, /records
+    {"table": ..., "rows": [...]}, /select {"queries": [{"table": ..., "where": {...}, "limit": ...}]} and
+    /search {"queries": [...], "k": ..., "tables": [...]}. GET /tables lists the tables, /stats the latencies
+    and the cache, /health is a liveness check. Responses are cached by request until a processed table changes.
+    """
+
+    def __init__(self, cache_size: int = cache_size):
+        self.cache_size = cache_size
+        self.cache: OrderedDict[tuple[str, str, bytes], bytes] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self.index = get_query_index()
+        self._checked = time.monotonic()
+        self._routes: dict[tuple[str, str], Callable[[dict[str, Any]], Any]] = {
+            ("GET", "/health"): self.health,
+            ("GET", "/tables"): self.list_tables,
+            ("GET", "/stats"): self.stats,
+            ("POST", "/resolve"): self.resolve,
+            ("POST", "/records"): self.records,
+            ("POST", "/select"): self.select,
+            ("POST", "/search"): self.search,
+        }
+        self._paths = {i[1] for i in self._routes}
+        # Endpoints describing the server itself, never cached
+        self._uncached = {"/health", "/stats"}
+
+    def refresh(self) -> None:
+        """Pick up re-processed tables, dropping the cached responses, at most every refresh_interval seconds."""
+        now = time.monotonic()
+        if now - self._checked < refresh_interval:
+            return
+        self._checked = now
+        index = get_query_index()
+        if index is not self.index:
+            self.index = index
+            self.cache.clear()
+
+    def health(self, payload: dict[str, Any]) -> dict[str, Any]:
+        return {"status": "ok", "tables": len(self.index.tables)}
+
+    def list_tables(self, payload: dict[str, Any]) -> dict[str, Any]:
+        return {
+            ruleset.value: {
+                "rows": len(i.records),
+                "columns": i.columns,
+                "keys": i.key_columns,
+            }
+            for ruleset, i in self.index.tables.items()
+        }
+
+    def stats(self, payload: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "endpoints": {i: j.summary() for i, j in self.histograms.items()},
+            "cache": {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "entries": len(self.cache),
+                "max_entries": self.cache_size,
+            },
+        }
+
+    def resolve(self, payload: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "results": self.index.resolve(
+                _list(payload, "keys"),
+                _optional_list(payload, "tables"),
+                _optional_list(payload, "columns"),
+            )
+        }
+
+    def records(self, payload: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "records": self.index.records(
+                str(payload.get("table")),
+                _list(payload, "rows"),
+                _optional_list(payload, "columns"),
+            )
+        }
+
+    def select(self, payload: dict[str, Any]) -> dict[str, Any]:
+        results = []
+        for query in _list(payload, "queries"):
+            if not isinstance(query, dict) or not isinstance(
+                query.get("where", {}), dict
+            ):
+                raise ValueError("queries must be objects with a where object")
+            results.append(
+                self.index.select(
+                    str(query.get("table")),
+                    query.get("where", {}),
+                    _optional_list(query, "columns"),
+                    query.get("limit"),
+                )
+            )
+        return {"results": results}
+
+    def search(self, payload: dict[str, Any]) -> dict[str, Any]:
+        tables = _optional_list(payload, "tables")
+        tables = (
+            None if tables is None else [self.index.table(i).ruleset for i in tables]
+        )
+        index = get_index()
+        return {
+            "results": [
+                index.search(str(i), int(payload.get("k", 10)), tables).to_dict(
+                    "records"
+                )
+                for i in _list(payload, "queries")
+            ]
+        }
+
+    def respond(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, bytes]:
+        """The status and the JSON body answering a request, from the cache if it was answered before."""
+        self.refresh()
+        handler = self._routes.get((method, path))
+        if handler is None:
+            if path in self._paths:
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} {path}")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint {path}")
+
+        cacheable = path not in self._uncached
+        key = (method, path, body)
+        if cacheable:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                self.cache.move_to_end(key)
+                return HTTPStatus.OK, cached
+            self.cache_misses += 1
+
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {error}") from None
+        if not isinstance(payload, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The body must be a JSON object")
+        try:
+            response = json.dumps(handler(payload), default=str).encode()
+        except (ValueError, TypeError) as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(error)) from None
+
+        if cacheable:
+            self.cache[key] = response
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return HTTPStatus.OK, response
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the requests of one connection, kept alive until the client closes it."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._write(
+                        writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, b"", False
+                    )
+                    return
+                start = time.perf_counter()
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ")
+                except ValueError:
+                    await self._write(writer, HTTPStatus.BAD_REQUEST, b"", False)
+                    return
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    if version == "HTTP/1.1"
+                    else headers.get("connection", "").lower() == "keep-alive"
+                )
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._write(writer, HTTPStatus.BAD_REQUEST, b"", False)
+                    return
+                if length > max_body_bytes:
+                    await self._write(
+                        writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, b"", False
+                    )
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                path = target.split("?", 1)[0]
+                try:
+                    status, response = self.respond(method, path, body)
+                except HTTPError as error:
+                    status = error.status
+                    response = json.dumps({"error": str(error)}).encode()
+                await self._write(writer, status, response, keep_alive)
+                if path in self._paths:
+                    self.histograms.setdefault(path, LatencyHistogram()).record(
+                        time.perf_counter() - start
+                    )
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _write(
+        writer: asyncio.StreamWriter, status: HTTPStatus, body: bytes, keep_alive: bool
+    ) -> None:
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+
+async def start_server(
+    address: Address = (default_host, default_port),
+    server: Optional[QueryServer] = None,
+) -> asyncio.Server:
+    """Start serving the processed tables on a (host, port) or a Unix socket path."""
+    server = QueryServer() if server is None else server
+    if isinstance(address, tuple):
+        return await asyncio.start_server(server.handle, *address)
+    return await asyncio.start_unix_server(server.handle, str(address))
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def request(
+    path: str,
+    payload: Optional[dict[str, Any]] = None,
+    address: Address = (default_host, default_port),
+    timeout: float = 30.0,
+) -> Any:
+    """Query a running server, POSTing payload if there is one. Raises a RuntimeError on an error response."""
+    if isinstance(address, tuple):
+        connection = http.client.HTTPConnection(*address, timeout=timeout)
+    else:
+        connection = _UnixHTTPConnection(str(address), timeout)
+    try:
+        if payload is None:
+            connection.request("GET", path)
+        else:
+            connection.request(
+                "POST",
+                path,
+                body=json.dumps(payload),
+                headers={"Content-Type": "application/json"},
+            )
+        response = connection.getresponse()
+        body = json.loads(response.read() or b"null")
+    finally:
+        connection.close()
+    if response.status != HTTPStatus.OK:
+        raise RuntimeError(f"{response.status} {response.reason}: {body}")
+    return body
+
+
+async def serve(address: Address) -> None:
+    server = await start_server(address)
+    print(f"Serving {len(get_query_index().tables)} tables on {address}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the processed tables to local clients over HTTP."
+    )
+    parser.add_argument("--host", default=default_host)
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument(
+        "--unix", type=Path, help="Listen on this Unix socket instead of a port."
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.unix if args.unix else (args.host, args.port)))
+    except KeyboardInterrupt:
+        pass
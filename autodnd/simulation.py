@@ -0,0 +1,250 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from autodnd.utils.dataset_cache import load
+from autodnd.utils.dice import DiceExpression, RandomState, compile_dice
+from autodnd.utils.ruleset_enum import RuleSet
+
+# The attack rules, see the making-an-attack and advantage-and-disadvantage Rule-Sections:
+# a natural 20 always hits and is a critical hit, a natural 1 always misses
+critical_hit_roll = 20
+automatic_miss_roll = 1
+
+
+@dataclass(frozen=True)
+class StatBlock:
+    """The parts of a creature's stat block that matter for trading attacks."""
+
+    name: str
+    armor_class: int
+    hit_points: int
+    attack_bonus: int
+    # dice expression of one hit, modifiers included, e.g. "1d8+3"
+    damage: str
+    attacks_per_round: int = 1
+    # 1 to attack with advantage, -1 with disadvantage
+    advantage: int = 0
+
+
+def proficiency_bonus(level: int) -> int:
+    """Proficiency bonus of a character level: +2 at levels 1-4 going up by one every 4 levels."""
+    return (level - 1) // 4 + 2
+
+
+def _dice_only(damage: DiceExpression) -> DiceExpression:
+    """The dice of a damage expression without its modifier, these are rolled again on a critical hit."""
+    return DiceExpression(damage.text, damage.terms, 0)
+
+
+def _d20(n: int, rng: np.random.Generator, advantage: int) -> np.ndarray:
+    rolls = rng.integers(1, 21, size=n)
+    if advantage:
+        other = rng.integers(1, 21, size=n)
+        rolls = np.maximum(rolls, other) if advantage > 0 else np.minimum(rolls, other)
+    return rolls
+
+
+def attack_damage(
+    damage: str,
+    attack_bonus: int,
+    armor_class: int,
+    n: int,
+    seed: RandomState = None,
+    advantage: int = 0,
+) -> np.ndarray:
+    """Damage dealt by n independent attacks, 0 for the misses."""
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    expression = compile_dice(damage)
+    d20 = _d20(n, rng, advantage)
+    crit = d20 == critical_hit_roll
+    hit = crit | ((d20 != automatic_miss_roll) & (d20 + attack_bonus >= armor_class))
+    dealt = expression.roll_many(n, rng)
+    dealt[crit] += _dice_only(expression).roll_many(int(crit.sum()), rng)
+    return np.where(hit, np.maximum(dealt, 0), 0)
+
+
+def expected_attack_damage(
+    damage: str, attack_bonus: int, armor_class: int, advantage: int = 0
+) -> float:
+    """Exact expected damage of one attack, what attack_damage converges to (ignoring the clamp at 0)."""
+    d20 = compile_dice({1: "d20adv", -1: "d20dis"}.get(advantage, "d20")).distribution
+    p_crit = d20.prob_at_least(critical_hit_roll)
+    # anything from the roll needed to beat the armor class up, but never a natural 1 and always a natural 20
+    needed = min(
+        max(armor_class - attack_bonus, automatic_miss_roll + 1), critical_hit_roll
+    )
+    p_hit = d20.prob_at_least(needed)
+    expression = compile_dice(damage)
+    return (
+        p_hit * expression.expected_value
+        + p_crit * _dice_only(expression).expected_value
+    )
+
+
+def damage_per_round(
+    attacker: StatBlock, armor_class: int, n: int, seed: RandomState = None
+) -> np.ndarray:
+    """Damage the attacker deals in each of n simulated rounds against the given armor class."""
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    total = np.zeros(n, dtype=np.int64)
+    for _ in range(attacker.attacks_per_round):
+        total += attack_damage(
+            attacker.damage,
+            attacker.attack_bonus,
+            armor_class,
+            n,
+            rng,
+            attacker.advantage,
+        )
+    return total
+
+
+def simulate_duel(
+    a: StatBlock,
+    b: StatBlock,
+    n: int,
+    seed: RandomState = None,
+    max_rounds: int = 100,
+) -> dict[str, float]:
+    """Fight n duels between two stat blocks at once, all duels advancing one round per step.
+
+    Initiative is a coin flip per duel. A creature dropped to 0 hit points before its turn doesn't attack.
+    """
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    hp_a = np.full(n, a.hit_points, dtype=np.int64)
+    hp_b = np.full(n, b.hit_points, dtype=np.int64)
+    a_first = rng.random(n) < 0.5
+    rounds = np.zeros(n, dtype=np.int64)
+
+    for _ in range(max_rounds):
+        active = (hp_a > 0) & (hp_b > 0)
+        if not active.any():
+            break
+        rounds += active
+        # the creature going first always swings, the other only if still standing
+        hit_b = damage_per_round(a, b.armor_class, n, rng)
+        hit_a = damage_per_round(b, a.armor_class, n, rng)
+        hp_b -= np.where(active & a_first, hit_b, 0)
+        hp_a -= np.where(active & ~a_first, hit_a, 0)
+        hp_a -= np.where(active & a_first & (hp_b > 0), hit_a, 0)
+        hp_b -= np.where(active & ~a_first & (hp_a > 0), hit_b, 0)
+
+    return {
+        f"{a.name}_wins": float(((hp_a > 0) & (hp_b <= 0)).mean()),
+        f"{b.name}_wins": float(((hp_b > 0) & (hp_a <= 0)).mean()),
+        "unfinished": float(((hp_a > 0) & (hp_b > 0)).mean()),
+        "mean_rounds": float(rounds.mean()),
+    }
+
+
+def load_weapons(two_handed: bool = False) -> pd.DataFrame:
+    """The weapons of the processed Equipment table with their damage dice."""
+    dice_col = "two_handed_damage_damage_dice" if two_handed else "damage_damage_dice"
+    equipment = load(
+        RuleSet.EQUIPMENT, ["name", "weapon_range", "properties", dice_col]
+    )
+    return (
+        equipment.dropna(subset=[dice_col])
+        .rename(columns={dice_col: "damage_dice"})
+        .reset_index(drop=True)
+    )
+
+
+def _sweep_weapon(
+    weapon: str,
+    damage_dice: str,
+    levels: list[int],
+    armor_classes: list[int],
+    ability_modifier: int,
+    n: int,
+    seed: np.random.SeedSequence,
+    advantage: int,
+) -> list[dict]:
+    """Expected damage of one weapon over the level x armor class grid.
+
+    All grid cells share the same n d20 and damage rolls, so differences between cells aren't noise.
+    """
+    rng = np.random.default_rng(seed)
+    expression = compile_dice(f"{damage_dice}{ability_modifier:+d}")
+    d20 = _d20(n, rng, advantage)
+    crit = d20 == critical_hit_roll
+    dealt = expression.roll_many(n, rng)
+    dealt[crit] += _dice_only(compile_dice(damage_dice)).roll_many(int(crit.sum()), rng)
+    dealt = np.maximum(dealt, 0)
+
+    can_hit = d20 != automatic_miss_roll
+    ac = np.asarray(armor_classes)[None, :]
+    rows: list[dict[str, Any]] = []
+    for level in levels:
+        bonus = proficiency_bonus(level) + ability_modifier
+        hit = crit[:, None] | (can_hit[:, None] & (d20[:, None] + bonus >= ac))
+        mean_damage = (hit * dealt[:, None]).mean(axis=0)
+        hit_rate = hit.mean(axis=0)
+        rows.extend(
+            {
+                "weapon": weapon,
+                "level": level,
+                "armor_class": armor_class,
+                "expected_damage": float(mean_damage[i]),
+                "hit_rate": float(hit_rate[i]),
+            }
+            for i, armor_class in enumerate(armor_classes)
+        )
+    return rows
+
+
+def sweep_weapons(
+    weapons: Optional[pd.DataFrame] = None,
+    levels: Iterable[int] = range(1, 21),
+    armor_classes: Iterable[int] = range(10, 21),
+    ability_modifier: int = 3,
+    n: int = 100_000,
+    seed: Optional[int] = None,
+    advantage: int = 0,
+    max_workers: Optional[int] = 1,
+) -> pd.DataFrame:
+    """Expected damage per attack for every weapon x character level x target armor class.
+
+    weapons needs name and damage_dice columns and defaults to load_weapons(). Every weapon is simulated
+    with n attacks per grid cell, spread over max_workers processes (None for one per core). Every weapon
+    draws its n attack and damage rolls once and reuses them over the whole level x armor class grid. The
+    rolls drawn per second are reported in the returned frame's attrs["rolls_per_second"].
+    """
+    weapons = load_weapons() if weapons is None else weapons
+    levels, armor_classes = list(levels), list(armor_classes)
+    seeds = np.random.SeedSequence(seed).spawn(len(weapons))
+    tasks = [
+        (name, dice, levels, armor_classes, ability_modifier, n, s, advantage)
+        for name, dice, s in zip(weapons["name"], weapons["damage_dice"], seeds)
+    ]
+
+    if not tasks:
+        # No weapon to sweep, pool.map can't even be called without any
+        output_df = pd.DataFrame(
+            columns=["weapon", "level", "armor_class", "expected_damage", "hit_rate"]
+        )
+        output_df.attrs["rolls_per_second"] = 0.0
+        return output_df
+
+    start = time.perf_counter()
+    if max_workers == 1:
+        results = [_sweep_weapon(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_sweep_weapon, *zip(*tasks)))
+    elapsed = time.perf_counter() - start
+
+    output_df = pd.DataFrame([row for rows in results for row in rows])
+    # n d20s (twice that with advantage or disadvantage) and n damage rolls per weapon, whatever the grid
+    rolls = n * len(tasks) * (3 if advantage else 2)
+    output_df.attrs["rolls_per_second"] = rolls / elapsed if elapsed else float("inf")
+    print(
+        f"Drew {rolls:,} rolls for {len(output_df):,} grid cells in {elapsed:.2f}s "
+        f"({output_df.attrs['rolls_per_second']:,.0f} rolls per second)"
+    )
+    return output_df
@@ -0,0 +1,383 @@
+import argparse
+import runpy
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import pandas as pd
+
+from autodnd.utils.backend import Backend, get_backend
+from autodnd.utils.dataset_cache import load, load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+
+# ---- Column operations. They only change which columns there are and what they're called, so a run of them
+# ---- compiles to a single selection of the frame
+
+
+@dataclass(frozen=True)
+class Project:
+    """Keep only these columns."""
+
+    columns: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Drop:
+    """Remove these columns."""
+
+    columns: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class Rename:
+    """Rename columns, old name -> new name."""
+
+    columns: dict[str, str]
+
+
+# ---- Row operations, computing columns
+
+
+@dataclass(frozen=True)
+class JoinText:
+    """Join a column of lists of strings with sep, into another column or in place.
+
+    The replacements are then applied to the joined text and the suffix appended to it.
+    """
+
+    column: str
+    sep: str = ""
+    into: Optional[str] = None
+    replace: tuple[tuple[str, str], ...] = ()
+    suffix: str = ""
+
+    @property
+    def reads(self) -> set[str]:
+        return {self.column}
+
+    @property
+    def writes(self) -> set[str]:
+        return {self.into or self.column}
+
+    def apply(self, df: pd.DataFrame, backend: Backend) -> pd.DataFrame:
+        joined = backend.join_text(df[self.column], self.sep)
+        for old, new in self.replace:
+            joined = joined.str.replace(old, new, regex=False)
+        return df.assign(**{self.into or self.column: joined + self.suffix})
+
+
+@dataclass(frozen=True)
+class ListField:
+    """Take one key of every record of a column of lists of records, e.g. the names of the classes."""
+
+    column: str
+    key: str
+    into: Optional[str] = None
+
+    @property
+    def reads(self) -> set[str]:
+        return {self.column}
+
+    @property
+    def writes(self) -> set[str]:
+        return {self.into or self.column}
+
+    def apply(self, df: pd.DataFrame, backend: Backend) -> pd.DataFrame:
+        return df.assign(
+            **{self.into or self.column: backend.list_field(df[self.column], self.key)}
+        )
+
+
+@dataclass(frozen=True)
+class Explode:
+    """One row per element of these list columns, exploded one after the other."""
+
+    columns: tuple[str, ...]
+
+    @property
+    def reads(self) -> set[str]:
+        return set(self.columns)
+
+    @property
+    def writes(self) -> set[str]:
+        return set(self.columns)
+
+    def apply(self, df: pd.DataFrame, backend: Backend) -> pd.DataFrame:
+        return backend.explode(df, self.columns)
+
+
+@dataclass(frozen=True)
+class LookupJoin:
+    """Add columns of a processed upstream table, matching its right_on column (on by default) to on.
+
+    columns maps the upstream columns to the names they get. Rows without a match get missing values. When a key
+    appears more than once upstream the first row wins, so the join never changes the number of rows.
+    """
+
+    table: RuleSet
+    on: str
+    columns: dict[str, str]
+    right_on: Optional[str] = None
+
+    @property
+    def reads(self) -> set[str]:
+        return {self.on}
+
+    @property
+    def writes(self) -> set[str]:
+        return set(self.columns.values())
+
+    def apply(
+        self, df: pd.DataFrame, backend: Backend, needed: Optional[set[str]] = None
+    ) -> pd.DataFrame:
+        right_on = self.right_on or self.on
+        # Only the upstream columns used downstream are read from the parquet
+        columns = {
+            i: j for i, j in self.columns.items() if needed is None or j in needed
+        }
+        try:
+            upstream = load(self.table, [right_on, *columns])
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f"The {self.table.value} parquet file is missing. You need to run its stage first to generate the dataset."
+            )
+        upstream = (
+            upstream.drop_duplicates(right_on)
+            .rename(columns=columns)
+            .rename(columns={right_on: self.on})
+        )
+        return pd.merge(df, upstream, on=self.on, how="left")
+
+
+@dataclass(frozen=True)
+class Fill:
+    """Fill the missing values of these columns (all by default) with value."""
+
+    value: Any
+    columns: Optional[tuple[str, ...]] = None
+
+    @property
+    def reads(self) -> set[str]:
+        return set()
+
+    @property
+    def writes(self) -> set[str]:
+        return set(self.columns or ())
+
+    def apply(self, df: pd.DataFrame, backend: Backend) -> pd.DataFrame:
+        if self.columns is None:
+            return df.fillna(self.value)
+        present = [i for i in self.columns if i in df.columns]
+        return df.fillna({i: self.value for i in present})
+
+
+ColumnOperation = Union[Project, Drop, Rename]
+RowOperation = Union[JoinText, ListField, Explode, LookupJoin, Fill]
+Operation = Union[ColumnOperation, RowOperation]
+
+
+@dataclass(frozen=True)
+class StageSpec:
+    """A transform stage declared as data: a source JSON, the operations applied to it and the output columns.
+
+    input_columns are all the flattened columns of the source JSON, the schema it's checked against. The
+    columns starting with one of variable_prefixes are not checked, see autodnd.utils.ingest.check_schema.
+    output_columns are the columns of the processed table, in order. With typed the table is cast to its
+    registered schema (autodnd.utils.schemas.SCHEMAS), na_value being the sentinel of its missing values.
+    """
+
+    output: RuleSet
+    input_columns: tuple[str, ...]
+    operations: tuple[Operation, ...]
+    output_columns: tuple[str, ...]
+    source: Optional[RuleSet] = None
+    variable_prefixes: tuple[str, ...] = ()
+    typed: bool = False
+    na_value: Optional[str] = None
+
+    @property
+    def upstream(self) -> tuple[RuleSet, ...]:
+        """The processed tables the stage joins."""
+        return tuple(i.table for i in self.operations if isinstance(i, LookupJoin))
+
+
+@dataclass(frozen=True)
+class Select:
+    """Select columns in order, renaming them. What a run of column operations compiles to."""
+
+    columns: tuple[str, ...]
+    rename: dict[str, str]
+
+    def apply(self, df: pd.DataFrame, backend: Backend) -> pd.DataFrame:
+        df = df[list(self.columns)]
+        return df.rename(columns=self.rename) if self.rename else df
+
+
+@dataclass(frozen=True)
+class Plan:
+    """A compiled stage spec: the source columns to load and the steps to run on them."""
+
+    spec: StageSpec
+    load_columns: tuple[str, ...]
+    steps: tuple[Union[Select, RowOperation], ...]
+    # Columns used by the steps after every step, the LookupJoins only read those of their table
+    needed: tuple[frozenset[str], ...]
+    # Operations of the spec left out because nothing uses what they compute
+    eliminated: tuple[Operation, ...]
+
+    def explain(self) -> str:
+        source = (self.spec.source or self.spec.output).value
+        skipped = sorted(set(self.spec.input_columns) - set(self.load_columns))
+        lines = [
+            f"{self.spec.output.value} <- {source}.json {list(self.load_columns)}"
+            + (f", never loaded {skipped}" if skipped else "")
+        ]
+        lines += [f"  {i}" for i in self.steps]
+        lines += [f"  eliminated {i}" for i in self.eliminated]
+        return "\n".join(lines)
+
+
+def compile_spec(spec: StageSpec) -> Plan:
+    """Turn a spec into a plan.
+
+    Going backwards from the output columns, every operation is reduced to the columns it needs: operations
+    whose results are never used are eliminated, and the source JSON is only streamed for the columns still
+    needed at the start (the upstream tables of the lookup joins only for the columns they add that are used).
+    Going forward, every run of projections, drops and renames, plus the pruning of columns nothing uses anymore,
+    is fused into a single Select before the row operation that follows it and one last Select for the output.
+    """
+    # Backward pass, the columns needed after every operation
+    needed = set(spec.output_columns)
+    needed_after: list[set[str]] = [set()] * len(spec.operations)
+    live = [True] * len(spec.operations)
+    for position in range(len(spec.operations) - 1, -1, -1):
+        operation = spec.operations[position]
+        needed_after[position] = set(needed)
+        if isinstance(operation, Project):
+            lost = needed - set(operation.columns)
+            if lost:
+                raise ValueError(
+                    f"{sorted(lost)} are needed but {operation} drops them"
+                )
+        elif isinstance(operation, Drop):
+            needed -= set(operation.columns)
+        elif isinstance(operation, Rename):
+            new_names = {j: i for i, j in operation.columns.items()}
+            needed = {new_names.get(i, i) for i in needed}
+        elif (
+            isinstance(operation, Explode)
+            # Filling every column can't be pruned
+            or (isinstance(operation, Fill) and operation.columns is None)
+            or operation.writes & needed
+        ):
+            needed = (needed - operation.writes) | operation.reads
+            if isinstance(operation, Fill):
+                needed |= operation.writes
+        else:
+            live[position] = False
+
+    available = set(spec.input_columns) | set(spec.variable_prefixes)
+    missing = needed - available
+    if missing:
+        raise ValueError(f"{sorted(missing)} are neither in the source nor computed")
+    load_columns = tuple(
+        i for i in (*spec.input_columns, *spec.variable_prefixes) if i in needed
+    )
+
+    # Forward pass, (column of the frame, name it has by now) of every column still around
+    current = [(i, i) for i in load_columns]
+    steps: list[Union[Select, RowOperation]] = []
+    step_needed: list[frozenset[str]] = []
+
+    def select(order: Optional[tuple[str, ...]], keep: set[str]) -> None:
+        nonlocal current
+        kept = [i for i in current if i[1] in keep]
+        if order is not None:
+            by_name = {i[1]: i for i in kept}
+            kept = [by_name[i] for i in order]
+        if kept != [(i, i) for i, _ in current]:
+            steps.append(
+                Select(tuple(i for i, _ in kept), {i: j for i, j in kept if i != j})
+            )
+            step_needed.append(frozenset(j for _, j in kept))
+        current = [(j, j) for _, j in kept]
+
+    for position, operation in enumerate(spec.operations):
+        if not live[position]:
+            continue
+        if isinstance(operation, Project):
+            current = [i for i in current if i[1] in operation.columns]
+        elif isinstance(operation, Drop):
+            current = [i for i in current if i[1] not in operation.columns]
+        elif isinstance(operation, Rename):
+            current = [(i, operation.columns.get(j, j)) for i, j in current]
+        else:
+            # The row operation reads the columns by their current names, and only what's used later is kept
+            select(None, needed_after[position] | operation.reads)
+            steps.append(operation)
+            step_needed.append(frozenset(needed_after[position]))
+            names = [j for _, j in current]
+            current += [(i, i) for i in sorted(operation.writes - set(names))]
+    select(spec.output_columns, set(spec.output_columns))
+
+    return Plan(
+        spec=spec,
+        load_columns=load_columns,
+        steps=tuple(steps),
+        needed=tuple(step_needed),
+        eliminated=tuple(i for i, j in zip(spec.operations, live) if not j),
+    )
+
+
+def run_spec(spec: StageSpec, backend: Optional[Backend] = None) -> pd.DataFrame:
+    """Compile a stage spec, run its plan and save the processed table. Returns the table."""
+    plan = compile_spec(spec)
+    backend = get_backend() if backend is None else backend
+
+    # Stream in only the columns the plan needs, checking the JSON data has the expected schema on the way.
+    # Loads are shared with other stages running in this process
+    df = load_json(
+        spec.source or spec.output,
+        plan.load_columns,
+        expected_columns=spec.input_columns,
+        variable_prefixes=spec.variable_prefixes,
+    )
+    for step, needed in zip(plan.steps, plan.needed):
+        if isinstance(step, LookupJoin):
+            df = step.apply(df, backend, set(needed))
+        else:
+            df = step.apply(df, backend)
+
+    # Check if the output data has the expected schema before saving
+    assert df.columns.to_list() == list(spec.output_columns), (
+        "Unexpected column names, schema has probably changed"
+    )
+    if spec.typed:
+        df = apply_schema(df, spec.output, spec.na_value)
+
+    # Save the table as a parquet file, in the folder of the source the stage runs for
+    save_folder = processed_folder()
+    save_folder.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(save_folder / f"{spec.output.value}.parquet", engine="pyarrow")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Show the compiled plan of the stage spec declared by stage scripts."
+    )
+    parser.add_argument("scripts", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    # The scripts declare their specs with the classes of autodnd.specs, not those of this __main__ module
+    import autodnd.specs as specs
+
+    for script in args.scripts:
+        spec = runpy.run_path(str(script)).get("spec")
+        if not isinstance(spec, specs.StageSpec):
+            print(f"{script} doesn't declare a stage spec")
+            continue
+        print(specs.compile_spec(spec).explain())
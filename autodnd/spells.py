@@ -0,0 +1,131 @@
+from typing import Any, Iterable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from autodnd.utils.dataset_cache import DerivedCache, load
+from autodnd.utils.reference_resolver import ReferenceIndex
+from autodnd.utils.ruleset_enum import RuleSet
+
+# A filter value, one accepted value or several of them
+Accepted = Union[str, Iterable[str], None]
+
+
+def _accepted(value: Union[str, Iterable[str]]) -> list[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+class SpellIndex:
+    """Secondary indexes of the processed Spells table by class, level and school.
+
+    Every class and school has a precomputed row mask and the levels are held as one integer array, so a
+    query like find(classes="Wizard", max_level=3, school="Evocation") is a few vectorized ands over a few
+    hundred booleans, well under a millisecond, instead of scanning the list column of every spell.
+    """
+
+    def __init__(self, spells: pd.DataFrame):
+        # Sorted once here so lookups come out ordered, the index keeps the row numbers of the table
+        self.spells = spells.sort_values(["level", "name"], kind="stable")
+        self.levels = self.spells["level"].to_numpy(dtype=np.int64)
+        self._by_class = self._masks(self.spells["classes"])
+        self._by_subclass = self._masks(self.spells["subclasses"])
+        self._by_school = self._masks(
+            [[i] if isinstance(i, str) else None for i in self.spells["school_name"]]
+        )
+        self._by_name = ReferenceIndex(self.spells, "name")
+        self._flags = {
+            i: self.spells[i].to_numpy(dtype=bool, na_value=False)
+            for i in ("ritual", "concentration")
+        }
+
+    def _masks(self, values: Union[Sequence[Any], pd.Series]) -> dict[str, np.ndarray]:
+        """Row mask of every value of a list column, keyed case insensitively."""
+        masks: dict[str, np.ndarray] = {}
+        for row, names in enumerate(values):
+            for name in names if names is not None else []:
+                key = name.casefold()
+                if key not in masks:
+                    masks[key] = np.zeros(len(values), dtype=bool)
+                masks[key][row] = True
+        return masks
+
+    def _any_of(
+        self, masks: dict[str, np.ndarray], value: Union[str, Iterable[str]]
+    ) -> np.ndarray:
+        mask = np.zeros(len(self.spells), dtype=bool)
+        for name in _accepted(value):
+            found = masks.get(name.casefold())
+            if found is not None:
+                mask |= found
+        return mask
+
+    @property
+    def classes(self) -> list[str]:
+        return sorted(self._by_class)
+
+    @property
+    def schools(self) -> list[str]:
+        return sorted(self._by_school)
+
+    def rows(
+        self,
+        classes: Accepted = None,
+        level: Optional[Union[int, Iterable[int]]] = None,
+        min_level: Optional[int] = None,
+        max_level: Optional[int] = None,
+        school: Accepted = None,
+        subclasses: Accepted = None,
+        ritual: Optional[bool] = None,
+        concentration: Optional[bool] = None,
+    ) -> np.ndarray:
+        """Positions (in self.spells) of the spells matching every filter given.
+
+        A list of classes, subclasses, schools or levels matches any of them. Names are case insensitive.
+        """
+        mask = np.ones(len(self.spells), dtype=bool)
+        if classes is not None:
+            mask &= self._any_of(self._by_class, classes)
+        if subclasses is not None:
+            mask &= self._any_of(self._by_subclass, subclasses)
+        if school is not None:
+            mask &= self._any_of(self._by_school, school)
+        if level is not None:
+            mask &= np.isin(
+                self.levels, [level] if isinstance(level, int) else list(level)
+            )
+        if min_level is not None:
+            mask &= self.levels >= min_level
+        if max_level is not None:
+            mask &= self.levels <= max_level
+        for col, value in (("ritual", ritual), ("concentration", concentration)):
+            if value is not None:
+                mask &= self._flags[col] == value
+        return np.flatnonzero(mask)
+
+    def find(self, **filters) -> pd.DataFrame:
+        """The spells matching the filters of rows, ordered by level then name."""
+        return self.spells.iloc[self.rows(**filters)]
+
+    def get(self, name: str) -> pd.Series:
+        """The spell with this name. Raises a KeyError if there is none."""
+        return self._by_name.record(name)
+
+
+# Index of every source of this process, rebuilt when a Spells parquet of its layers changes
+_index = DerivedCache(
+    [RuleSet.SPELLS], lambda source: SpellIndex(load(RuleSet.SPELLS, source=source))
+)
+
+
+def get_spell_index() -> SpellIndex:
+    """The index of the processed Spells table of the active source, built once per process while its parquets
+    don't change."""
+    return _index.get()
+
+
+def find_spells(**filters) -> pd.DataFrame:
+    """Spells by class, level and school, e.g. find_spells(classes="Wizard", max_level=3, school="Evocation").
+
+    See SpellIndex.rows for the filters.
+    """
+    return get_spell_index().find(**filters)
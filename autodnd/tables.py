@@ -0,0 +1,146 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from autodnd.utils.dataset_cache import table_paths
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import get_source, override_key
+
+# Suffix of the uncompressed Arrow IPC copy written next to every processed parquet
+arrow_suffix = ".arrow"
+
+# Tables already memory-mapped by this process, with the mtime of the file they were mapped from
+_mapped: dict[Path, tuple[int, pa.Table]] = {}
+# Tables merged across the layers of a source, with the mtimes of the files they were merged from
+_merged: dict[tuple[Path, ...], tuple[tuple[int, ...], pa.Table]] = {}
+_lock = threading.Lock()
+
+
+def arrow_path(ruleset: RuleSet, source: Optional[str] = None) -> Path:
+    """The Arrow file of a table of a source (the active one by default), next to its processed parquet."""
+    return get_source(source).processed_folder / f"{ruleset.value}{arrow_suffix}"
+
+
+def _export(parquet_path: Path) -> Path:
+    target = parquet_path.with_suffix(arrow_suffix)
+    table = pq.read_table(parquet_path)
+
+    fd, temp_file = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f, pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, target)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+    return target
+
+
+def export_arrow(ruleset: RuleSet, source: Optional[str] = None) -> Path:
+    """Write the processed parquet of a ruleset as an uncompressed Arrow IPC file that can be memory-mapped.
+
+    Only the table of the source itself (the active one by default) is exported, not the ones it's layered on.
+    The file is written next to the parquet and renamed into place, so readers never see half a file.
+    """
+    return _export(get_source(source).processed_folder / f"{ruleset.value}.parquet")
+
+
+def _is_stale(parquet_path: Path) -> bool:
+    """True if the Arrow file is missing or older than the parquet it was exported from."""
+    target = parquet_path.with_suffix(arrow_suffix)
+    if not target.exists():
+        return True
+    return (
+        parquet_path.exists()
+        and parquet_path.stat().st_mtime_ns > target.stat().st_mtime_ns
+    )
+
+
+def _map(parquet_path: Path) -> tuple[int, pa.Table]:
+    """The memory-mapped Arrow file of a parquet and its mtime, (re-)exported first if it's stale."""
+    if _is_stale(parquet_path):
+        _export(parquet_path)
+    target = parquet_path.with_suffix(arrow_suffix)
+    mtime = target.stat().st_mtime_ns
+    cached = _mapped.get(target)
+    if cached is None or cached[0] != mtime:
+        with pa.memory_map(str(target), "r") as source:
+            cached = (mtime, pa.ipc.open_file(source).read_all())
+        _mapped[target] = cached
+    return cached
+
+
+def merge_tables(tables: list[pa.Table]) -> pa.Table:
+    """Merge the tables of one ruleset from the lowest source to the highest, like merge_layers does frames.
+
+    The rows of the lower tables are filtered and concatenated, no column is copied into Python objects.
+    """
+    kept = []
+    seen: set = set()
+    for table in reversed(tables):
+        key = override_key(table.column_names)
+        if key is None:
+            kept.append(table)
+            continue
+        if seen:
+            overridden = pc.is_in(
+                table[key], value_set=pa.array(list(seen), type=table[key].type)
+            )
+            table = table.filter(pc.invert(overridden))
+        kept.append(table)
+        seen.update(table[key].drop_null().to_pylist())
+    return pa.concat_tables(kept[::-1], promote_options="permissive")
+
+
+def open_table(
+    ruleset: RuleSet,
+    columns: Optional[Iterable[str]] = None,
+    source: Optional[str] = None,
+) -> pa.Table:
+    """Memory-map a processed table, zero-copy.
+
+    Nothing is decoded or copied: the columns point straight into the OS page cache, so worker processes
+    opening the same table share one copy of it and a column's pages are only read once it's used.
+    Selecting columns is free. The Arrow file is (re-)exported from the parquet if it's missing or older.
+
+    Under a homebrew source the mapped tables of its layers are merged (see merge_tables), the rows line up
+    with autodnd.utils.dataset_cache.load. Raises FileNotFoundError if no layer has processed the table.
+    """
+    paths = tuple(table_paths(ruleset, source))
+    if not paths:
+        raise FileNotFoundError(
+            f"No source up to {get_source(source).name} has a processed {ruleset.value} table"
+        )
+    with _lock:
+        mapped = [_map(i) for i in paths]
+        if len(mapped) == 1:
+            table = mapped[0][1]
+        else:
+            version = tuple(i[0] for i in mapped)
+            cached = _merged.get(paths)
+            if cached is None or cached[0] != version:
+                cached = (version, merge_tables([i[1] for i in mapped]))
+                _merged[paths] = cached
+            table = cached[1]
+    return table if columns is None else table.select(list(columns))
+
+
+def read_frame(
+    ruleset: RuleSet,
+    columns: Optional[Iterable[str]] = None,
+    source: Optional[str] = None,
+) -> pd.DataFrame:
+    """A processed table as a DataFrame backed by the memory-mapped Arrow columns.
+
+    Strings, lists and structs keep their Arrow representation (pd.ArrowDtype) instead of being turned into
+    Python objects, so this is as cheap as open_table for the columns asked for.
+    """
+    return open_table(ruleset, columns, source).to_pandas(types_mapper=pd.ArrowDtype)
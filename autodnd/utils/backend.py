@@ -0,0 +1,130 @@
+import os
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Environment variable choosing the backend the stages run their list operations on
+backend_env_var = "AUTODND_BACKEND"
+
+# The pandas backend is the reference, every other backend must give the same outputs
+default_backend = "pandas"
+
+
+class PandasBackend:
+    """The list operations of the stages as plain pandas, row by row. The reference implementation."""
+
+    name = "pandas"
+
+    def list_field(self, values: pd.Series, key: str) -> pd.Series:
+        """The key of every record of lists of records, e.g. the names of [{"index": ..., "name": ...}, ...]."""
+        return values.apply(lambda x: [i[key] for i in x])
+
+    def join_text(
+        self, values: pd.Series, sep: str = "", terminate: bool = False
+    ) -> pd.Series:
+        """Lists of strings joined with sep, with a trailing sep if terminate. Empty lists join to ""."""
+        if terminate:
+            return values.apply(lambda x: "".join(f"{i}{sep}" for i in x))
+        return values.apply(lambda x: sep.join(x))
+
+    def explode(self, df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+        """One row per element of the list columns, exploded one after the other.
+
+        An empty list gives one row with a missing value, like DataFrame.explode. The index is reset.
+        """
+        for col in columns:
+            df = df.explode(col)
+        return df.reset_index(drop=True)
+
+
+class ArrowBackend:
+    """The list operations of the stages as vectorized Arrow compute kernels over whole columns.
+
+    Same outputs as the pandas backend. Columns backed by Arrow (pd.ArrowDtype, e.g. from
+    autodnd.tables.read_frame) are used without a copy and come back Arrow backed, so a stage chaining the
+    operations keeps its columns in Arrow between them. Object columns are converted to Arrow and back on every
+    call, which costs more than the Python loops of the pandas backend: on those it's only a cross-check.
+    """
+
+    name = "arrow"
+
+    @staticmethod
+    def _lists(values: pd.Series) -> pa.Array:
+        if isinstance(values.dtype, pd.ArrowDtype):
+            # The Arrow data of the column itself, without a copy unless it's in several chunks
+            return pa.array(values.array)
+        return pa.array(values.to_list(), from_pandas=True)
+
+    @staticmethod
+    def _series(array: pa.Array, like: pd.Series, index: pd.Index) -> pd.Series:
+        """A column of the results, Arrow backed if the column operated on (like) was."""
+        if isinstance(like.dtype, pd.ArrowDtype):
+            return pd.Series(array, index=index, dtype=pd.ArrowDtype(array.type))
+        return pd.Series(array.to_pylist(), index=index, dtype=object)
+
+    def list_field(self, values: pd.Series, key: str) -> pd.Series:
+        lists = self._lists(values)
+        if pa.types.is_null(lists.type.value_type):
+            # Nothing but empty lists, no record to take the key of
+            return self._series(lists, values, values.index)
+        fields = pc.list_flatten(lists).field(key)
+        return self._series(
+            pa.ListArray.from_arrays(lists.offsets, fields, mask=lists.is_null()),
+            values,
+            values.index,
+        )
+
+    def join_text(
+        self, values: pd.Series, sep: str = "", terminate: bool = False
+    ) -> pd.Series:
+        lists = self._lists(values)
+        if len(lists) and pa.types.is_null(lists.type.value_type):
+            # Nothing but empty lists, Arrow can't tell they're lists of strings
+            lists = lists.cast(pa.list_(pa.string()))
+        joined = pc.binary_join(lists, sep)
+        if terminate:
+            joined = pc.if_else(
+                pc.greater(pc.list_value_length(lists), 0),
+                pc.binary_join_element_wise(joined, "", sep),
+                joined,
+            )
+        return self._series(joined, values, values.index)
+
+    def explode(self, df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+        df = df.reset_index(drop=True)
+        for col in columns:
+            lists = self._lists(df[col])
+            lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy()
+            # Empty and missing lists keep their row with a missing value
+            repeats = np.maximum(lengths, 1)
+            rows = np.repeat(np.arange(len(df)), repeats)
+            has_element = np.repeat(lengths > 0, repeats)
+            # Position of every element in the flattened values, null where a row has none
+            positions = np.zeros(len(rows), dtype=np.int64)
+            positions[has_element] = np.arange(int(lengths.sum()))
+            exploded = pc.list_flatten(lists).take(
+                pa.array(positions, mask=~has_element)
+            )
+            like = df[col]
+            df = df.iloc[rows].reset_index(drop=True)
+            df[col] = self._series(exploded, like, df.index)
+        return df
+
+
+backends = {i.name: i for i in (PandasBackend, ArrowBackend)}
+
+
+Backend = Union[PandasBackend, ArrowBackend]
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    """The backend named, or chosen by the AUTODND_BACKEND environment variable (pandas by default)."""
+    if not name:
+        name = os.environ.get(backend_env_var, default_backend)
+    try:
+        return backends[name]()
+    except KeyError:
+        raise ValueError(f"Unknown backend {name}, only {sorted(backends)}") from None
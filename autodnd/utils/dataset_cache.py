@@ -0,0 +1,271 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Generic, Iterable, Optional, TypeVar
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from autodnd.utils.ingest import check_schema, read_json_projection
+from autodnd.utils.manifest import file_hash
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import (
+    base_source,
+    get_source,
+    merge_layers,
+    override_key,
+    source_layers,
+)
+
+# Memory the shared cache may hold before it evicts the least recently used frames
+max_cache_bytes = 512 * 1024**2
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Entry:
+    frame: pd.DataFrame
+    nbytes: int
+    # (mtime, size) of the file when it was parsed, and its content hash
+    stamp: tuple[int, int]
+    digest: Optional[str]
+    # full set of flattened column names of a JSON source, to check expected schemas against
+    schema: set[str] = field(default_factory=set)
+
+
+def _stamp(path: Path) -> tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DatasetCache:
+    """Memoizes frames parsed from files, bounded by bytes with least recently used eviction.
+
+    An entry is reused while its file's mtime and size are unchanged. When they change the file is hashed,
+    and it's only parsed again if the content really changed, so touching or re-writing an identical file
+    keeps the cached frame.
+    """
+
+    def __init__(self, max_bytes: int = max_cache_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, key: tuple, path: Path, stamp: tuple[int, int]) -> bool:
+        entry = self._entries[key]
+        if entry.stamp == stamp:
+            return True
+        if entry.digest == file_hash(path):
+            entry.stamp = stamp
+            return True
+        self._evict(key)
+        return False
+
+    def _evict(self, key: tuple) -> None:
+        self.nbytes -= self._entries.pop(key).nbytes
+
+    def _lookup(
+        self, path: Path, columns: Optional[tuple[str, ...]]
+    ) -> Optional[tuple[_Entry, pd.DataFrame]]:
+        """A cached frame of the file with (at least) the columns asked for."""
+        stamp = _stamp(path)
+        for key in list(self._entries):
+            cached_path, cached_columns = key
+            if cached_path != path:
+                continue
+            if not (
+                cached_columns is None
+                or (columns is not None and set(columns) <= set(cached_columns))
+            ):
+                continue
+            if not self._fresh(key, path, stamp):
+                continue
+            self._entries.move_to_end(key)
+            entry = self._entries[key]
+            frame = entry.frame
+            if columns is not None and cached_columns != columns:
+                # Keep the column order the frame was parsed with
+                frame = frame[[i for i in frame.columns if i in set(columns)]]
+            return entry, frame
+        return None
+
+    def get(
+        self,
+        path: Path,
+        columns: Optional[Iterable[str]],
+        parse: Callable[[], tuple[pd.DataFrame, set[str]]],
+    ) -> tuple[pd.DataFrame, set[str]]:
+        """Return the cached frame of path (restricted to columns) and its schema, parsing it on a miss."""
+        path = Path(path).resolve()
+        key_columns = None if columns is None else tuple(columns)
+        with self._lock:
+            found = self._lookup(path, key_columns)
+            if found is not None:
+                self.hits += 1
+                return found[1], found[0].schema
+            self.misses += 1
+
+        # Stamp and hash before parsing, if the file changes meanwhile the next lookup sees a stale entry
+        stamp, digest = _stamp(path), file_hash(path)
+        frame, schema = parse()
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            key = (path, key_columns)
+            if key in self._entries:
+                self._evict(key)
+            if nbytes <= self.max_bytes:
+                self._entries[key] = _Entry(frame, nbytes, stamp, digest, schema)
+                self.nbytes += nbytes
+                while self.nbytes > self.max_bytes:
+                    self._evict(next(iter(self._entries)))
+        return frame, schema
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = self.hits = self.misses = 0
+
+    def info(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# The cache shared by every stage run in this process
+_cache = DatasetCache()
+
+
+def _load_parquet(path: Path, columns: Optional[list[str]]) -> pd.DataFrame:
+    frame, _ = _cache.get(
+        path, columns, lambda: (pd.read_parquet(path, columns=columns), set())
+    )
+    # Columns in the order asked for, like pd.read_parquet
+    return frame if columns is None else frame[columns]
+
+
+def table_paths(ruleset: RuleSet, source: Optional[str] = None) -> list[Path]:
+    """The processed parquets of a table in a source (the active one by default) and the sources below it.
+
+    Lowest source first and only the ones that exist, a homebrew source usually processes a few tables.
+    """
+    paths = [
+        i.processed_folder / f"{ruleset.value}.parquet" for i in source_layers(source)
+    ]
+    return [i for i in paths if i.exists()]
+
+
+def table_version(
+    rulesets: Iterable[RuleSet], source: Optional[str] = None
+) -> tuple[tuple[str, int], ...]:
+    """(path, mtime) of every processed parquet of the tables across the layers of a source.
+
+    Anything built from the tables is stale once this changes, whichever source was re-processed.
+    """
+    return tuple(
+        (str(path), path.stat().st_mtime_ns)
+        for ruleset in rulesets
+        for path in table_paths(ruleset, source)
+    )
+
+
+def load(
+    ruleset: RuleSet,
+    columns: Optional[Iterable[str]] = None,
+    source: Optional[str] = None,
+) -> pd.DataFrame:
+    """Load a processed table, reading its parquet only once per process while the file doesn't change.
+
+    Under a homebrew source (see autodnd.utils.sources) the table is merged from the processed tables of the
+    source and of every source below it, the rows of a higher source overriding those with the same key.
+    Returns a copy, so callers are free to modify it. Raises FileNotFoundError if the table hasn't been
+    processed yet.
+    """
+    columns = None if columns is None else list(columns)
+    paths = table_paths(ruleset, source)
+    if not paths:
+        raise FileNotFoundError(
+            f"No source up to {get_source(source).name} has a processed {ruleset.value} table"
+        )
+    if len(paths) == 1:
+        return _load_parquet(paths[0], columns).copy()
+
+    key = override_key(pq.read_schema(paths[-1]).names)
+    # The override key is read along, even if it's not asked for
+    read = (
+        None if columns is None or key is None else list(dict.fromkeys([*columns, key]))
+    )
+    merged = merge_layers([_load_parquet(i, read) for i in paths])
+    return merged if columns is None else merged[columns]
+
+
+class DerivedCache(Generic[T]):
+    """An object built from processed tables, kept per source and rebuilt when one of their parquets changes.
+
+    build is called with the source name, e.g. DerivedCache([RuleSet.SPELLS], lambda source:
+    SpellIndex(load(RuleSet.SPELLS, source=source))). Re-processing any source the tables are layered on
+    invalidates it, see table_version.
+    """
+
+    def __init__(self, rulesets: Iterable[RuleSet], build: Callable[[str], T]):
+        self.rulesets = tuple(rulesets)
+        self.build = build
+        self._built: dict[str, tuple[tuple[tuple[str, int], ...], T]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source: Optional[str] = None) -> T:
+        name = get_source(source).name
+        version = table_version(self.rulesets, name)
+        with self._lock:
+            cached = self._built.get(name)
+            if cached is None or cached[0] != version:
+                cached = (version, self.build(name))
+                self._built[name] = cached
+            return cached[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._built.clear()
+
+
+def load_json(
+    ruleset: RuleSet,
+    columns: Iterable[str],
+    expected_columns: Optional[Iterable[str]] = None,
+    variable_prefixes: Iterable[str] = (),
+) -> pd.DataFrame:
+    """Load the flattened columns of a source JSON, streaming it only once per process while it doesn't change.
+
+    Same frame as autodnd.utils.ingest.read_json_columns, including the expected_columns schema check, but a
+    request for a subset of the columns of an earlier one is served from the cached frame. Returns a copy.
+    The JSONs of a homebrew source often only hold a few records, the expected columns none of them has are
+    all null rather than an error. Unexpected columns still fail the schema check.
+    """
+    source = get_source()
+    path = source.json_folder / f"{ruleset.value}.json"
+    columns = list(columns)
+    partial = source.name != base_source
+    frame, schema = _cache.get(
+        path, columns, lambda: read_json_projection(path, columns, partial)
+    )
+    if expected_columns is not None:
+        check_schema(schema, expected_columns, variable_prefixes, partial)
+    return frame.copy()
+
+
+def cache_info() -> dict[str, Any]:
+    """Hits, misses and memory use of the shared cache."""
+    return _cache.info()
+
+
+def clear_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import product
+from random import randrange
+from typing import TYPE_CHECKING, Optional, Union
+
+# numpy is only imported by the vectorized rolls and the exact distributions, parsing and rolling an
+# expression once (roll_dice) stays cheap to import
+if TYPE_CHECKING:
+    import numpy as np
+
+# Dice expressions like "2d6+3", "d20", "4d6kh3" (keep the highest 3), "2d20kl1" or "d20adv"
+term_pattern = re.compile(r"(?:(\d*)d(\d+)(?:(kh|kl)(\d+))?(adv|dis)?|(\d+))")
+token_pattern = re.compile(r"([+-])?([^+-]+)")
+
+# Shorthands for the common d20 rolls
+ADVANTAGE = "d20adv"
+DISADVANTAGE = "d20dis"
+
+# Above this many dice a term without keep rules is sampled from its exact distribution instead of die by die
+sample_from_distribution_threshold = 4
+
+# Largest number of outcomes enumerated to get the exact distribution of a keep highest/lowest term
+max_enumerated_outcomes = 2_000_000
+
+RandomState = Union[None, int, "np.random.Generator"]
+
+
+@dataclass(frozen=True, eq=False)
+class Distribution:
+    """Exact probability distribution over the consecutive integers offset, offset + 1, ..."""
+
+    offset: int
+    probabilities: np.ndarray
+
+    @property
+    def values(self) -> np.ndarray:
+        import numpy as np
+
+        return np.arange(self.offset, self.offset + len(self.probabilities))
+
+    @property
+    def mean(self) -> float:
+        import numpy as np
+
+        return float(np.dot(self.values, self.probabilities))
+
+    @property
+    def variance(self) -> float:
+        import numpy as np
+
+        return float(np.dot((self.values - self.mean) ** 2, self.probabilities))
+
+    def prob_at_least(self, value: int) -> float:
+        """Probability of rolling value or more."""
+        return float(self.probabilities[max(value - self.offset, 0) :].sum())
+
+    def __add__(self, other: "Distribution") -> "Distribution":
+        import numpy as np
+
+        # The sum of two independent rolls is the convolution of their distributions
+        return Distribution(
+            self.offset + other.offset,
+            np.convolve(self.probabilities, other.probabilities),
+        )
+
+    def __neg__(self) -> "Distribution":
+        return Distribution(
+            -(self.offset + len(self.probabilities) - 1), self.probabilities[::-1]
+        )
+
+    def best_of_two(self, highest: bool = True) -> "Distribution":
+        """Distribution of the higher (or lower) of two independent rolls."""
+        import numpy as np
+
+        cdf = np.cumsum(self.probabilities)
+        if highest:
+            probabilities = np.diff(cdf**2, prepend=0.0)
+        else:
+            survival = 1 - np.concatenate([[0.0], cdf[:-1]])
+            probabilities = -np.diff(survival**2, append=0.0)
+        return Distribution(self.offset, probabilities)
+
+
+@dataclass(frozen=True)
+class DiceTerm:
+    """A single NdM term of a dice expression, possibly keeping only some dice or rolled twice."""
+
+    count: int
+    sides: int
+    sign: int = 1
+    keep: Optional[int] = None
+    keep_highest: bool = True
+    # 1 to roll the term twice and keep the higher total, -1 for the lower one
+    advantage: int = 0
+
+    def _roll_once(self) -> int:
+        rolls = [randrange(self.sides) + 1 for _ in range(self.count)]
+        if self.keep is not None:
+            rolls = sorted(rolls, reverse=self.keep_highest)[: self.keep]
+        return sum(rolls)
+
+    def roll(self) -> int:
+        total = self._roll_once()
+        if self.advantage:
+            other = self._roll_once()
+            total = max(total, other) if self.advantage > 0 else min(total, other)
+        return self.sign * total
+
+    def _roll_many_once(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        import numpy as np
+
+        if self.keep is None and self.count > sample_from_distribution_threshold:
+            # One draw per roll from the exact distribution instead of count draws
+            base = self._base_distribution()
+            cdf = np.cumsum(base.probabilities)
+            drawn = np.searchsorted(cdf, rng.random(n) * cdf[-1], side="right")
+            return base.offset + np.minimum(drawn, len(cdf) - 1)
+        rolls = rng.integers(1, self.sides + 1, size=(n, self.count))
+        if self.keep is not None:
+            rolls.sort(axis=1)
+            rolls = (
+                rolls[:, -self.keep :] if self.keep_highest else rolls[:, : self.keep]
+            )
+        return rolls.sum(axis=1)
+
+    def roll_many(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        import numpy as np
+
+        totals = self._roll_many_once(n, rng)
+        if self.advantage:
+            other = self._roll_many_once(n, rng)
+            totals = (
+                np.maximum(totals, other)
+                if self.advantage > 0
+                else np.minimum(totals, other)
+            )
+        return self.sign * totals
+
+    @lru_cache(maxsize=1024)
+    def _base_distribution(self) -> Distribution:
+        import numpy as np
+
+        die = Distribution(1, np.full(self.sides, 1 / self.sides))
+        if self.keep is None:
+            total = Distribution(0, np.ones(1))
+            # Exponentiation by squaring so e.g. 100d6 is a handful of convolutions
+            power, count = die, self.count
+            while count:
+                if count & 1:
+                    total = total + power
+                power = power + power
+                count >>= 1
+            return total
+
+        # Keeping only some dice breaks the convolution, enumerate the outcomes instead
+        if self.sides**self.count > max_enumerated_outcomes:
+            raise ValueError(
+                f"{self.count}d{self.sides} with keep has too many outcomes for an exact distribution"
+            )
+        rolls = np.array(list(product(range(1, self.sides + 1), repeat=self.count)))
+        rolls.sort(axis=1)
+        kept = rolls[:, -self.keep :] if self.keep_highest else rolls[:, : self.keep]
+        totals = kept.sum(axis=1)
+        counts = np.bincount(totals - totals.min())
+        return Distribution(int(totals.min()), counts / counts.sum())
+
+    def distribution(self) -> Distribution:
+        dist = self._base_distribution()
+        if self.advantage:
+            dist = dist.best_of_two(highest=self.advantage > 0)
+        return -dist if self.sign < 0 else dist
+
+
+@dataclass(frozen=True)
+class DiceExpression:
+    """A parsed dice expression: a sum of dice terms plus a constant modifier."""
+
+    text: str
+    terms: tuple[DiceTerm, ...]
+    modifier: int = 0
+
+    def roll(self) -> int:
+        """Roll the expression once."""
+        return sum(term.roll() for term in self.terms) + self.modifier
+
+    def roll_many(self, n: int, seed: RandomState = None) -> np.ndarray:
+        """Roll the expression n times at once, returning an int64 array of totals."""
+        import numpy as np
+
+        rng = (
+            seed
+            if isinstance(seed, np.random.Generator)
+            else np.random.default_rng(seed)
+        )
+        totals = np.full(n, self.modifier, dtype=np.int64)
+        for term in self.terms:
+            totals += term.roll_many(n, rng)
+        return totals
+
+    @property
+    def distribution(self) -> Distribution:
+        """Exact distribution of the total, computed by convolving the terms."""
+        return _distribution(self)
+
+    @property
+    def expected_value(self) -> float:
+        return self.distribution.mean
+
+    @property
+    def minimum(self) -> int:
+        return self.distribution.offset
+
+    @property
+    def maximum(self) -> int:
+        return self.distribution.offset + len(self.distribution.probabilities) - 1
+
+
+@lru_cache(maxsize=1024)
+def _distribution(expression: DiceExpression) -> Distribution:
+    import numpy as np
+
+    dist = Distribution(expression.modifier, np.ones(1))
+    for term in expression.terms:
+        dist = dist + term.distribution()
+    return dist
+
+
+@lru_cache(maxsize=1024)
+def compile_dice(expression: str) -> DiceExpression:
+    """Parse a dice expression once, later calls with the same string are served from a cache."""
+    text = expression.replace(" ", "").lower()
+    tokens = list(token_pattern.finditer(text))
+    if not text or "".join(i.group(0) for i in tokens) != text:
+        raise ValueError(f"Invalid dice expression {expression!r}")
+
+    terms = []
+    modifier = 0
+    for token in tokens:
+        sign = -1 if token.group(1) == "-" else 1
+        term = term_pattern.fullmatch(token.group(2))
+        if term is None:
+            raise ValueError(f"Invalid dice expression {expression!r}")
+        count_str, sides_str, keep_type, keep, advantage, constant = term.groups()
+        if constant is not None:
+            modifier += sign * int(constant)
+            continue
+        count, sides = int(count_str or 1), int(sides_str)
+        if count < 1 or sides < 1:
+            raise ValueError(f"Invalid dice expression {expression!r}")
+        if keep is not None and not 0 < int(keep) <= count:
+            raise ValueError(f"Can't keep {keep} of {count} dice in {expression!r}")
+        terms.append(
+            DiceTerm(
+                count=count,
+                sides=sides,
+                sign=sign,
+                keep=int(keep) if keep else None,
+                keep_highest=keep_type != "kl",
+                advantage={"adv": 1, "dis": -1}.get(advantage or "", 0),
+            )
+        )
+    return DiceExpression(expression, tuple(terms), modifier)
+
+
+def roll_many(expression: str, n: int, seed: RandomState = None) -> np.ndarray:
+    """Roll a dice expression n times in one vectorized batch."""
+    return compile_dice(expression).roll_many(n, seed)
+
+
+def distribution(expression: str) -> Distribution:
+    """Exact probability distribution of a dice expression's total."""
+    return compile_dice(expression).distribution
+
+
+def expected_value(expression: str) -> float:
+    """Exact expected total of a dice expression."""
+    return compile_dice(expression).expected_value
@@ -1,9 +1,42 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import requests
+from typing import TYPE_CHECKING, Optional
+
+# requests is only imported once something is downloaded, importing this module stays cheap
+if TYPE_CHECKING:
+    import requests
+
+# File, inside the download folder, remembering the ETag/Last-Modified validators of every downloaded file
+validators_filename = ".validators.json"
+
+
+def _atomic_write(target_file: Path, response: requests.Response) -> None:
+    """Stream a response into a temp file next to the target and rename it into place."""
+    fd, temp_file = tempfile.mkstemp(
+        dir=target_file.parent, prefix=f".{target_file.name}."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                if chunk:
+                    f.write(chunk)
+        # mkstemp creates owner-only files, give the download normal read permissions
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, target_file)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
 
 
 def download_file(target_dir: Path, filename: str, url: str) -> None:
     """Function to download and save a file from an url."""
+    import requests
+
     # Ensure target directory (and parents) exist
     target_dir.mkdir(parents=True, exist_ok=True)
     target_file = target_dir / filename
@@ -11,9 +44,119 @@ def download_file(target_dir: Path, filename: str, url: str) -> None:
     print(f"Downloading from {url} ...")
     with requests.get(url, stream=True, timeout=60) as r:
         r.raise_for_status()  # Raise an error if the request failed
-        with open(target_file, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        _atomic_write(target_file, r)
 
     print(f"File saved to {target_file}")
+
+
+def make_session(max_connections: int = 8) -> requests.Session:
+    """A requests session whose connection pool can serve max_connections threads at once."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=max_connections, pool_maxsize=max_connections
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _conditional_download(
+    session: requests.Session,
+    target_file: Path,
+    url: str,
+    validators: dict[str, str],
+) -> Optional[dict[str, str]]:
+    """Download url into target_file unless the server says it's unchanged.
+
+    Returns the new validators of the file, or None if the local copy was already up to date.
+    """
+    headers = {}
+    if target_file.exists():
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    with session.get(url, headers=headers, stream=True, timeout=60) as r:
+        if r.status_code == 304:
+            return None
+        r.raise_for_status()  # Raise an error if the request failed
+        _atomic_write(target_file, r)
+        new_validators = {}
+        if "ETag" in r.headers:
+            new_validators["etag"] = r.headers["ETag"]
+        if "Last-Modified" in r.headers:
+            new_validators["last_modified"] = r.headers["Last-Modified"]
+        return new_validators
+
+
+def download_files(
+    target_dir: Path,
+    urls: dict[str, str],
+    max_workers: int = 8,
+    session: Optional[requests.Session] = None,
+) -> dict[str, bool]:
+    """Download many files concurrently over one pooled session.
+
+    urls maps each filename (saved inside target_dir) to its url. The ETag/Last-Modified validators of previous
+    downloads are sent along so files unchanged on the server are skipped. Returns filename -> whether it was
+    (re)downloaded.
+    """
+    import requests
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    validators_file = target_dir / validators_filename
+    try:
+        with open(validators_file, "r") as f:
+            validators: dict[str, dict[str, str]] = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        validators = {}
+
+    own_session = session is None
+    session = session or make_session(max_workers)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                filename: pool.submit(
+                    _conditional_download,
+                    session,
+                    target_dir / filename,
+                    url,
+                    validators.get(filename, {}),
+                )
+                for filename, url in urls.items()
+            }
+            downloaded: dict[str, bool] = {}
+            # Failed requests, and failed writes of the files downloaded (a full disk, a directory in the way)
+            errors: dict[str, OSError] = {}
+            for filename, future in futures.items():
+                try:
+                    new_validators = future.result()
+                except (requests.RequestException, OSError) as e:
+                    errors[filename] = e
+                    continue
+                downloaded[filename] = new_validators is not None
+                if new_validators is not None:
+                    validators[filename] = new_validators
+                    print(f"File saved to {target_dir / filename}")
+                else:
+                    print(f"File {target_dir / filename} is up to date")
+    finally:
+        if own_session:
+            session.close()
+
+    # Persist the validators of everything that did succeed before reporting failures
+    with tempfile.NamedTemporaryFile(
+        "w", dir=target_dir, prefix=f".{validators_filename}.", delete=False
+    ) as temp:
+        json.dump(validators, temp, indent=2, sort_keys=True)
+    os.replace(temp.name, validators_file)
+
+    if errors:
+        raise requests.RequestException(
+            f"Failed to download {sorted(errors)}: {list(errors.values())[0]!r}"
+        )
+    return downloaded
@@ -0,0 +1,179 @@
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+import pandas as pd
+
+# How much of the file is read at a time while streaming
+chunk_size = 1 << 16
+
+# Separator between nested keys in the flattened column names, same as pd.json_normalize(data, sep="_")
+sep = "_"
+
+
+def iter_json_array(path: Path) -> Iterator[Any]:
+    """Yield the elements of a file holding one JSON array, one at a time, without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r") as file:
+        buffer = ""
+        pos = 0
+        eof = False
+        started = False
+
+        def fill() -> None:
+            nonlocal buffer, pos, eof
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        while True:
+            # Skip whitespace and the separators between elements
+            while pos < len(buffer) and (
+                buffer[pos].isspace() or (started and buffer[pos] == ",")
+            ):
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"{path} ended before its JSON array was closed")
+                fill()
+                continue
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{path} doesn't hold a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end == len(buffer) and not eof:
+                # A number (or literal) cut by the chunk boundary decodes fine but incomplete, read on
+                fill()
+                continue
+            pos = end
+            yield element
+
+
+def _prefixes(columns: Iterable[str]) -> set[str]:
+    """Every flattened name a needed column can be nested under, e.g. damage and damage_damage_type."""
+    prefixes: set[str] = set()
+    for column in columns:
+        parts = column.split(sep)
+        prefixes.update(sep.join(parts[:i]) for i in range(1, len(parts)))
+    return prefixes
+
+
+def _project(
+    record: dict[str, Any],
+    columns: set[str],
+    prefixes: set[str],
+    prefix: str,
+    out: dict[str, Any],
+) -> None:
+    """Flatten only the needed part of a record the way pd.json_normalize would.
+
+    A dict asked for by its own name is kept whole instead, for maps whose keys vary from record to record.
+    """
+    items = list(record.items())
+    if not prefix:
+        # pd.json_normalize puts the flattened nested keys of a record after its top level values
+        items.sort(key=lambda item: isinstance(item[1], dict))
+    for key, value in items:
+        name = f"{prefix}{sep}{key}" if prefix else key
+        if name in columns:
+            out[name] = value
+        elif isinstance(value, dict) and name in prefixes:
+            _project(value, columns, prefixes, name, out)
+
+
+def _flat_keys(record: dict[str, Any], prefix: str, out: set[str]) -> None:
+    """Collect the column names pd.json_normalize would produce for a record."""
+    for key, value in record.items():
+        name = f"{prefix}{sep}{key}" if prefix else key
+        if isinstance(value, dict):
+            _flat_keys(value, name, out)
+        else:
+            out.add(name)
+
+
+def read_json_projection(
+    path: Path, columns: Iterable[str], allow_missing: bool = False
+) -> tuple[pd.DataFrame, set[str]]:
+    """Stream the records of a JSON array file into a frame holding only the needed flattened columns.
+
+    Gives the same frame, column order included, as pd.json_normalize(json.load(file), sep="_") restricted to
+    columns, but nested keys outside of columns are never flattened so memory and time scale with what the
+    stage actually uses. Also returns the full set of flattened column names of the file, its schema.
+    A column none of the records has raises a KeyError, unless allow_missing where it's added all null (NaN)
+    after the others, like a key only some records have.
+    """
+    wanted = set(columns)
+    prefixes = _prefixes(wanted)
+    seen: set[str] = set()
+
+    rows = []
+    for record in iter_json_array(path):
+        row: dict[str, Any] = {}
+        _project(record, wanted, prefixes, "", row)
+        rows.append(row)
+        _flat_keys(record, "", seen)
+
+    # Columns come out in the order their keys are first seen, like pd.json_normalize
+    df = pd.DataFrame(rows)
+    missing = wanted - set(df.columns)
+    if missing and not allow_missing:
+        raise KeyError(f"Columns {sorted(missing)} not found in {path}")
+    if missing:
+        df = df.reindex(columns=[*df.columns, *sorted(missing)])
+    return df, seen
+
+
+def check_schema(
+    seen: set[str],
+    expected_columns: Iterable[str],
+    variable_prefixes: Iterable[str] = (),
+    allow_missing: bool = False,
+) -> None:
+    """Assert the flattened columns of a JSON file are the expected ones.
+
+    Columns nested under one of variable_prefixes (e.g. the class_specific counters of the Levels, whose keys
+    differ from class to class) are data rather than schema and aren't checked. With allow_missing the file
+    may lack some of the expected columns, for a few records that don't use every optional key, but it still
+    can't have unexpected ones.
+    """
+    prefixes = tuple(variable_prefixes)
+    fixed = {
+        i
+        for i in seen
+        if not any(i == j or i.startswith(f"{j}{sep}") for j in prefixes)
+    }
+    expected = set(expected_columns)
+    assert fixed <= expected if allow_missing else fixed == expected, (
+        "Unexpected data organization, schema has probably changed"
+    )
+
+
+def read_json_columns(
+    path: Path,
+    columns: Iterable[str],
+    expected_columns: Optional[Iterable[str]] = None,
+    variable_prefixes: Iterable[str] = (),
+) -> pd.DataFrame:
+    """Stream only the needed flattened columns of a JSON array file, see read_json_projection.
+
+    If expected_columns is given, the full set of flattened columns is checked against it (see check_schema),
+    replacing the usual schema assertion on the normalized frame.
+    """
+    df, seen = read_json_projection(path, columns)
+    if expected_columns is not None:
+        check_schema(seen, expected_columns, variable_prefixes)
+    return df
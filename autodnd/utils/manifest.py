@@ -0,0 +1,103 @@
+import ast
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from autodnd.utils.project_root import get_project_root
+
+# Suffix of the manifest file written next to every processed parquet
+manifest_suffix = ".manifest.json"
+
+
+def file_hash(path: Path) -> Optional[str]:
+    """Return the sha256 of a file's content, or None if the file does not exist."""
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_dependencies(script_path: Path) -> list[Path]:
+    """Return the script plus every autodnd module it (transitively) imports, with the packages they're in."""
+    root = get_project_root()
+    found: list[Path] = []
+    pending = [script_path]
+    while pending:
+        path = pending.pop()
+        if path in found or not path.exists():
+            continue
+        found.append(path)
+        for node in ast.walk(ast.parse(path.read_text())):
+            if isinstance(node, ast.ImportFrom) and node.module:
+                modules = [node.module]
+            elif isinstance(node, ast.Import):
+                modules = [i.name for i in node.names]
+            else:
+                continue
+            for module in modules:
+                if module.split(".")[0] != "autodnd":
+                    continue
+                parts = module.split(".")
+                pending.append(root.joinpath(*parts).with_suffix(".py"))
+                # Importing a module runs the __init__ of every package above it too
+                pending.extend(
+                    root.joinpath(*parts[:i], "__init__.py")
+                    for i in range(1, len(parts) + 1)
+                )
+    return sorted(found)
+
+
+def fingerprint(
+    sources: Iterable[Path], upstream: Iterable[Path], code: Iterable[Path]
+) -> dict[str, Any]:
+    """Hash everything a stage's output depends on: its source JSONs, upstream parquets and code."""
+    root = get_project_root()
+
+    def hashes(paths: Iterable[Path]) -> dict[str, Optional[str]]:
+        return {
+            str(i.relative_to(root) if i.is_relative_to(root) else i): file_hash(i)
+            for i in paths
+        }
+
+    return {
+        "sources": hashes(sources),
+        "upstream": hashes(upstream),
+        "code": hashes(code),
+    }
+
+
+def manifest_path(output_path: Path) -> Path:
+    """Location of the manifest describing how a processed file was built."""
+    return output_path.with_name(output_path.stem + manifest_suffix)
+
+
+def read_manifest(output_path: Path) -> Optional[dict[str, Any]]:
+    """Read the manifest of a processed file, None if there is none or it's unreadable."""
+    try:
+        with open(manifest_path(output_path), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_manifest(output_path: Path, stage_fingerprint: dict[str, Any]) -> None:
+    """Record the fingerprint a processed file was built from, alongside its own hash."""
+    manifest = dict(stage_fingerprint, output=file_hash(output_path))
+    with open(manifest_path(output_path), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def is_up_to_date(output_path: Path, stage_fingerprint: dict[str, Any]) -> bool:
+    """True if the processed file exists unchanged and was built from exactly these inputs."""
+    manifest = read_manifest(output_path)
+    if manifest is None or any(
+        v is None for i in stage_fingerprint.values() for v in i.values()
+    ):
+        return False
+    return manifest.pop("output", None) == file_hash(output_path) and (
+        manifest == stage_fingerprint
+    )
@@ -0,0 +1,55 @@
+from typing import Any, Hashable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class ReferenceIndex:
+    """Hash index from the values of a key column (e.g. url or name) to the rows of a table.
+
+    Build it once per table and resolve references against it instead of scanning the table with a boolean
+    mask per reference. When a key appears more than once the first row wins, the same row
+    df[df[key_col] == key].iloc[0] would return.
+    """
+
+    def __init__(self, df: pd.DataFrame, key_col: str):
+        self.df = df
+        self.key_col = key_col
+        first_occurrence = ~df[key_col].duplicated(keep="first").to_numpy()
+        self._keys = pd.Index(df[key_col].to_numpy()[first_occurrence])
+        self._rows = np.flatnonzero(first_occurrence)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def positions(self, keys: Iterable[Hashable]) -> np.ndarray:
+        """Row positions of every key in one vectorized hash lookup, -1 where a key is missing."""
+        found = self._keys.get_indexer(pd.Index(list(keys), dtype=object))
+        if len(self._rows) == 0:
+            return found
+        return np.where(found >= 0, self._rows[found], -1)
+
+    def resolve(self, keys: Iterable[Hashable], column: str) -> pd.Series:
+        """Look up column for a batch of keys at once. Missing keys resolve to NaN."""
+        rows = self.positions(keys)
+        found = rows >= 0
+        resolved = np.full(len(rows), np.nan, dtype=object)
+        resolved[found] = self.df[column].to_numpy(dtype=object)[rows[found]]
+        return pd.Series(resolved, dtype=object)
+
+    def record(self, key: Hashable) -> pd.Series:
+        """The row matching key. Raises a KeyError if there is none."""
+        try:
+            position = self._keys.get_loc(key)
+        except KeyError:
+            raise KeyError(f"No row with {self.key_col} == {key!r}") from None
+        return self.df.iloc[self._rows[position]]
+
+    def get(self, key: Hashable, column: str, default: Optional[Any] = None) -> Any:
+        """Value of column in the row matching key, or default if there is none."""
+        if key not in self._keys:
+            return default
+        return self.record(key)[column]
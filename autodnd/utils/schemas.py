@@ -0,0 +1,284 @@
+from enum import Enum
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from autodnd.utils.ruleset_enum import RuleSet
+
+
+class ColumnType(Enum):
+    """How a processed column is stored in parquet."""
+
+    STRING = "string"
+    INT = "Int64"
+    FLOAT = "Float64"
+    BOOL = "boolean"
+    CATEGORY = "category"
+    # lists and dicts, stored as native parquet list/struct columns
+    NESTED = "nested"
+
+
+# The typed schema of every processed table that has one
+SCHEMAS: dict[RuleSet, dict[str, ColumnType]] = {
+    RuleSet.EQUIPMENT: {
+        "index": ColumnType.STRING,
+        "url": ColumnType.STRING,
+        "name": ColumnType.STRING,
+        "weapon_category": ColumnType.CATEGORY,
+        "weapon_range": ColumnType.CATEGORY,
+        "category_range": ColumnType.CATEGORY,
+        "weight": ColumnType.FLOAT,
+        "properties": ColumnType.STRING,
+        "equipment_category_name": ColumnType.CATEGORY,
+        "cost_quantity": ColumnType.INT,
+        "cost_unit": ColumnType.CATEGORY,
+        "damage_damage_dice": ColumnType.STRING,
+        "damage_damage_type_name": ColumnType.CATEGORY,
+        "range_normal": ColumnType.INT,
+        "throw_range_normal": ColumnType.INT,
+        "throw_range_long": ColumnType.INT,
+        "two_handed_damage_damage_dice": ColumnType.STRING,
+        "two_handed_damage_damage_type_index": ColumnType.STRING,
+        "two_handed_damage_damage_type_name": ColumnType.CATEGORY,
+        "two_handed_damage_damage_type_url": ColumnType.STRING,
+        "range_long": ColumnType.INT,
+        "special": ColumnType.NESTED,
+        "armor_category": ColumnType.CATEGORY,
+        "str_minimum": ColumnType.INT,
+        "stealth_disadvantage": ColumnType.BOOL,
+        "armor_class_base": ColumnType.INT,
+        "armor_class_dex_bonus": ColumnType.BOOL,
+        "armor_class_max_bonus": ColumnType.INT,
+        "gear_category_index": ColumnType.STRING,
+        "gear_category_name": ColumnType.CATEGORY,
+        "gear_category_url": ColumnType.STRING,
+        "desc": ColumnType.NESTED,
+        "quantity": ColumnType.INT,
+        "contents": ColumnType.NESTED,
+        "tool_category": ColumnType.CATEGORY,
+        "vehicle_category": ColumnType.CATEGORY,
+        "capacity": ColumnType.STRING,
+        "speed_quantity": ColumnType.FLOAT,
+        "speed_unit": ColumnType.CATEGORY,
+        "damage_type_desc": ColumnType.STRING,
+    },
+    RuleSet.PROFICIENCIES: {
+        "type": ColumnType.CATEGORY,
+        "url": ColumnType.STRING,
+        "name": ColumnType.STRING,
+        "classes": ColumnType.CATEGORY,
+        "races": ColumnType.CATEGORY,
+        "reference_name": ColumnType.STRING,
+        "reference_type": ColumnType.CATEGORY,
+        "reference": ColumnType.NESTED,
+    },
+    RuleSet.TRAITS: {
+        "races": ColumnType.STRING,
+        "subraces": ColumnType.STRING,
+        "name": ColumnType.STRING,
+        "desc": ColumnType.STRING,
+        # {name, reference_name, reference_type, reference} structs, reference being the struct of Proficiencies
+        "proficiencies": ColumnType.NESTED,
+        "url": ColumnType.STRING,
+        "additional_choices": ColumnType.NESTED,
+    },
+    RuleSet.SUBCLASSES: {
+        "name": ColumnType.STRING,
+        "subclass_flavor": ColumnType.CATEGORY,
+        "desc": ColumnType.STRING,
+        "subclass_levels": ColumnType.STRING,
+        "class_name": ColumnType.CATEGORY,
+        "spells": ColumnType.NESTED,
+    },
+    RuleSet.SPELLS: {
+        "name": ColumnType.STRING,
+        "desc": ColumnType.STRING,
+        "higher_level": ColumnType.STRING,
+        "range": ColumnType.CATEGORY,
+        "components": ColumnType.NESTED,
+        "material": ColumnType.STRING,
+        "ritual": ColumnType.BOOL,
+        "duration": ColumnType.CATEGORY,
+        "concentration": ColumnType.BOOL,
+        "casting_time": ColumnType.CATEGORY,
+        "level": ColumnType.INT,
+        "attack_type": ColumnType.CATEGORY,
+        "school_name": ColumnType.CATEGORY,
+        "classes": ColumnType.NESTED,
+        "subclasses": ColumnType.NESTED,
+        "url": ColumnType.STRING,
+        "damage_type_name": ColumnType.CATEGORY,
+        "damage_at_slot_level": ColumnType.NESTED,
+        "damage_at_character_level": ColumnType.NESTED,
+        "heal_at_slot_level": ColumnType.NESTED,
+        "dc_type_name": ColumnType.CATEGORY,
+        "dc_success": ColumnType.CATEGORY,
+        "dc_desc": ColumnType.STRING,
+        "area_of_effect_type": ColumnType.CATEGORY,
+        "area_of_effect_size": ColumnType.INT,
+    },
+    RuleSet.MONSTERS: {
+        "name": ColumnType.STRING,
+        "desc": ColumnType.STRING,
+        "size": ColumnType.CATEGORY,
+        "type": ColumnType.CATEGORY,
+        "subtype": ColumnType.CATEGORY,
+        "alignment": ColumnType.CATEGORY,
+        "armor_class": ColumnType.INT,
+        "hit_points": ColumnType.INT,
+        "hit_dice": ColumnType.STRING,
+        "hit_points_roll": ColumnType.STRING,
+        "strength": ColumnType.INT,
+        "dexterity": ColumnType.INT,
+        "constitution": ColumnType.INT,
+        "intelligence": ColumnType.INT,
+        "wisdom": ColumnType.INT,
+        "charisma": ColumnType.INT,
+        "proficiencies": ColumnType.NESTED,
+        "damage_vulnerabilities": ColumnType.NESTED,
+        "damage_resistances": ColumnType.NESTED,
+        "damage_immunities": ColumnType.NESTED,
+        "condition_immunities": ColumnType.NESTED,
+        "languages": ColumnType.STRING,
+        "challenge_rating": ColumnType.FLOAT,
+        "proficiency_bonus": ColumnType.INT,
+        "xp": ColumnType.INT,
+        "special_abilities": ColumnType.NESTED,
+        "actions": ColumnType.NESTED,
+        "legendary_actions": ColumnType.NESTED,
+        "reactions": ColumnType.NESTED,
+        "forms": ColumnType.NESTED,
+        "url": ColumnType.STRING,
+        "speed_walk": ColumnType.INT,
+        "speed_swim": ColumnType.INT,
+        "speed_fly": ColumnType.INT,
+        "speed_burrow": ColumnType.INT,
+        "speed_climb": ColumnType.INT,
+        "speed_hover": ColumnType.BOOL,
+        "darkvision": ColumnType.INT,
+        "passive_perception": ColumnType.INT,
+        "blindsight": ColumnType.INT,
+        "truesight": ColumnType.INT,
+        "tremorsense": ColumnType.INT,
+        "vulnerable_to": ColumnType.NESTED,
+        "resistant_to": ColumnType.NESTED,
+        "immune_to": ColumnType.NESTED,
+        "noted_strong_against": ColumnType.NESTED,
+        "noted_weak_against": ColumnType.NESTED,
+    },
+    RuleSet.CLASSES: {
+        "name": ColumnType.STRING,
+        "hit_die": ColumnType.INT,
+        "proficiencies": ColumnType.NESTED,
+        "saving_throws": ColumnType.NESTED,
+        "subclasses": ColumnType.NESTED,
+        "url": ColumnType.STRING,
+        "spellcasting_level": ColumnType.INT,
+        "spellcasting_ability": ColumnType.CATEGORY,
+        "spellcasting_info": ColumnType.NESTED,
+        "multiclass_prerequisites": ColumnType.NESTED,
+        "multiclass_prerequisite_options": ColumnType.NESTED,
+    },
+    RuleSet.LEVELS: {
+        "class_name": ColumnType.CATEGORY,
+        "subclass_name": ColumnType.CATEGORY,
+        "level": ColumnType.INT,
+        "prof_bonus": ColumnType.INT,
+        "ability_score_bonuses": ColumnType.INT,
+        "cantrips_known": ColumnType.INT,
+        "spells_known": ColumnType.INT,
+        **{f"spell_slots_level_{i}": ColumnType.INT for i in range(1, 10)},
+        "counters": ColumnType.NESTED,
+        "features": ColumnType.NESTED,
+    },
+    RuleSet.RACES: {
+        "name": ColumnType.STRING,
+        "speed": ColumnType.INT,
+        "size": ColumnType.CATEGORY,
+        "ability_bonuses": ColumnType.NESTED,
+        "ability_bonus_choose": ColumnType.INT,
+        "ability_bonus_options": ColumnType.NESTED,
+        "proficiencies": ColumnType.NESTED,
+        "proficiency_choose": ColumnType.INT,
+        "proficiency_options": ColumnType.NESTED,
+        "languages": ColumnType.NESTED,
+        "language_choose": ColumnType.INT,
+        "language_options": ColumnType.NESTED,
+        "traits": ColumnType.NESTED,
+        "subraces": ColumnType.NESTED,
+        "url": ColumnType.STRING,
+    },
+    RuleSet.SUBRACES: {
+        "name": ColumnType.STRING,
+        "race_name": ColumnType.CATEGORY,
+        "desc": ColumnType.STRING,
+        "ability_bonuses": ColumnType.NESTED,
+        "proficiencies": ColumnType.NESTED,
+        "languages": ColumnType.NESTED,
+        "language_choose": ColumnType.INT,
+        "language_options": ColumnType.NESTED,
+        "traits": ColumnType.NESTED,
+        "url": ColumnType.STRING,
+    },
+    RuleSet.BACKGROUNDS: {
+        "name": ColumnType.STRING,
+        "proficiencies": ColumnType.NESTED,
+        "language_choose": ColumnType.INT,
+        "feature_name": ColumnType.STRING,
+        "feature_desc": ColumnType.STRING,
+        "url": ColumnType.STRING,
+    },
+    RuleSet.FEATS: {
+        "name": ColumnType.STRING,
+        "prerequisites": ColumnType.NESTED,
+        "desc": ColumnType.STRING,
+        "url": ColumnType.STRING,
+    },
+}
+
+
+def _is_missing(value: Any, na_value: Optional[str]) -> bool:
+    """True for None/NaN/NA and for the sentinel string a script used to fill missing values."""
+    if isinstance(value, (list, dict, np.ndarray)):
+        return False
+    if na_value is not None and isinstance(value, str) and value == na_value:
+        return True
+    return bool(pd.isna(value))
+
+
+def apply_schema(
+    df: pd.DataFrame, ruleset: RuleSet, na_value: Optional[str] = None
+) -> pd.DataFrame:
+    """Cast a processed table to its registered schema.
+
+    Missing values, including cells filled with the na_value sentinel string, become proper nulls. Nested
+    columns keep their lists and dicts so they're written as parquet list/struct columns (this needs the
+    pyarrow parquet engine). An empty dict is stored as null since parquet has no struct without fields.
+    """
+    schema = SCHEMAS[ruleset]
+    assert set(df.columns.to_list()) == set(schema), (
+        f"Columns don't match the registered {ruleset.value} schema"
+    )
+
+    typed = {}
+    for col, col_type in schema.items():
+        values = [None if _is_missing(i, na_value) else i for i in df[col]]
+        if col_type == ColumnType.NESTED:
+            typed[col] = pd.Series(
+                [None if isinstance(i, dict) and not i else i for i in values],
+                index=df.index,
+                dtype=object,
+            )
+        elif col_type in (ColumnType.INT, ColumnType.FLOAT):
+            typed[col] = pd.to_numeric(
+                pd.Series(values, index=df.index, dtype=object)
+            ).astype(col_type.value)
+        elif col_type == ColumnType.BOOL:
+            typed[col] = pd.Series(values, index=df.index, dtype="boolean")
+        else:
+            typed[col] = pd.Series(
+                [None if i is None else str(i) for i in values], index=df.index
+            ).astype(col_type.value)
+
+    return pd.DataFrame(typed, index=df.index)[df.columns]
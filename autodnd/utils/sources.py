@@ -0,0 +1,149 @@
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from autodnd.utils.project_root import get_project_root
+from autodnd.utils.ruleset_enum import RuleSet
+
+# Environment variable choosing the source the stages read and write, the SRD by default
+source_env_var = "AUTODND_SOURCE"
+
+# The SRD rules, the lowest layer every other source overrides
+base_source = "srd"
+
+# the year of the SRD rules, currently only 2014 exists
+srd_year = "2014"
+
+# where the SRD rule jsons are downloaded from, {ruleset} being the RuleSet value
+srd_url = f"https://raw.githubusercontent.com/5e-bits/5e-database/main/src/{srd_year}/5e-SRD-{{ruleset}}.json"
+
+# folder holding one folder per homebrew source, with its jsonrules and processed folders
+homebrew_folder = get_project_root() / "data" / "homebrew"
+
+# Optional list of the homebrew sources in precedence order, lowest first, e.g.
+# [{"name": "my-pack", "url": "https://example.com/my-pack/{ruleset}.json", "rulesets": ["Spells"]}]
+# Without it every folder of homebrew_folder is a source, in alphabetical order
+sources_filename = "sources.json"
+
+# Columns identifying a row across sources, the first one a table has is its override key. Tables usually
+# drop the index of their records, those fall back on the url and then on the title of the row
+override_columns = ("index", "url", "name", "ability_name", "equipment_category")
+
+
+@dataclass(frozen=True)
+class Source:
+    """A provider of rule JSONs: the SRD or a homebrew pack, processed into its own folder.
+
+    url is a template of the download url of a rule JSON, {ruleset} being the RuleSet value. rulesets are the
+    JSONs a homebrew source publishes, all of them by default. Sources without url are local, their JSONs
+    are dropped in json_folder by hand.
+    """
+
+    name: str
+    url: Optional[str] = None
+    rulesets: Optional[tuple[RuleSet, ...]] = None
+
+    @property
+    def folder(self) -> Path:
+        if self.name == base_source:
+            return get_project_root() / "data"
+        return homebrew_folder / self.name
+
+    @property
+    def json_folder(self) -> Path:
+        return self.folder / "jsonrules"
+
+    @property
+    def processed_folder(self) -> Path:
+        return self.folder / "processed"
+
+    def available(self) -> list[RuleSet]:
+        """The rule JSONs of the source there are locally."""
+        return [i for i in RuleSet if (self.json_folder / f"{i.value}.json").exists()]
+
+
+srd = Source(base_source, srd_url)
+
+
+def get_sources() -> list[Source]:
+    """Every source in precedence order, the SRD first and the homebrew sources overriding it after."""
+    try:
+        with open(homebrew_folder / sources_filename, "r") as f:
+            declared = json.load(f)
+    except FileNotFoundError:
+        declared = (
+            [{"name": i.name} for i in sorted(homebrew_folder.iterdir()) if i.is_dir()]
+            if homebrew_folder.exists()
+            else []
+        )
+
+    sources = [srd]
+    for i in declared:
+        rulesets = i.get("rulesets")
+        sources.append(
+            Source(
+                i["name"],
+                i.get("url"),
+                None if rulesets is None else tuple(RuleSet(j) for j in rulesets),
+            )
+        )
+    names = [i.name for i in sources]
+    assert len(set(names)) == len(names), f"Duplicate source names in {names}"
+    return sources
+
+
+def get_source(name: Optional[str] = None) -> Source:
+    """The source named, or chosen by the AUTODND_SOURCE environment variable (the SRD by default)."""
+    name = name or os.environ.get(source_env_var, base_source)
+    for source in get_sources():
+        if source.name == name:
+            return source
+    raise ValueError(f"Unknown source {name}, only {[i.name for i in get_sources()]}")
+
+
+def source_layers(name: Optional[str] = None) -> list[Source]:
+    """The sources a source is layered on, lowest first and ending with the source itself."""
+    source = get_source(name)
+    sources = get_sources()
+    return sources[: sources.index(source) + 1]
+
+
+def source_folder() -> Path:
+    """Folder of the rule JSONs of the active source, where the stages read from."""
+    return get_source().json_folder
+
+
+def processed_folder() -> Path:
+    """Folder of the processed tables of the active source, where the stages write to."""
+    return get_source().processed_folder
+
+
+def override_key(columns: Iterable[str]) -> Optional[str]:
+    """The column rows of a table are overridden by across sources, None if it has none."""
+    columns = set(columns)
+    return next((i for i in override_columns if i in columns), None)
+
+
+def merge_layers(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Merge the frames of one table from the lowest source to the highest.
+
+    The rows of a key replace every row with that key in the lower sources, so a source overriding one
+    entry of an exploded table replaces all its rows. Frames without an override key are concatenated.
+    """
+    kept = []
+    seen: set = set()
+    for frame in reversed(frames):
+        key = override_key(frame.columns)
+        if key is not None:
+            overridden = frame[key].isin(seen)
+            seen.update(frame[key].dropna())
+            frame = frame[~overridden]
+        # A column null in every row of a layer, like an optional key no record of a small pack has, doesn't
+        # decide the dtype of the merged column
+        kept.append(frame.dropna(axis=1, how="all"))
+    columns = list(dict.fromkeys(i for frame in frames for i in frame.columns))
+    return pd.concat(kept[::-1], ignore_index=True).reindex(columns=columns)
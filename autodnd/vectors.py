@@ -0,0 +1,354 @@
+import argparse
+import shutil
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional, Protocol
+
+import numpy as np
+import pandas as pd
+
+from autodnd.search import documents, tokenize
+from autodnd.utils.dataset_cache import load, table_paths
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import get_source
+
+# Subfolder of the processed tables of a source holding its vector index
+vector_subfolder = "vectors"
+
+# Chunks are windows of this many words of a row's prose, overlapping by chunk_overlap words
+chunk_words = 80
+chunk_overlap = 20
+
+# Number of k-means iterations used to train the IVF centroids
+kmeans_iterations = 10
+
+# Number of IVF lists scanned per query by default
+default_nprobe = 4
+
+
+class Embedder(Protocol):
+    """Turns texts into L2-normalized float32 vectors of dim dimensions."""
+
+    dim: int
+
+    def fit(self, texts: list[str]) -> None: ...
+
+    def embed(self, texts: list[str]) -> np.ndarray: ...
+
+
+class HashingEmbedder:
+    """TF-IDF over hashed unigrams and bigrams, the default embedder. Needs no model or network.
+
+    Every unigram and bigram is hashed to one of dim buckets with a sign, so colliding features tend to cancel
+    out rather than add up. Buckets are weighted by sublinear term frequency times the inverse document
+    frequency learned by fit.
+    """
+
+    def __init__(self, dim: int = 1024, idf: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.idf = np.ones(dim, dtype=np.float32) if idf is None else idf
+
+    def _features(self, text: str) -> list[int]:
+        tokens = tokenize(text)
+        grams = tokens + [f"{i} {j}" for i, j in zip(tokens, tokens[1:])]
+        # crc32 rather than hash() so the buckets are the same in every process
+        return [zlib.crc32(i.encode()) for i in grams]
+
+    def _counts(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows, signed bucket columns and counts of the hashed features of every text."""
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(features)
+        if not hashes:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        # One int64 key per (row, hash) pair, so counting them is a plain 1-d unique
+        keys = (np.array(rows, dtype=np.int64) << 32) | np.array(hashes, dtype=np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        return keys >> 32, keys & 0xFFFFFFFF, counts
+
+    def fit(self, texts: list[str]) -> None:
+        rows, hashes, _ = self._counts(texts)
+        doc_freq = np.zeros(self.dim)
+        # Count every bucket once per text
+        keys = np.unique((rows << 32) | (hashes % self.dim))
+        np.add.at(doc_freq, keys & 0xFFFFFFFF, 1)
+        self.idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1).astype(np.float32)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        rows, hashes, counts = self._counts(texts)
+        buckets = hashes % self.dim
+        signs = np.where((hashes >> 31) & 1, -1.0, 1.0)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(
+            vectors, (rows, buckets), signs * (1 + np.log(counts)) * self.idf[buckets]
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+def vector_folder(source: Optional[str] = None) -> Path:
+    """Folder of the vector index of a source, the active one by default."""
+    return get_source(source).processed_folder / vector_subfolder
+
+
+def chunk_tables(
+    rulesets: Optional[Iterable[RuleSet]] = None, source: Optional[str] = None
+) -> pd.DataFrame:
+    """Split the title and prose of every row of the processed tables into overlapping chunks of words.
+
+    Under a homebrew source the tables are merged across its layers, see autodnd.utils.dataset_cache.load.
+    """
+    chunks = []
+    step = chunk_words - chunk_overlap
+    for ruleset in RuleSet if rulesets is None else rulesets:
+        if not table_paths(ruleset, source):
+            continue
+        for row, (title, text) in enumerate(documents(load(ruleset, source=source))):
+            words = text.split()
+            if not title and not words:
+                # Nothing to embed, like the rows of the Levels table
+                continue
+            for start in range(0, max(len(words) - chunk_overlap, 1), step):
+                chunk = " ".join(words[start : start + chunk_words])
+                chunks.append(
+                    {
+                        "table": ruleset.value,
+                        "row": row,
+                        "name": title,
+                        "text": f"{title}: {chunk}" if chunk else title,
+                    }
+                )
+    return pd.DataFrame(chunks, columns=["table", "row", "name", "text"])
+
+
+def _kmeans(
+    vectors: np.ndarray, n_lists: int, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means, returning the unit norm centroids and the list of every vector.
+
+    Centroids are only ever seeded from non-zero vectors, a zero vector has no direction to normalize.
+    """
+    seeds = np.flatnonzero(vectors.any(axis=1))
+    centroids = vectors[rng.choice(seeds, min(n_lists, len(seeds)), replace=False)]
+    for _ in range(kmeans_iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty lists with random vectors
+        sums[empty] = vectors[rng.choice(seeds, int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Vectors of a list can still cancel out, leave those centroids at zero rather than NaN
+        centroids = sums / np.where(norms == 0, 1, norms)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class VectorIndex:
+    """Chunk vectors in a float16 memory-mapped matrix, grouped by IVF list so every list is one slice."""
+
+    def __init__(
+        self,
+        chunks: pd.DataFrame,
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        embedder: Embedder,
+    ):
+        self.chunks = chunks
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self.embedder = embedder
+
+    @classmethod
+    def build(
+        cls,
+        embedder: Optional[Embedder] = None,
+        rulesets: Optional[Iterable[RuleSet]] = None,
+        n_lists: Optional[int] = None,
+        folder: Optional[Path] = None,
+        seed: int = 0,
+    ) -> "VectorIndex":
+        """Chunk and embed the processed tables, train the IVF lists and write the index to folder.
+
+        folder defaults to the vector folder of the active source, whose tables are indexed. n_lists defaults
+        to about the square root of the number of chunks. The index is written to a temp
+        folder and swapped in, so readers never see a partly written index.
+        """
+        embedder = HashingEmbedder() if embedder is None else embedder
+        folder = vector_folder() if folder is None else folder
+        chunks = chunk_tables(rulesets)
+        texts = chunks["text"].to_list()
+        embedder.fit(texts)
+        vectors = embedder.embed(texts)
+        # Chunks of stop words only embed to zero vectors, no query can ever match them
+        found = np.flatnonzero(vectors.any(axis=1))
+        chunks, vectors = chunks.iloc[found].reset_index(drop=True), vectors[found]
+        if chunks.empty:
+            raise ValueError("Nothing to index, run the transform first")
+
+        n_lists = n_lists or max(1, int(np.sqrt(len(chunks))))
+        centroids, assignment = _kmeans(
+            vectors, min(n_lists, len(chunks)), np.random.default_rng(seed)
+        )
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+        chunks = chunks.iloc[order].reset_index(drop=True)
+
+        folder.parent.mkdir(parents=True, exist_ok=True)
+        temp_folder = Path(
+            tempfile.mkdtemp(dir=folder.parent, prefix=f".{folder.name}.")
+        )
+        matrix = np.lib.format.open_memmap(
+            temp_folder / "vectors.npy",
+            mode="w+",
+            dtype=np.float16,
+            shape=vectors.shape,
+        )
+        matrix[:] = vectors[order]
+        matrix.flush()
+        del matrix
+        chunks.to_parquet(temp_folder / "chunks.parquet", engine="pyarrow")
+        np.savez(temp_folder / "ivf.npz", centroids=centroids, offsets=offsets)
+        if isinstance(embedder, HashingEmbedder):
+            np.savez(temp_folder / "embedder.npz", idf=embedder.idf)
+        if folder.exists():
+            old_folder = folder.with_name(f".{folder.name}.old")
+            shutil.rmtree(old_folder, ignore_errors=True)
+            folder.rename(old_folder)
+            temp_folder.rename(folder)
+            shutil.rmtree(old_folder)
+        else:
+            temp_folder.rename(folder)
+        return cls.load(embedder, folder)
+
+    @classmethod
+    def load(
+        cls, embedder: Optional[Embedder] = None, folder: Optional[Path] = None
+    ) -> "VectorIndex":
+        """Memory-map an index, of the active source by default. The default hashing embedder is restored from
+        the index, others must be passed."""
+        folder = vector_folder() if folder is None else folder
+        if embedder is None:
+            with np.load(folder / "embedder.npz") as state:
+                embedder = HashingEmbedder(len(state["idf"]), state["idf"])
+        with np.load(folder / "ivf.npz") as ivf:
+            centroids, offsets = ivf["centroids"], ivf["offsets"]
+        return cls(
+            chunks=pd.read_parquet(folder / "chunks.parquet"),
+            vectors=np.load(folder / "vectors.npy", mmap_mode="r"),
+            centroids=centroids,
+            offsets=offsets,
+            embedder=embedder,
+        )
+
+    def _top(self, positions: np.ndarray, scores: np.ndarray, k: int) -> pd.DataFrame:
+        top = np.argsort(-scores, kind="stable")[:k]
+        result = self.chunks.iloc[positions[top]].reset_index(drop=True)
+        result.insert(0, "chunk", positions[top])
+        result["score"] = scores[top]
+        return result
+
+    def search(
+        self, query: str, k: int = 10, nprobe: Optional[int] = default_nprobe
+    ) -> pd.DataFrame:
+        """The k chunks closest to the query by cosine similarity, scanning the nprobe closest IVF lists.
+
+        nprobe=None scans everything, which is exact search.
+        """
+        q = self.embedder.embed([query])[0]
+        if nprobe is None or nprobe >= len(self.centroids):
+            scores = np.asarray(self.vectors, dtype=np.float32) @ q
+            return self._top(np.arange(len(scores)), scores, k)
+
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        positions = np.concatenate(
+            [np.arange(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        )
+        scores = np.concatenate(
+            [
+                np.asarray(
+                    self.vectors[self.offsets[i] : self.offsets[i + 1]],
+                    dtype=np.float32,
+                )
+                @ q
+                for i in probe
+            ]
+        )
+        return self._top(positions, scores, k)
+
+
+def benchmark(
+    index: VectorIndex,
+    queries: list[str],
+    k: int = 10,
+    nprobes: Iterable[int] = (1, 2, 4, 8, 16),
+) -> pd.DataFrame:
+    """Recall@k and latency of IVF search for every nprobe, against exact search over the same vectors."""
+
+    def run(nprobe: Optional[int]) -> tuple[list[set[int]], np.ndarray]:
+        results, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            found = index.search(query, k, nprobe)
+            latencies.append(time.perf_counter() - start)
+            results.append(set(found["chunk"]))
+        return results, np.array(latencies) * 1000
+
+    exact, exact_ms = run(None)
+    rows = [
+        {
+            "nprobe": "exact",
+            "recall_at_k": 1.0,
+            "mean_ms": exact_ms.mean(),
+            "p95_ms": np.percentile(exact_ms, 95),
+        }
+    ]
+    for nprobe in nprobes:
+        if nprobe >= len(index.centroids):
+            break
+        found, ms = run(nprobe)
+        recall = np.mean(
+            [len(i & j) / len(j) if j else 1.0 for i, j in zip(found, exact)]
+        )
+        rows.append(
+            {
+                "nprobe": nprobe,
+                "recall_at_k": recall,
+                "mean_ms": ms.mean(),
+                "p95_ms": np.percentile(ms, 95),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the vector index of the processed tables and benchmark it against exact search."
+    )
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding dimensions.")
+    parser.add_argument("--lists", type=int, default=None, help="Number of IVF lists.")
+    parser.add_argument("--queries", type=int, default=200, help="Benchmark queries.")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = VectorIndex.build(HashingEmbedder(args.dim), n_lists=args.lists)
+    print(
+        f"Indexed {len(index.chunks):,} chunks in {len(index.centroids)} lists "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+    # Queries are the first words of random chunks, like a short question about a rule
+    rng = np.random.default_rng(0)
+    sample = index.chunks["text"].sample(
+        min(args.queries, len(index.chunks)), random_state=rng
+    )
+    queries = [" ".join(i.split()[:8]) for i in sample]
+    print(benchmark(index, queries, args.k).to_string(index=False))
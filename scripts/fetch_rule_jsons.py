@@ -1,18 +1,42 @@
-from autodnd.utils.project_root import get_project_root
-from autodnd.utils.fetch_tools import download_file
-from autodnd.utils.ruleset_enum import RuleSet
+import argparse
 
-# folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+from autodnd.utils.fetch_tools import download_files
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import get_source, get_sources
 
 # the various ruleset strings
 ruleset_list = RuleSet.to_list()
 
-# the year of the rules, currently only 2014 exists
-year = "2014"
+# how many files to download at once
+max_workers = 8
 
 if __name__ == "__main__":
-    for ruleset in ruleset_list:
-        json_rule_path = data_folder / f"{ruleset}.json"
-        ruleset_url = f"https://raw.githubusercontent.com/5e-bits/5e-database/main/src/{year}/5e-SRD-{ruleset}.json"
-        download_file(json_rule_path.parents[0], json_rule_path.name, ruleset_url)
+    parser = argparse.ArgumentParser(
+        description="Download the rule jsons of the SRD and of the homebrew sources with an url."
+    )
+    parser.add_argument(
+        "--source",
+        default=None,
+        help="Only download this source, see autodnd.utils.sources. Every source by default.",
+    )
+    args = parser.parse_args()
+
+    sources = get_sources() if args.source is None else [get_source(args.source)]
+    for source in sources:
+        if source.url is None:
+            # Local sources have their jsons dropped in their folder by hand
+            continue
+        rulesets = (
+            ruleset_list
+            if source.rulesets is None
+            else [i.value for i in source.rulesets]
+        )
+        # Only files that changed upstream since the last run are actually downloaded
+        download_files(
+            source.json_folder,
+            {
+                f"{ruleset}.json": source.url.format(ruleset=ruleset)
+                for ruleset in rulesets
+            },
+            max_workers=max_workers,
+        )
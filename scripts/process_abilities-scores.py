@@ -1,14 +1,15 @@
 import pandas as pd
 import json
 
-from autodnd.utils.project_root import get_project_root
+from autodnd.utils.backend import get_backend
 from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import processed_folder, source_folder
 
 # folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+data_folder = source_folder()
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 # What string to use to fill NA values
 na_string = "none"
@@ -26,6 +27,9 @@ if __name__ == "__main__":
     # filename string
     ruleset = RuleSet.ABILITY_SCORES.value
 
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
+
     # Load the JSON file
     json_rule_path = data_folder / f"{ruleset}.json"
     with open(json_rule_path, "r") as file:
@@ -40,37 +44,18 @@ if __name__ == "__main__":
     ), "Unexpected data organization, schema has probably changed"
 
     # Concatenate the description columns and drop the index column
-    df = df.assign(
-        desc=lambda temp: temp[description_col_str].apply(lambda x: "".join(x))
-    ).drop(original_index_col_str, axis=1)
-
-    # Explode the skills column since each record is a dictionary
-    exploded_skills = (
-        df[[skills_col_str, abilities_col_str]]
-        .explode(skills_col_str)
-        .rename(columns={abilities_col_str: "ab_name"})
+    df = df.assign(desc=backend.join_text(df[description_col_str])).drop(
+        original_index_col_str, axis=1
     )
 
-    # Group all the skill descriptions by ability and prep the dataset for joining with the ability table
-    skills = (
-        pd.concat(
-            [
-                pd.json_normalize(exploded_skills[skills_col_str].to_list())[
-                    skills_key_name
-                ].add(", "),
-                exploded_skills.ab_name.reset_index(drop=True),
-            ],
-            axis=1,
-        )
-        .fillna(na_string)
-        .groupby("ab_name")
-        .sum()
-        .rename(columns={skills_key_name: "skill_names"})
+    # The names of the skills of every ability, each followed by a comma
+    skill_names = backend.join_text(
+        backend.list_field(df[skills_col_str], skills_key_name), ", ", terminate=True
     )
 
-    # Join the ability table with the newly grouped abilities table
+    # Add the skill names to the ability table
     output_df = (
-        pd.merge(df, skills, how="left", left_on=abilities_col_str, right_on="ab_name")
+        df.assign(skill_names=skill_names.mask(skill_names == "", na_string))
         .drop([skills_col_str], axis=1)
         .fillna(na_string)
         .rename(columns={abilities_col_str: "ability_name"})
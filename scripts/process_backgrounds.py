@@ -0,0 +1,87 @@
+from autodnd.utils.dataset_cache import load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original backgrounds json file
+index_col_str = "index"
+starting_proficiencies_col_str = "starting_proficiencies"
+language_options_col_str = "language_options"
+feature_desc_col_str = "feature_desc"
+
+# Unnecessary columns, never loaded. The equipment and the personality tables are left to the character
+unused_cols = [index_col_str, "starting_equipment", "starting_equipment_options"]
+
+# The choice blocks (languages, personality traits, ideals, bonds and flaws) hold different kinds of options
+# from background to background, so they're not checked against the schema. Only the languages are loaded
+variable_prefixes = [
+    language_options_col_str,
+    "personality_traits",
+    "ideals",
+    "bonds",
+    "flaws",
+]
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.BACKGROUNDS.value
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "starting_proficiencies",
+        "starting_equipment",
+        "starting_equipment_options",
+        "feature_name",
+        "feature_desc",
+        "url",
+    ]
+    df = load_json(
+        RuleSet.BACKGROUNDS,
+        [i for i in json_cols if i not in unused_cols] + [language_options_col_str],
+        expected_columns=json_cols,
+        variable_prefixes=variable_prefixes,
+    )
+
+    # Only the names of the proficiencies
+    df[starting_proficiencies_col_str] = df[starting_proficiencies_col_str].apply(
+        lambda x: [i["name"] for i in x]
+    )
+
+    # The number of extra languages a character picks
+    df["language_choose"] = df[language_options_col_str].apply(
+        lambda x: x.get("choose", 0) if isinstance(x, dict) else 0
+    )
+    df = df.drop([language_options_col_str], axis=1)
+
+    # Concatenating the description paragraphs
+    df[feature_desc_col_str] = df[feature_desc_col_str].apply(
+        lambda x: "\n".join(x) if isinstance(x, list) else x
+    )
+
+    df = df.rename(columns={starting_proficiencies_col_str: "proficiencies"})
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.BACKGROUNDS)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        [
+            "name",
+            "proficiencies",
+            "language_choose",
+            "feature_name",
+            "feature_desc",
+            "url",
+        ]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
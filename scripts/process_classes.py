@@ -0,0 +1,132 @@
+from typing import Any
+
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original classes json file
+index_col_str = "index"
+proficiencies_col_str = "proficiencies"
+saving_throws_col_str = "saving_throws"
+subclasses_col_str = "subclasses"
+multi_classing_col_str = "multi_classing"
+
+# Unnecessary columns, never loaded
+unused_cols = [
+    index_col_str,
+    "class_levels",
+    "proficiency_choices",
+    "starting_equipment",
+    "starting_equipment_options",
+    "spells",
+    "spellcasting_spellcasting_ability_index",
+    "spellcasting_spellcasting_ability_url",
+]
+
+# The multiclassing requirements differ from class to class (a list of required scores, a choice between
+# scores, extra proficiency choices...), so they're loaded whole and not checked against the schema
+variable_prefixes = [multi_classing_col_str]
+
+# Renaming the flattened columns of the nested references
+renamed_cols = {"spellcasting_spellcasting_ability_name": "spellcasting_ability"}
+
+
+def score_prerequisites(prerequisites: Any) -> list[dict[str, Any]]:
+    """Turn a list of ability score prerequisites into ability_score/minimum_score records."""
+    if not isinstance(prerequisites, list):
+        return []
+    return [
+        {
+            "ability_score": i["ability_score"]["name"],
+            "minimum_score": i["minimum_score"],
+        }
+        for i in prerequisites
+    ]
+
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.CLASSES.value
+
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "hit_die",
+        "class_levels",
+        "proficiency_choices",
+        "proficiencies",
+        "saving_throws",
+        "starting_equipment",
+        "starting_equipment_options",
+        "subclasses",
+        "url",
+        "spellcasting_level",
+        "spellcasting_spellcasting_ability_index",
+        "spellcasting_spellcasting_ability_name",
+        "spellcasting_spellcasting_ability_url",
+        "spellcasting_info",
+        "spells",
+    ]
+    df = load_json(
+        RuleSet.CLASSES,
+        [i for i in json_cols if i not in unused_cols] + [multi_classing_col_str],
+        expected_columns=json_cols,
+        variable_prefixes=variable_prefixes,
+    )
+
+    # Only the names of the proficiencies, saving throws and subclasses of the class
+    for col in [proficiencies_col_str, saving_throws_col_str, subclasses_col_str]:
+        df[col] = backend.list_field(df[col], "name")
+
+    df[multi_classing_col_str] = df[multi_classing_col_str].apply(
+        lambda x: x if isinstance(x, dict) else {}
+    )
+
+    # The ability scores needed to multiclass into the class, all of multiclass_prerequisites or any one of
+    # multiclass_prerequisite_options
+    df["multiclass_prerequisites"] = df[multi_classing_col_str].apply(
+        lambda x: score_prerequisites(x.get("prerequisites"))
+    )
+    df["multiclass_prerequisite_options"] = df[multi_classing_col_str].apply(
+        lambda x: score_prerequisites(
+            x.get("prerequisite_options", {}).get("from", {}).get("options")
+        )
+    )
+    df = df.drop([multi_classing_col_str], axis=1)
+
+    df = df.rename(columns=renamed_cols)
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.CLASSES)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        [
+            "name",
+            "hit_die",
+            "proficiencies",
+            "saving_throws",
+            "subclasses",
+            "url",
+            "spellcasting_level",
+            "spellcasting_ability",
+            "spellcasting_info",
+            "multiclass_prerequisites",
+            "multiclass_prerequisite_options",
+        ]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
@@ -1,14 +1,13 @@
 import pandas as pd
-import json
 
-from autodnd.utils.project_root import get_project_root
+from autodnd.utils.dataset_cache import load, load_json
+from autodnd.utils.reference_resolver import ReferenceIndex
 from autodnd.utils.ruleset_enum import RuleSet
-
-# folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 # String used to fill N/A values
 unknown_value_fill_string = "Unknown or Not Applicable"
@@ -22,6 +21,14 @@ equipment_category_url_str = "equipment_category_url"
 damage_damage_type_index_str = "damage_damage_type_index"
 damage_damage_type_url_str = "damage_damage_type_url"
 
+# Unnecessary columns, never loaded
+unused_cols = [
+    equipment_category_index_str,
+    equipment_category_url_str,
+    damage_damage_type_index_str,
+    damage_damage_type_url_str,
+]
+
 if __name__ == "__main__":
     ## ---- Load Necessary Data First ----###
 
@@ -30,9 +37,9 @@ if __name__ == "__main__":
 
     # load the damage_type data
     try:
-        damage_type_df = pd.read_parquet(save_folder / f"{damage_type}.parquet").rename(
+        damage_type_df = load(RuleSet.DAMAGE_TYPES, ["name", "desc"]).rename(
             columns={"desc": "damage_type_desc", "name": "damage_type_name_temp"}
-        )[["damage_type_name_temp", "damage_type_desc"]]
+        )
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The damage_type parquet file is missing. You need to run the process_{damage_type} script first to generate the dataset."
@@ -43,7 +50,7 @@ if __name__ == "__main__":
 
     # load the damage_type data
     try:
-        weapon_props_df = pd.read_parquet(save_folder / f"{weapon_props}.parquet")
+        weapon_props_df = load(RuleSet.WEAPON_PROPERTIES)
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The weapon_props parquet file is missing. You need to run the process_{weapon_props} script first to generate the dataset."
@@ -54,72 +61,57 @@ if __name__ == "__main__":
     # filename string
     ruleset = RuleSet.EQUIPMENT.value
 
-    # Load the JSON file
-    json_rule_path = data_folder / f"{ruleset}.json"
-    with open(json_rule_path, "r") as file:
-        data = json.load(file)
-
-    # Normalize the JSON data to flatten it
-    df = pd.json_normalize(data, sep="_")
-
-    # Check if the JSON data has the expected schema
-    assert set(df.columns.to_list()) == set(
-        [
-            "index",
-            "name",
-            "weapon_category",
-            "weapon_range",
-            "category_range",
-            "weight",
-            "properties",
-            "url",
-            "equipment_category_index",
-            "equipment_category_name",
-            "equipment_category_url",
-            "cost_quantity",
-            "cost_unit",
-            "damage_damage_dice",
-            "damage_damage_type_index",
-            "damage_damage_type_name",
-            "damage_damage_type_url",
-            "range_normal",
-            "throw_range_normal",
-            "throw_range_long",
-            "two_handed_damage_damage_dice",
-            "two_handed_damage_damage_type_index",
-            "two_handed_damage_damage_type_name",
-            "two_handed_damage_damage_type_url",
-            "range_long",
-            "special",
-            "armor_category",
-            "str_minimum",
-            "stealth_disadvantage",
-            "armor_class_base",
-            "armor_class_dex_bonus",
-            "armor_class_max_bonus",
-            "gear_category_index",
-            "gear_category_name",
-            "gear_category_url",
-            "desc",
-            "quantity",
-            "contents",
-            "tool_category",
-            "vehicle_category",
-            "capacity",
-            "speed_quantity",
-            "speed_unit",
-        ]
-    ), "Unexpected data organization, schema has probably changed"
-
-    # Dropping unnecessary columns
-    df = df.drop(
-        [
-            equipment_category_index_str,
-            equipment_category_url_str,
-            damage_damage_type_index_str,
-            damage_damage_type_url_str,
-        ],
-        axis=1,
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "weapon_category",
+        "weapon_range",
+        "category_range",
+        "weight",
+        "properties",
+        "url",
+        "equipment_category_index",
+        "equipment_category_name",
+        "equipment_category_url",
+        "cost_quantity",
+        "cost_unit",
+        "damage_damage_dice",
+        "damage_damage_type_index",
+        "damage_damage_type_name",
+        "damage_damage_type_url",
+        "range_normal",
+        "throw_range_normal",
+        "throw_range_long",
+        "two_handed_damage_damage_dice",
+        "two_handed_damage_damage_type_index",
+        "two_handed_damage_damage_type_name",
+        "two_handed_damage_damage_type_url",
+        "range_long",
+        "special",
+        "armor_category",
+        "str_minimum",
+        "stealth_disadvantage",
+        "armor_class_base",
+        "armor_class_dex_bonus",
+        "armor_class_max_bonus",
+        "gear_category_index",
+        "gear_category_name",
+        "gear_category_url",
+        "desc",
+        "quantity",
+        "contents",
+        "tool_category",
+        "vehicle_category",
+        "capacity",
+        "speed_quantity",
+        "speed_unit",
+    ]
+    df = load_json(
+        RuleSet.EQUIPMENT,
+        [i for i in json_cols if i not in unused_cols],
+        expected_columns=json_cols,
     )
 
     # Filling N/A values
@@ -127,13 +119,14 @@ if __name__ == "__main__":
 
     # Looping though the content in the equipment properties column, extracting the name of the property and adding the property description
     # from the weapon_props_df data
+    weapon_props_by_name = ReferenceIndex(weapon_props_df, "name")
     properties_vector = []
     for i in df[properties_col_str]:
         if unknown_value_fill_string not in i:
             properties_vector.append(
                 ", ".join(
                     [
-                        f"Equipment property - [{j[properties_col_name_key_str]}]: {weapon_props_df[weapon_props_df.name == j[properties_col_name_key_str]].desc.iloc[0]}"
+                        f"Equipment property - [{j[properties_col_name_key_str]}]: {weapon_props_by_name.record(j[properties_col_name_key_str]).desc}"
                         for j in i
                     ]
                 )
@@ -145,18 +138,13 @@ if __name__ == "__main__":
     df[properties_col_str] = properties_vector
 
     # Joining the damage descriptions from the damage_type_df data
-    output_df = (
-        pd.merge(
-            df,
-            damage_type_df,
-            how="left",
-            left_on="damage_damage_type_name",
-            right_on="damage_type_name_temp",
-        )
-        .drop("damage_type_name_temp", axis=1)
-        .fillna(unknown_value_fill_string)
-        .astype(str)
-    )
+    output_df = pd.merge(
+        df,
+        damage_type_df,
+        how="left",
+        left_on="damage_damage_type_name",
+        right_on="damage_type_name_temp",
+    ).drop("damage_type_name_temp", axis=1)
 
     # Check if the output data has the expected schema before saving
     assert set(output_df.columns.to_list()) == set(
@@ -204,6 +192,9 @@ if __name__ == "__main__":
         ]
     ), "Unexpected column names, schema has probably changed"
 
+    # Cast to the typed schema, the N/A fill strings become proper nulls
+    output_df = apply_schema(output_df, RuleSet.EQUIPMENT, unknown_value_fill_string)
+
     # Save the table as a parquet file
     save_folder.mkdir(parents=True, exist_ok=True)
-    output_df.to_parquet(save_folder / f"{ruleset}.parquet")
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
@@ -0,0 +1,59 @@
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original feats json file
+index_col_str = "index"
+desc_col_str = "desc"
+prerequisites_col_str = "prerequisites"
+
+# Unnecessary columns, never loaded
+unused_cols = [index_col_str]
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.FEATS.value
+
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = ["index", "name", "prerequisites", "desc", "url"]
+    df = load_json(
+        RuleSet.FEATS,
+        [i for i in json_cols if i not in unused_cols],
+        expected_columns=json_cols,
+    )
+
+    # The minimum ability scores needed to take the feat
+    df[prerequisites_col_str] = df[prerequisites_col_str].apply(
+        lambda x: [
+            {
+                "ability_score": i["ability_score"]["name"],
+                "minimum_score": i["minimum_score"],
+            }
+            for i in x
+        ]
+    )
+
+    # Concatenating the description paragraphs
+    df[desc_col_str] = backend.join_text(df[desc_col_str], "\n")
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.FEATS)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        ["name", "prerequisites", "desc", "url"]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
@@ -1,14 +1,11 @@
-import pandas as pd
-import json
-
-from autodnd.utils.project_root import get_project_root
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load, load_json
+from autodnd.utils.reference_resolver import ReferenceIndex
 from autodnd.utils.ruleset_enum import RuleSet
-
-# folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+from autodnd.utils.sources import processed_folder
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 
 # column names from the original allignments json file
@@ -16,57 +13,37 @@ url_col_str = "url"
 spell_name_col_str = "name"
 level_col_str = "level"
 desc_col_str = "desc"
-index_col_str = "index"
 prerequisites_col_str = "prerequisites"
 prerequisites_col_type_key_str = "type"
-class_index_str = "class_index"
 class_name_str = "class_name"
-class_url_str = "class_url"
-subclass_index_str = "subclass_index"
 subclass_name_str = "subclass_name"
-subclass_url_str = "subclass_url"
 reference_col_str = "reference"
-parent_index_col_str = "parent_index"
-parent_url_col_str = "parent_url"
-feature_specific_expertise_options_choose_col_str = (
-    "feature_specific_expertise_options_choose"
-)
+parent_name_col_str = "parent_name"
 feature_specific_expertise_options_type_col_str = (
     "feature_specific_expertise_options_type"
 )
-feature_specific_expertise_options_from_option_set_type_col_str = (
-    "feature_specific_expertise_options_from_option_set_type"
-)
 feature_specific_expertise_options_from_options_col_str = (
     "feature_specific_expertise_options_from_options"
 )
-feature_specific_subfeature_options_choose_col_str = (
-    "feature_specific_subfeature_options_choose"
-)
-feature_specific_subfeature_options_type_col_str = (
-    "feature_specific_subfeature_options_type"
-)
-feature_specific_subfeature_options_from_option_set_type_col_str = (
-    "feature_specific_subfeature_options_from_option_set_type"
-)
 feature_specific_subfeature_options_from_options_col_str = (
     "feature_specific_subfeature_options_from_options"
 )
-feature_specific_invocations_col_str = "feature_specific_invocations"
-feature_specific_terrain_cols = [
-    "feature_specific_terrain_type_options_type",
-    "feature_specific_terrain_type_options_from_options",
-    "feature_specific_terrain_type_options_choose",
-    "feature_specific_terrain_type_options_desc",
-    "feature_specific_terrain_type_options_from_option_set_type",
-]
 
-feature_specific_favored_enemies_cols = [
-    "feature_specific_enemy_type_options_from_options",
-    "feature_specific_enemy_type_options_type",
-    "feature_specific_enemy_type_options_desc",
-    "feature_specific_enemy_type_options_from_option_set_type",
-    "feature_specific_enemy_type_options_choose",
+# The only columns of the features json file used below. The terrain and favoured enemies options are covered
+# by the descriptions and invocations are dropped for now, so those are never loaded
+used_cols = [
+    spell_name_col_str,
+    level_col_str,
+    prerequisites_col_str,
+    desc_col_str,
+    url_col_str,
+    class_name_str,
+    subclass_name_str,
+    reference_col_str,
+    feature_specific_expertise_options_type_col_str,
+    feature_specific_expertise_options_from_options_col_str,
+    feature_specific_subfeature_options_from_options_col_str,
+    parent_name_col_str,
 ]
 
 
@@ -81,40 +58,29 @@ if __name__ == "__main__":
 
     ### ------ Load Spells for Reference ---- ###
 
-    # Load the JSON file
-    json_rule_path = data_folder / f"{RuleSet.SPELLS.value}.json"
-    with open(json_rule_path, "r") as file:
-        data = json.load(file)
-
-    # Normalize the JSON data to flatten it
-    spells = pd.json_normalize(data, sep="_")
+    # Only the names of the spells are needed, looked up by url
+    spells = load(RuleSet.SPELLS, [url_col_str, spell_name_col_str])
 
     ### ------ Load Classes for Reference ---- ###
 
-    # Load the JSON file
-    json_rule_path = data_folder / f"{RuleSet.CLASSES.value}.json"
-    with open(json_rule_path, "r") as file:
-        data = json.load(file)
-
-    # Normalize the JSON data to flatten it
-    classes = pd.json_normalize(data, sep="_")
+    # Only the spellcasting info of the classes is needed, looked up by name
+    classes = load(
+        RuleSet.CLASSES, [classes_name_col_str, class_spellcasting_info_col_str]
+    )
 
     ### ------ Load Features for Processing ---- ###
 
     # filename string
     ruleset = RuleSet.FEATURES.value
 
-    # Load the JSON file
-    json_rule_path = data_folder / f"{ruleset}.json"
-    with open(json_rule_path, "r") as file:
-        data = json.load(file)
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
 
-    # Normalize the JSON data to flatten it
-    df = pd.json_normalize(data, sep="_")
-
-    # Check if the JSON data has the expected schema
-    assert set(df.columns.to_list()) == set(
-        [
+    # Stream in only the columns used below, checking the JSON data has the expected schema on the way
+    df = load_json(
+        RuleSet.FEATURES,
+        used_cols,
+        expected_columns=[
             "index",
             "name",
             "level",
@@ -150,8 +116,8 @@ if __name__ == "__main__":
             "parent_name",
             "parent_url",
             "feature_specific_invocations",
-        ]
-    ), "Unexpected data organization, schema has probably changed"
+        ],
+    )
 
     # Adding a column with the number of prerequisites
     df = df.assign(
@@ -162,6 +128,8 @@ if __name__ == "__main__":
 
     # Converting the prerequisite text so it includes a prerequisite description which means we need to
     # join with a couple of other data tables since the originals only has the URLs
+    features_by_url = ReferenceIndex(df, url_col_str)
+    spells_by_url = ReferenceIndex(spells, url_col_str)
     types_of_prereq = []
     for i in df[prerequisites_col_str]:
         pre_req_dict = {}
@@ -169,11 +137,11 @@ if __name__ == "__main__":
             if j[prerequisites_col_type_key_str] == "level":
                 pre_req_dict["level"] = j["level"]
             elif j[prerequisites_col_type_key_str] == "feature":
-                feature_row = df[df[url_col_str] == j["feature"]]
-                pre_req_dict["feature"] = feature_row.name.iloc[0]
+                pre_req_dict["feature"] = features_by_url.record(j["feature"])["name"]
             elif j["type"] == "spell":
-                feature_row = spells[spells[url_col_str] == j["spell"]]
-                pre_req_dict["spell"] = feature_row[spell_name_col_str].iloc[0]
+                pre_req_dict["spell"] = spells_by_url.record(j["spell"])[
+                    spell_name_col_str
+                ]
             else:
                 pre_req_dict["general"] = str(j)
         types_of_prereq.append(pre_req_dict)
@@ -181,34 +149,23 @@ if __name__ == "__main__":
     df[prerequisites_col_str] = types_of_prereq
 
     # Concatenating the description list of strings
-    df[desc_col_str] = df[desc_col_str].apply(lambda x: ",".join(x))
+    df[desc_col_str] = backend.join_text(df[desc_col_str], ",")
 
     # Dropping unnecessary columns
-    df = df.drop(
-        [
-            url_col_str,
-            index_col_str,
-            class_index_str,
-            class_url_str,
-            subclass_index_str,
-            subclass_url_str,
-            parent_index_col_str,
-            parent_url_col_str,
-        ],
-        axis=1,
-    )
+    df = df.drop([url_col_str], axis=1)
 
     # Converting the reference text so it includes a reference description. This is very manual processing. Couldn't
     # find a clear generalization here.
+    classes_by_name = ReferenceIndex(classes, classes_name_col_str)
     reference_vector = []
     for i, j in zip(df[reference_col_str].fillna(""), df[class_name_str]):
         # Not sure about general rules but I observed only two kinds of references
         # either for spell casting or the draconic subclass.
         ref_str = ""
         if ("/classes" in i) and ("spellcasting" in i):
-            spellcasting_info = classes[classes[classes_name_col_str] == j][
+            spellcasting_info = classes_by_name.record(j)[
                 class_spellcasting_info_col_str
-            ].iloc[0]
+            ]
             ref_str = "; ".join(
                 [f"{i['name']}: {i['desc'][0]}" for i in spellcasting_info]
             )
@@ -269,9 +226,7 @@ if __name__ == "__main__":
     # Dropping more unnecessary columns after all the pre-processing work above
     df = df.drop(
         [
-            feature_specific_expertise_options_choose_col_str,
             feature_specific_expertise_options_type_col_str,
-            feature_specific_expertise_options_from_option_set_type_col_str,
             feature_specific_expertise_options_from_options_col_str,
         ],
         axis=1,
@@ -297,23 +252,10 @@ if __name__ == "__main__":
     ] = new_desc
 
     # Dropping more unnecessary columns after all the pre-processing work above
-    # Dropping all the terrain related cols because the description covers it all
-    # Dropping all the favoured enemies related cols because the description covers it all
-    df = df.drop(
-        [
-            feature_specific_subfeature_options_choose_col_str,
-            feature_specific_subfeature_options_type_col_str,
-            feature_specific_subfeature_options_from_option_set_type_col_str,
-            feature_specific_subfeature_options_from_options_col_str,
-        ]
-        + feature_specific_terrain_cols
-        + feature_specific_favored_enemies_cols,
-        axis=1,
-    )
+    df = df.drop([feature_specific_subfeature_options_from_options_col_str], axis=1)
 
     # TODO: Deal with invocations. For now just drop it
     df = df.drop(df[df[spell_name_col_str].str.contains("Invocations")].index, axis=0)
-    df = df.drop([feature_specific_invocations_col_str], axis=1)
 
     output_df = df.fillna(unknown_value_fill_string)
 
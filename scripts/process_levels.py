@@ -0,0 +1,230 @@
+from typing import Any, Hashable, Optional
+
+import pandas as pd
+
+from autodnd.utils.dataset_cache import load, load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original levels json file
+index_col_str = "index"
+level_col_str = "level"
+class_name_col_str = "class_name"
+subclass_name_col_str = "subclass_name"
+class_specific_col_str = "class_specific"
+subclass_specific_col_str = "subclass_specific"
+
+# column names from the classes and features parquets
+classes_name_col_str = "name"
+classes_subclasses_col_str = "subclasses"
+feature_name_col_str = "name"
+feature_subclass_name_col_str = "subclass_name"
+feature_parent_name_col_str = "parent_name"
+
+# String the Features stage fills missing values with
+unknown_value_fill_string = "Unknown or Not Applicable"
+
+# Every class and subclass gets a row for each of these levels
+levels = range(1, 21)
+spell_slot_levels = range(1, 10)
+
+# Unnecessary columns, never loaded. The features of the levels are joined from the Features table instead
+unused_cols = [
+    index_col_str,
+    "url",
+    "features",
+    "class_index",
+    "class_url",
+    "subclass_index",
+    "subclass_url",
+]
+
+# The class and subclass specific counters (sneak attack dice, sorcery points...) are keyed differently for
+# every class, so they're loaded whole and not checked against the schema
+variable_prefixes = [class_specific_col_str, subclass_specific_col_str]
+
+# Renaming the flattened columns of the spellcasting progression
+renamed_cols = {
+    "spellcasting_cantrips_known": "cantrips_known",
+    "spellcasting_spells_known": "spells_known",
+    **{
+        f"spellcasting_spell_slots_level_{i}": f"spell_slots_level_{i}"
+        for i in spell_slot_levels
+    },
+}
+
+# Columns of a class level carried by every row of its class
+class_level_cols = ["prof_bonus", "ability_score_bonuses"] + list(renamed_cols.values())
+
+
+def counters(specific: Any, prefix: str = "") -> list[dict[str, Any]]:
+    """Flatten a class_specific map into name/value records, e.g. sneak_attack_dice_count.
+
+    Only numbers and flags are counters, lists (like the sorcery point costs of the spell slots) are left to the
+    feature descriptions.
+    """
+    if not isinstance(specific, dict):
+        return []
+    records = []
+    for key, value in specific.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            records.extend(counters(value, f"{name}_"))
+        elif isinstance(value, (bool, int, float)):
+            records.append({"name": name, "value": float(value)})
+    return records
+
+
+def features_by_level(
+    features: pd.DataFrame,
+) -> dict[tuple[str, Optional[str], int], list[str]]:
+    """Names of the features gained at every (class, subclass, level), subclass None for the class itself.
+
+    Sub-features (the options of a feature, like the fighting styles) are left out.
+    """
+    gained: dict[tuple[str, Optional[str], int], list[str]] = {}
+    top_level = features[
+        features[feature_parent_name_col_str] == unknown_value_fill_string
+    ]
+    for name, level, class_name, subclass_name in zip(
+        top_level[feature_name_col_str],
+        top_level[level_col_str],
+        top_level[class_name_col_str],
+        top_level[feature_subclass_name_col_str],
+    ):
+        subclass = None if subclass_name == unknown_value_fill_string else subclass_name
+        gained.setdefault((class_name, subclass, int(level)), []).append(name)
+    return gained
+
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.LEVELS.value
+
+    ### ------ Load Classes and Features for Reference ---- ###
+
+    # The subclasses of every class, in the order of the classes table
+    classes = load(RuleSet.CLASSES, [classes_name_col_str, classes_subclasses_col_str])
+
+    # The features every class and subclass gains at each level
+    features = features_by_level(
+        load(
+            RuleSet.FEATURES,
+            [
+                feature_name_col_str,
+                level_col_str,
+                class_name_col_str,
+                feature_subclass_name_col_str,
+                feature_parent_name_col_str,
+            ],
+        )
+    )
+
+    ### ------ Load Levels for Processing ---- ###
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "level",
+        "ability_score_bonuses",
+        "prof_bonus",
+        "features",
+        "url",
+        "class_index",
+        "class_name",
+        "class_url",
+        "subclass_index",
+        "subclass_name",
+        "subclass_url",
+        "spellcasting_cantrips_known",
+        "spellcasting_spells_known",
+    ] + [f"spellcasting_spell_slots_level_{i}" for i in spell_slot_levels]
+    df = load_json(
+        RuleSet.LEVELS,
+        [i for i in json_cols if i not in unused_cols] + variable_prefixes,
+        expected_columns=json_cols,
+        variable_prefixes=variable_prefixes,
+    )
+    df = df.rename(columns=renamed_cols)
+
+    # The class levels and the subclass levels by their keys. A subclass only has records at the levels it
+    # gains something
+    is_class_level = df[subclass_name_col_str].isna()
+    class_levels = {
+        (i[class_name_col_str], i[level_col_str]): i
+        for i in df[is_class_level].to_dict("records")
+    }
+    subclass_levels = {
+        (i[class_name_col_str], i[subclass_name_col_str], i[level_col_str]): i
+        for i in df[~is_class_level].to_dict("records")
+    }
+
+    # One dense row per class, subclass (None for the class alone) and level. The progression of a level without
+    # a record carries on from the previous one, the features are only the ones gained at that level
+    rows = []
+    for class_name, subclasses in zip(
+        classes[classes_name_col_str], classes[classes_subclasses_col_str]
+    ):
+        for subclass_name in [None] + list(subclasses):
+            class_level: dict[Hashable, Any] = {}
+            subclass_counters: list[dict[str, Any]] = []
+            for level in levels:
+                class_level = class_levels.get((class_name, level), class_level)
+                specific = subclass_levels.get(
+                    (class_name, subclass_name, level), {}
+                ).get(subclass_specific_col_str)
+                if isinstance(specific, dict):
+                    subclass_counters = counters(specific)
+                gained = features.get((class_name, None, level), [])
+                if subclass_name is not None:
+                    gained = gained + features.get(
+                        (class_name, subclass_name, level), []
+                    )
+                rows.append(
+                    {
+                        class_name_col_str: class_name,
+                        subclass_name_col_str: subclass_name,
+                        level_col_str: level,
+                        **{i: class_level.get(i) for i in class_level_cols},
+                        "counters": counters(class_level.get(class_specific_col_str))
+                        + subclass_counters,
+                        "features": gained,
+                    }
+                )
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(pd.DataFrame(rows), RuleSet.LEVELS)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        [
+            "class_name",
+            "subclass_name",
+            "level",
+            "prof_bonus",
+            "ability_score_bonuses",
+            "cantrips_known",
+            "spells_known",
+            "spell_slots_level_1",
+            "spell_slots_level_2",
+            "spell_slots_level_3",
+            "spell_slots_level_4",
+            "spell_slots_level_5",
+            "spell_slots_level_6",
+            "spell_slots_level_7",
+            "spell_slots_level_8",
+            "spell_slots_level_9",
+            "counters",
+            "features",
+        ]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
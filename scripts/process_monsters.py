@@ -0,0 +1,340 @@
+import re
+from typing import Any, Optional
+
+from autodnd.utils.dataset_cache import load, load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original monsters json file
+index_col_str = "index"
+name_col_str = "name"
+desc_col_str = "desc"
+type_col_str = "type"
+subtype_col_str = "subtype"
+armor_class_col_str = "armor_class"
+speed_col_str = "speed"
+senses_col_str = "senses"
+proficiencies_col_str = "proficiencies"
+damage_vulnerabilities_col_str = "damage_vulnerabilities"
+damage_resistances_col_str = "damage_resistances"
+damage_immunities_col_str = "damage_immunities"
+condition_immunities_col_str = "condition_immunities"
+actions_col_str = "actions"
+forms_col_str = "forms"
+
+# column names from the damage types parquet
+damage_type_name_col_str = "name"
+strong_against_col_str = "strong_against"
+weak_against_col_str = "weak_against"
+
+# Keys of the speed and senses maps, every monster only has some of them so the maps are loaded whole
+speed_keys = ["walk", "swim", "fly", "burrow", "climb", "hover"]
+senses_keys = [
+    "darkvision",
+    "passive_perception",
+    "blindsight",
+    "truesight",
+    "tremorsense",
+]
+
+# Unnecessary columns, never loaded
+unused_cols = [index_col_str, "image"]
+
+# Lists of named blocks whose records are reduced to a name and a description
+named_blocks = ["special_abilities", "legendary_actions", "reactions"]
+
+
+def feet(value: Any) -> Optional[int]:
+    """Distance in feet of a speed or sense like "30 ft.", None if there is none."""
+    if not isinstance(value, str):
+        return None
+    found = re.match(r"\s*(\d+)", value)
+    return int(found.group(1)) if found else None
+
+
+def action_record(action: dict[str, Any]) -> dict[str, Any]:
+    """An action with its attack bonus, saving throw and the dice of its damage rolls.
+
+    Damage given as a choice between options is left to the description.
+    """
+    dc = action.get("dc") or {}
+    return {
+        "name": action["name"],
+        "desc": action.get("desc"),
+        "attack_bonus": action.get("attack_bonus"),
+        "dc_type": dc.get("dc_type", {}).get("name"),
+        "dc_value": dc.get("dc_value"),
+        "damage": [
+            {"dice": i["damage_dice"], "type": i["damage_type"]["name"]}
+            for i in action.get("damage", [])
+            if "damage_dice" in i and "damage_type" in i
+        ],
+    }
+
+
+def _singular(word: str) -> str:
+    if word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> tuple[str, ...]:
+    return tuple(_singular(i) for i in re.findall(r"[a-z]+", text.casefold()))
+
+
+def creature_terms(text: str) -> list[tuple[str, tuple[str, ...]]]:
+    """The creatures named by a strong_against/weak_against note of the damage types.
+
+    Every creature comes as the phrase of the note naming it, qualifiers included, and the words it's matched
+    by. "Liches, Storm Giants, some Fiends" gives ("Liches", (lich,)), ("Storm Giants", (storm, giant)) and
+    ("some Fiends", (fiend,)).
+    """
+    terms = []
+    text = text if isinstance(text, str) else ""
+    # Commas and "and" inside a parenthesized remark don't separate creatures
+    for part in re.split(r"(?:,|\band\b)(?![^(]*\))", text):
+        words = [
+            i
+            for i in _words(re.sub(r"\(.*?\)", "", part))
+            if i not in ("some", "most", "monster", "none")
+        ]
+        if words:
+            terms.append((part.strip(), tuple(words)))
+    return terms
+
+
+def _contains(words: tuple[str, ...], term: tuple[str, ...]) -> bool:
+    return any(
+        words[i : i + len(term)] == term for i in range(len(words) - len(term) + 1)
+    )
+
+
+def damage_types_in(entries: list[str], damage_types: list[str]) -> list[str]:
+    """The damage types named by the entries of a stat block.
+
+    "bludgeoning, piercing, and slashing from nonmagical attacks" names Bludgeoning, Piercing and Slashing.
+    """
+    words = set(j for i in entries for j in _words(i))
+    return [i for i in damage_types if _singular(i.casefold()) in words]
+
+
+def noted_damage_types(
+    notes: dict[str, list[tuple[str, tuple[str, ...]]]],
+    creature: tuple[tuple[str, ...], ...],
+) -> list[str]:
+    """The damage types whose notes name a creature, given the words of its name, type and subtype.
+
+    Every damage type comes with the phrase of the note that matched, so its qualifiers are kept, e.g.
+    "Necrotic: Most Undead". The notes are hedged, they're never facts about one particular creature.
+    """
+    noted = []
+    for damage_type, terms in notes.items():
+        phrases = [
+            phrase
+            for phrase, term in terms
+            if any(_contains(words, term) for words in creature)
+        ]
+        if phrases:
+            noted.append(f"{damage_type}: {', '.join(phrases)}")
+    return noted
+
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.MONSTERS.value
+
+    ### ------ Load Damage Types for Reference ---- ###
+
+    # The creatures every damage type is strong and weak against
+    damage_types = load(
+        RuleSet.DAMAGE_TYPES,
+        [damage_type_name_col_str, strong_against_col_str, weak_against_col_str],
+    )
+    damage_type_names = damage_types[damage_type_name_col_str].to_list()
+    strong_against = {
+        i: creature_terms(j)
+        for i, j in zip(damage_type_names, damage_types[strong_against_col_str])
+    }
+    weak_against = {
+        i: creature_terms(j)
+        for i, j in zip(damage_type_names, damage_types[weak_against_col_str])
+    }
+
+    ### ------ Load Monsters for Processing ---- ###
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "desc",
+        "size",
+        "type",
+        "subtype",
+        "alignment",
+        "armor_class",
+        "hit_points",
+        "hit_dice",
+        "hit_points_roll",
+        "strength",
+        "dexterity",
+        "constitution",
+        "intelligence",
+        "wisdom",
+        "charisma",
+        "proficiencies",
+        "damage_vulnerabilities",
+        "damage_resistances",
+        "damage_immunities",
+        "condition_immunities",
+        "languages",
+        "challenge_rating",
+        "proficiency_bonus",
+        "xp",
+        "special_abilities",
+        "actions",
+        "legendary_actions",
+        "reactions",
+        "forms",
+        "image",
+        "url",
+    ]
+    df = load_json(
+        RuleSet.MONSTERS,
+        [i for i in json_cols if i not in unused_cols]
+        + [speed_col_str, senses_col_str],
+        expected_columns=json_cols
+        + [f"{speed_col_str}_{i}" for i in speed_keys]
+        + [f"{senses_col_str}_{i}" for i in senses_keys],
+    )
+
+    # Concatenating the description paragraphs
+    df[desc_col_str] = df[desc_col_str].apply(
+        lambda x: "\n".join(x) if isinstance(x, list) else x
+    )
+
+    # Armor class of the first (default) armor of the monster
+    df[armor_class_col_str] = df[armor_class_col_str].apply(lambda x: x[0]["value"])
+
+    # One numeric column per kind of speed and sense, in feet
+    for key in speed_keys:
+        df[f"{speed_col_str}_{key}"] = df[speed_col_str].apply(
+            lambda x: x.get(key) if key == "hover" else feet(x.get(key))
+        )
+    for key in senses_keys:
+        df[key] = df[senses_col_str].apply(
+            lambda x: x.get(key) if key == "passive_perception" else feet(x.get(key))
+        )
+    df = df.drop([speed_col_str, senses_col_str], axis=1)
+
+    # Native lists of names and of flat records instead of the nested references
+    df[proficiencies_col_str] = df[proficiencies_col_str].apply(
+        lambda x: [{"name": i["proficiency"]["name"], "value": i["value"]} for i in x]
+    )
+    for col in [condition_immunities_col_str, forms_col_str]:
+        df[col] = df[col].apply(
+            lambda x: [i["name"] for i in x] if isinstance(x, list) else []
+        )
+    df[actions_col_str] = df[actions_col_str].apply(
+        lambda x: [action_record(i) for i in x] if isinstance(x, list) else []
+    )
+    for col in named_blocks:
+        df[col] = df[col].apply(
+            lambda x: (
+                [{"name": i["name"], "desc": i.get("desc")} for i in x]
+                if isinstance(x, list)
+                else []
+            )
+        )
+
+    # The damage types a monster is vulnerable, resistant or immune to, strictly from its stat block
+    for col, stat_col in [
+        ("vulnerable_to", damage_vulnerabilities_col_str),
+        ("resistant_to", damage_resistances_col_str),
+        ("immune_to", damage_immunities_col_str),
+    ]:
+        df[col] = [damage_types_in(i, damage_type_names) for i in df[stat_col]]
+
+    # Apart from those, the damage types whose notes say they're strong or weak against the kind of creature
+    creature_words = [
+        tuple(_words(i) if isinstance(i, str) else () for i in (name, kind, sub))
+        for name, kind, sub in zip(
+            df[name_col_str], df[type_col_str], df[subtype_col_str]
+        )
+    ]
+
+    df["noted_strong_against"] = [
+        noted_damage_types(strong_against, i) for i in creature_words
+    ]
+    df["noted_weak_against"] = [
+        noted_damage_types(weak_against, i) for i in creature_words
+    ]
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.MONSTERS)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        [
+            "name",
+            "desc",
+            "size",
+            "type",
+            "subtype",
+            "alignment",
+            "armor_class",
+            "hit_points",
+            "hit_dice",
+            "hit_points_roll",
+            "strength",
+            "dexterity",
+            "constitution",
+            "intelligence",
+            "wisdom",
+            "charisma",
+            "proficiencies",
+            "damage_vulnerabilities",
+            "damage_resistances",
+            "damage_immunities",
+            "condition_immunities",
+            "languages",
+            "challenge_rating",
+            "proficiency_bonus",
+            "xp",
+            "special_abilities",
+            "actions",
+            "legendary_actions",
+            "reactions",
+            "forms",
+            "url",
+            "speed_walk",
+            "speed_swim",
+            "speed_fly",
+            "speed_burrow",
+            "speed_climb",
+            "speed_hover",
+            "darkvision",
+            "passive_perception",
+            "blindsight",
+            "truesight",
+            "tremorsense",
+            "vulnerable_to",
+            "resistant_to",
+            "immune_to",
+            "noted_strong_against",
+            "noted_weak_against",
+        ]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
@@ -1,14 +1,14 @@
 import pandas as pd
-import json
 
-from autodnd.utils.project_root import get_project_root
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load, load_json
+from autodnd.utils.reference_resolver import ReferenceIndex
 from autodnd.utils.ruleset_enum import RuleSet
-
-# folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 
 # column names from the original allignments json file
@@ -21,6 +21,9 @@ classes_col_name_key_str = "name"
 races_col_str = "races"
 races_col_name_key_str = "name"
 
+# Unnecessary columns, never loaded
+unused_cols = [index_col_str, reference_index_col_str]
+
 # String used to fill N/A values
 # This should be the same used in the EQUIPMENT dataset as well
 unknown_value_fill_string = "Unknown or Not Applicable"
@@ -30,9 +33,7 @@ if __name__ == "__main__":
 
     # load the EQUIPMENT_CATEGORIES data
     try:
-        eqc = pd.read_parquet(
-            save_folder / f"{RuleSet.EQUIPMENT_CATEGORIES.value}.parquet"
-        )
+        eqc = load(RuleSet.EQUIPMENT_CATEGORIES)
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The EQUIPMENT_CATEGORIES parquet file is missing. You need to run the process_{RuleSet.EQUIPMENT_CATEGORIES.value} script first to generate the dataset."
@@ -40,7 +41,7 @@ if __name__ == "__main__":
 
     # load the EQUIPMENT data
     try:
-        eq = pd.read_parquet(save_folder / f"{RuleSet.EQUIPMENT.value}.parquet")
+        eq = load(RuleSet.EQUIPMENT)
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The EQUIPMENT parquet file is missing. You need to run the process_{RuleSet.EQUIPMENT.value} script first to generate the dataset."
@@ -48,7 +49,7 @@ if __name__ == "__main__":
 
     # load the ABILITY_SCORES data
     try:
-        asc = pd.read_parquet(save_folder / f"{RuleSet.ABILITY_SCORES.value}.parquet")
+        asc = load(RuleSet.ABILITY_SCORES)
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The ABILITY_SCORES parquet file is missing. You need to run the process_{RuleSet.ABILITY_SCORES.value} script first to generate the dataset."
@@ -56,7 +57,7 @@ if __name__ == "__main__":
 
     # load the ABILITY_SCORES data
     try:
-        sk = pd.read_parquet(save_folder / f"{RuleSet.SKILLS.value}.parquet")
+        sk = load(RuleSet.SKILLS)
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The SKILLS parquet file is missing. You need to run the process_{RuleSet.SKILLS.value} script first to generate the dataset."
@@ -67,31 +68,27 @@ if __name__ == "__main__":
     # filename string
     ruleset = RuleSet.PROFICIENCIES.value
 
-    # Load the JSON file
-    json_rule_path = data_folder / f"{ruleset}.json"
-    with open(json_rule_path, "r") as file:
-        data = json.load(file)
-
-    # Normalize the JSON data to flatten it
-    df = pd.json_normalize(data, sep="_")
-
-    # Check if the JSON data has the expected schema
-    assert set(df.columns.to_list()) == set(
-        [
-            "index",
-            "type",
-            "name",
-            "classes",
-            "races",
-            "url",
-            "reference_index",
-            "reference_name",
-            "reference_url",
-        ]
-    ), "Unexpected data organization, schema has probably changed"
-
-    # Dropping unnecessary columns
-    df = df.drop([index_col_str, reference_index_col_str], axis=1)
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "type",
+        "name",
+        "classes",
+        "races",
+        "url",
+        "reference_index",
+        "reference_name",
+        "reference_url",
+    ]
+    df = load_json(
+        RuleSet.PROFICIENCIES,
+        [i for i in json_cols if i not in unused_cols],
+        expected_columns=json_cols,
+    )
 
     # Creating a new column with the reference type, extracte from the reference url
     df = df.assign(
@@ -100,50 +97,50 @@ if __name__ == "__main__":
 
     # The references are spread between 4 other datasets. Extracting the necessary reference data and
     # adding it to this table in a new 'reference' column so that this table becomes self-contained
-    reference_list = []
-
-    for i in df[reference_url_col_str]:
-        category = i.split("/")[3]
-        if category == "equipment":
-            eq_ref = (
-                eq[eq["url"] == i]
-                .iloc[0]
-                .replace(unknown_value_fill_string, None)
-                .dropna()
-                .drop("index")
-                .to_dict()
-            )
-            reference_list.append(eq_ref)
-        elif category == "equipment-categories":
-            eqc_ref = eqc[eqc["url"] == i].iloc[0]["equipment_category"]
-            reference_list.append(eqc_ref)
-        elif category == "ability-scores":
-            asc_ref = asc[asc["url"] == i].iloc[0]["desc"]
-            reference_list.append(asc_ref)
-        elif category == "skills":
-            sk_ref = sk[sk["url"] == i].iloc[0]["desc"]
-            reference_list.append(sk_ref)
-        else:
-            reference_list.append("")
-
-    df["reference"] = reference_list
+    reference = pd.Series("", index=df.index, dtype=object)
+
+    # The equipment references are whole records so they're looked up one by one
+    eq_by_url = ReferenceIndex(eq, "url")
+    is_equipment = df.reference_type == "equipment"
+    reference[is_equipment] = [
+        eq_by_url.record(i)
+        .replace(unknown_value_fill_string, None)
+        .dropna()
+        .drop("index")
+        .to_dict()
+        for i in df.loc[is_equipment, reference_url_col_str]
+    ]
+
+    # The rest are a single column of the referenced table, resolved in one batch per table. Like the equipment
+    # lookups above, a reference missing from its table is an error rather than a NaN
+    for category, ref_df, ref_col in [
+        ("equipment-categories", eqc, "equipment_category"),
+        ("ability-scores", asc, "desc"),
+        ("skills", sk, "desc"),
+    ]:
+        is_category = df.reference_type == category
+        urls = df.loc[is_category, reference_url_col_str]
+        positions = ReferenceIndex(ref_df, "url").positions(urls)
+        assert (positions >= 0).all(), (
+            f"References missing from the {category} table: {urls[positions < 0].to_list()}"
+        )
+        reference[is_category] = ref_df[ref_col].to_numpy(dtype=object)[positions]
+
+    # The text references are packaged like the equipment records so the column holds a single struct type
+    df["reference"] = [
+        ref if isinstance(ref, dict) else {"name": name, "properties": ref}
+        for ref, name in zip(reference, df["name"])
+    ]
 
     # Extracting only the necessary information from the races and classes columns (which is just the name)
-    df[classes_col_str] = df[classes_col_str].apply(
-        lambda x: [i[classes_col_name_key_str] for i in x]
-    )
-    df[races_col_str] = df[races_col_str].apply(
-        lambda x: [i[races_col_name_key_str] for i in x]
+    df[classes_col_str] = backend.list_field(
+        df[classes_col_str], classes_col_name_key_str
     )
+    df[races_col_str] = backend.list_field(df[races_col_str], races_col_name_key_str)
 
     # Exploding the races and classes columns, droping more unecessary columns and filling in NaNs
-    df = (
-        df.drop(reference_url_col_str, axis=1)
-        .explode(classes_col_str)
-        .explode(races_col_str)
-        .fillna(unknown_value_fill_string)
-        .reset_index(drop=True)
-        .astype(str)
+    df = backend.explode(
+        df.drop(reference_url_col_str, axis=1), [classes_col_str, races_col_str]
     )
 
     # Check if the output data has the expected schema before saving
@@ -160,6 +157,9 @@ if __name__ == "__main__":
         ]
     ), "Unexpected column names, schema has probably changed"
 
+    # Cast to the typed schema
+    df = apply_schema(df, RuleSet.PROFICIENCIES, unknown_value_fill_string)
+
     # Save the table as a parquet file
     save_folder.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(save_folder / f"{ruleset}.parquet")
+    df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
@@ -0,0 +1,151 @@
+from typing import Any
+
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original races json file
+index_col_str = "index"
+ability_bonuses_col_str = "ability_bonuses"
+ability_bonus_options_col_str = "ability_bonus_options"
+starting_proficiencies_col_str = "starting_proficiencies"
+starting_proficiency_options_col_str = "starting_proficiency_options"
+languages_col_str = "languages"
+language_options_col_str = "language_options"
+traits_col_str = "traits"
+subraces_col_str = "subraces"
+
+# Unnecessary columns, never loaded. The prose is covered by the traits
+unused_cols = [
+    index_col_str,
+    "alignment",
+    "age",
+    "size_description",
+    "language_desc",
+]
+
+# The choices a race offers (extra ability bonuses, proficiencies, languages) are only there for some races
+# and hold different kinds of options, so they're loaded whole and not checked against the schema
+variable_prefixes = [
+    ability_bonus_options_col_str,
+    starting_proficiency_options_col_str,
+    language_options_col_str,
+]
+
+
+def ability_bonuses(bonuses: Any) -> list[dict[str, Any]]:
+    """Turn a list of ability bonuses into ability_score/bonus records."""
+    if not isinstance(bonuses, list):
+        return []
+    return [
+        {"ability_score": i["ability_score"]["name"], "bonus": i["bonus"]}
+        for i in bonuses
+    ]
+
+
+def options(choice: Any) -> list[Any]:
+    """The options of a choice, empty if there is no choice."""
+    if not isinstance(choice, dict):
+        return []
+    return choice.get("from", {}).get("options", [])
+
+
+def choose(choice: Any) -> int:
+    """How many options of a choice are picked, 0 if there is no choice."""
+    return choice.get("choose", 0) if isinstance(choice, dict) else 0
+
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.RACES.value
+
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "speed",
+        "ability_bonuses",
+        "alignment",
+        "age",
+        "size",
+        "size_description",
+        "starting_proficiencies",
+        "languages",
+        "language_desc",
+        "traits",
+        "subraces",
+        "url",
+    ]
+    df = load_json(
+        RuleSet.RACES,
+        [i for i in json_cols if i not in unused_cols] + variable_prefixes,
+        expected_columns=json_cols,
+        variable_prefixes=variable_prefixes,
+    )
+
+    # The ability bonuses of the race and the ones a character picks from
+    df[ability_bonuses_col_str] = df[ability_bonuses_col_str].apply(ability_bonuses)
+    df["ability_bonus_choose"] = df[ability_bonus_options_col_str].apply(choose)
+    df[ability_bonus_options_col_str] = df[ability_bonus_options_col_str].apply(
+        lambda x: ability_bonuses(options(x))
+    )
+
+    # Only the names of the proficiencies, languages, traits and subraces, and of the ones to choose from
+    for col in [
+        starting_proficiencies_col_str,
+        languages_col_str,
+        traits_col_str,
+        subraces_col_str,
+    ]:
+        df[col] = backend.list_field(df[col], "name")
+    for col, choose_col in [
+        (starting_proficiency_options_col_str, "proficiency_choose"),
+        (language_options_col_str, "language_choose"),
+    ]:
+        df[choose_col] = df[col].apply(choose)
+        df[col] = df[col].apply(lambda x: [i["item"]["name"] for i in options(x)])
+
+    df = df.rename(
+        columns={
+            starting_proficiencies_col_str: "proficiencies",
+            starting_proficiency_options_col_str: "proficiency_options",
+        }
+    )
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.RACES)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        [
+            "name",
+            "speed",
+            "size",
+            "ability_bonuses",
+            "ability_bonus_choose",
+            "ability_bonus_options",
+            "proficiencies",
+            "proficiency_choose",
+            "proficiency_options",
+            "languages",
+            "language_choose",
+            "language_options",
+            "traits",
+            "subraces",
+            "url",
+        ]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
@@ -1,14 +1,14 @@
 import pandas as pd
 import json
 
-from autodnd.utils.project_root import get_project_root
 from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import processed_folder, source_folder
 
 # folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+data_folder = source_folder()
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 # column names from the original allignments json file
 index_col_str = "index"
@@ -1,14 +1,15 @@
 import pandas as pd
 import json
 
-from autodnd.utils.project_root import get_project_root
+from autodnd.utils.dataset_cache import load
 from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import processed_folder, source_folder
 
 # folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+data_folder = source_folder()
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 
 # column names from the original allignments json file
@@ -23,15 +24,14 @@ rule_sections_name_col_str = "name"
 if __name__ == "__main__":
     # load the damage_type data
     try:
-        rulesections_df = pd.read_parquet(
-            save_folder / f"{RuleSet.RULE_SECTIONS.value}.parquet"
-        )[
+        rulesections_df = load(
+            RuleSet.RULE_SECTIONS,
             [
                 rule_sections_name_col_str,
                 rule_sections_url_col_str,
                 rule_sections_as_instruction_col_str,
-            ]
-        ].rename(columns={rule_sections_name_col_str: "rule_section_name"})
+            ],
+        ).rename(columns={rule_sections_name_col_str: "rule_section_name"})
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The rule sections parquet file is missing. You need to run the process_{RuleSet.RULE_SECTIONS.value} script first to generate the dataset."
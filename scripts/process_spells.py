@@ -0,0 +1,156 @@
+from typing import Any, Optional
+
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original spells json file
+index_col_str = "index"
+desc_col_str = "desc"
+higher_level_col_str = "higher_level"
+classes_col_str = "classes"
+subclasses_col_str = "subclasses"
+damage_at_slot_level_col_str = "damage_damage_at_slot_level"
+damage_at_character_level_col_str = "damage_damage_at_character_level"
+heal_at_slot_level_col_str = "heal_at_slot_level"
+
+# Unnecessary columns, never loaded
+unused_cols = [
+    index_col_str,
+    "school_index",
+    "school_url",
+    "damage_damage_type_index",
+    "damage_damage_type_url",
+    "dc_dc_type_index",
+    "dc_dc_type_url",
+]
+
+# The damage and healing maps are keyed by level and their keys vary from spell to spell, so they're loaded
+# whole instead of as one flattened column per level, and not checked against the schema
+level_maps = [
+    damage_at_slot_level_col_str,
+    damage_at_character_level_col_str,
+    heal_at_slot_level_col_str,
+]
+
+# Renaming the flattened columns of the nested references
+renamed_cols = {
+    "damage_damage_type_name": "damage_type_name",
+    damage_at_slot_level_col_str: "damage_at_slot_level",
+    damage_at_character_level_col_str: "damage_at_character_level",
+    "dc_dc_type_name": "dc_type_name",
+    "dc_dc_success": "dc_success",
+}
+
+
+def level_list(level_map: Any) -> Optional[list[dict[str, Any]]]:
+    """Turn a {"3": "8d6", "4": "9d6"} map into a list of level/dice records sorted by level."""
+    if not isinstance(level_map, dict):
+        return None
+    return [{"level": int(i), "dice": level_map[i]} for i in sorted(level_map, key=int)]
+
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.SPELLS.value
+
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "desc",
+        "higher_level",
+        "range",
+        "components",
+        "material",
+        "ritual",
+        "duration",
+        "concentration",
+        "casting_time",
+        "level",
+        "attack_type",
+        "school_index",
+        "school_name",
+        "school_url",
+        "classes",
+        "subclasses",
+        "url",
+        "damage_damage_type_index",
+        "damage_damage_type_name",
+        "damage_damage_type_url",
+        "dc_dc_type_index",
+        "dc_dc_type_name",
+        "dc_dc_type_url",
+        "dc_dc_success",
+        "dc_desc",
+        "area_of_effect_type",
+        "area_of_effect_size",
+    ]
+    df = load_json(
+        RuleSet.SPELLS,
+        [i for i in json_cols if i not in unused_cols] + level_maps,
+        expected_columns=json_cols,
+        variable_prefixes=level_maps,
+    )
+
+    # Concatenating the description paragraphs
+    for col in [desc_col_str, higher_level_col_str]:
+        df[col] = df[col].apply(lambda x: "\n".join(x) if isinstance(x, list) else x)
+
+    # Only the names of the classes and subclasses that have the spell
+    for col in [classes_col_str, subclasses_col_str]:
+        df[col] = backend.list_field(df[col], "name")
+
+    # Damage and healing by level as native lists of records
+    for col in level_maps:
+        df[col] = df[col].apply(level_list)
+
+    df = df.rename(columns=renamed_cols)
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.SPELLS)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        [
+            "name",
+            "desc",
+            "higher_level",
+            "range",
+            "components",
+            "material",
+            "ritual",
+            "duration",
+            "concentration",
+            "casting_time",
+            "level",
+            "attack_type",
+            "school_name",
+            "classes",
+            "subclasses",
+            "url",
+            "damage_type_name",
+            "damage_at_slot_level",
+            "damage_at_character_level",
+            "heal_at_slot_level",
+            "dc_type_name",
+            "dc_success",
+            "dc_desc",
+            "area_of_effect_type",
+            "area_of_effect_size",
+        ]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
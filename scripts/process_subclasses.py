@@ -1,15 +1,12 @@
-import pandas as pd
-import json
 from typing import Any
 
-from autodnd.utils.project_root import get_project_root
+from autodnd.utils.dataset_cache import load_json
 from autodnd.utils.ruleset_enum import RuleSet
-
-# folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 
 # column names from the original allignments json file
@@ -20,15 +17,20 @@ class_url_col_str = "class_url"
 desc_col_str = "desc"
 spells_col_str = "spells"
 
+# Unnecessary columns, never loaded
+unused_cols = [url_col_str, index_col_str, class_index_col_str, class_url_col_str]
 
-# String used to fill NaN values
-unknown_value_fill_string = "Unknown or Not Applicable"
 
+def spell_prereq_mapping(prereq_dict: dict[str, Any]) -> dict[str, Any]:
+    """Mapping function to map complex spell preq format to a simple one.
 
-def spell_prereq_mapping(prereq_dict: dict[str, Any]) -> dict[str, str]:
-    """Mapping function to map complex spell preq format to a simple one."""
+    The prerequisites are kept both as a sentence and as the class level and the names of the features the
+    spell needs, for the prerequisite graph (see autodnd.prerequisites).
+    """
 
     prereq_string = ""
+    level = None
+    features = []
     assert set(prereq_dict.keys()) == set(["prerequisites", "spell"]), (
         "Spell prerequisites dictionary requires a prerequisite information and a spell "
     )
@@ -39,10 +41,12 @@ def spell_prereq_mapping(prereq_dict: dict[str, Any]) -> dict[str, str]:
             )
             class_name = i["url"].split("classes/")[1].split("/")[0]
             prereq_string += f" This spell requires a minimum of {class_name} level {i['url'].split('levels/')[-1]}."
+            level = int(i["url"].split("levels/")[-1])
         elif i["type"] == "feature":
             prereq_string += (
                 f" This spell requires also the following feature: {i['name']}"
             )
+            features.append(i["name"])
         else:
             raise ValueError(f"Expected feature or level prereq, found {i['type']}")
 
@@ -50,6 +54,8 @@ def spell_prereq_mapping(prereq_dict: dict[str, Any]) -> dict[str, str]:
         "name": prereq_dict["spell"]["name"],
         "prerequisites": prereq_string,
         "url": prereq_dict["spell"]["url"],
+        "level": level,
+        "features": features,
     }
 
 
@@ -58,33 +64,24 @@ if __name__ == "__main__":
     # filename string
     ruleset = RuleSet.SUBCLASSES.value
 
-    # Load the JSON file
-    json_rule_path = data_folder / f"{ruleset}.json"
-    with open(json_rule_path, "r") as file:
-        data = json.load(file)
-
-    # Normalize the JSON data to flatten it
-    df = pd.json_normalize(data, sep="_")
-
-    # Check if the JSON data has the expected schema
-    assert set(df.columns.to_list()) == set(
-        [
-            "index",
-            "name",
-            "subclass_flavor",
-            "desc",
-            "subclass_levels",
-            "url",
-            "class_index",
-            "class_name",
-            "class_url",
-            "spells",
-        ]
-    ), "Unexpected data organization, schema has probably changed"
-
-    # Dropping unnecessary columns
-    df = df.drop(
-        [url_col_str, index_col_str, class_index_col_str, class_url_col_str], axis=1
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "subclass_flavor",
+        "desc",
+        "subclass_levels",
+        "url",
+        "class_index",
+        "class_name",
+        "class_url",
+        "spells",
+    ]
+    df = load_json(
+        RuleSet.SUBCLASSES,
+        [i for i in json_cols if i not in unused_cols],
+        expected_columns=json_cols,
     )
 
     # Concanetating the strings in the description field
@@ -94,7 +91,8 @@ if __name__ == "__main__":
         lambda x: [spell_prereq_mapping(i) for i in x] if isinstance(x, list) else x
     )
 
-    output_df = df.fillna(unknown_value_fill_string).astype(str)
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.SUBCLASSES)
 
     # Check if the output data has the expected schema before saving
     assert set(output_df.columns.to_list()) == set(
@@ -103,4 +101,4 @@ if __name__ == "__main__":
 
     # Save the table as a parquet file
     save_folder.mkdir(parents=True, exist_ok=True)
-    output_df.to_parquet(save_folder / f"{ruleset}.parquet")
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
@@ -0,0 +1,118 @@
+from typing import Any
+
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load_json
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
+
+# folder to save the content
+save_folder = processed_folder()
+
+
+# column names from the original subraces json file
+index_col_str = "index"
+ability_bonuses_col_str = "ability_bonuses"
+starting_proficiencies_col_str = "starting_proficiencies"
+languages_col_str = "languages"
+language_options_col_str = "language_options"
+racial_traits_col_str = "racial_traits"
+
+# Unnecessary columns, never loaded
+unused_cols = [index_col_str, "race_index", "race_url"]
+
+# Only some subraces offer a choice of languages, so it's loaded whole and not checked against the schema
+variable_prefixes = [language_options_col_str]
+
+# Renaming the columns to match the races table
+renamed_cols = {
+    starting_proficiencies_col_str: "proficiencies",
+    racial_traits_col_str: "traits",
+}
+
+
+def ability_bonuses(bonuses: Any) -> list[dict[str, Any]]:
+    """Turn a list of ability bonuses into ability_score/bonus records."""
+    if not isinstance(bonuses, list):
+        return []
+    return [
+        {"ability_score": i["ability_score"]["name"], "bonus": i["bonus"]}
+        for i in bonuses
+    ]
+
+
+if __name__ == "__main__":
+    # filename string
+    ruleset = RuleSet.SUBRACES.value
+
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
+
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "name",
+        "race_index",
+        "race_name",
+        "race_url",
+        "desc",
+        "ability_bonuses",
+        "starting_proficiencies",
+        "languages",
+        "racial_traits",
+        "url",
+    ]
+    df = load_json(
+        RuleSet.SUBRACES,
+        [i for i in json_cols if i not in unused_cols] + variable_prefixes,
+        expected_columns=json_cols,
+        variable_prefixes=variable_prefixes,
+    )
+
+    df[ability_bonuses_col_str] = df[ability_bonuses_col_str].apply(ability_bonuses)
+
+    # Only the names of the proficiencies, languages and traits
+    for col in [
+        starting_proficiencies_col_str,
+        languages_col_str,
+        racial_traits_col_str,
+    ]:
+        df[col] = backend.list_field(df[col], "name")
+
+    # The number of extra languages a character picks and the ones to choose from
+    df["language_choose"] = df[language_options_col_str].apply(
+        lambda x: x.get("choose", 0) if isinstance(x, dict) else 0
+    )
+    df[language_options_col_str] = df[language_options_col_str].apply(
+        lambda x: (
+            [i["item"]["name"] for i in x["from"]["options"]]
+            if isinstance(x, dict)
+            else []
+        )
+    )
+
+    df = df.rename(columns=renamed_cols)
+
+    # Cast to the typed schema, missing values are stored as nulls
+    output_df = apply_schema(df, RuleSet.SUBRACES)
+
+    # Check if the output data has the expected schema before saving
+    assert set(output_df.columns.to_list()) == set(
+        [
+            "name",
+            "race_name",
+            "desc",
+            "ability_bonuses",
+            "proficiencies",
+            "languages",
+            "language_choose",
+            "language_options",
+            "traits",
+            "url",
+        ]
+    ), "Unexpected column names, schema has probably changed"
+
+    # Save the table as a parquet file
+    save_folder.mkdir(parents=True, exist_ok=True)
+    output_df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow")
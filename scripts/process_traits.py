@@ -1,17 +1,18 @@
-import pandas as pd
-import json
-import ast
 import math
 from typing import Any, NamedTuple
 
-from autodnd.utils.project_root import get_project_root
-from autodnd.utils.ruleset_enum import RuleSet
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-# folder where you want the jsons to reside
-data_folder = get_project_root() / "data" / "jsonrules"
+from autodnd.utils.backend import get_backend
+from autodnd.utils.dataset_cache import load, load_json, table_paths
+from autodnd.utils.reference_resolver import ReferenceIndex
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.schemas import apply_schema
+from autodnd.utils.sources import processed_folder
 
 # folder to save the content
-save_folder = get_project_root() / "data" / "processed"
+save_folder = processed_folder()
 
 
 # column names from the original allignments json file
@@ -37,38 +38,44 @@ draconic_specific_trait_cols = [
 ]
 
 proficiency_choices_choose_col_str = "proficiency_choices_choose"
-unnecessary_cols = [
-    "proficiency_choices_choose",
+
+# Unnecessary columns, never loaded
+unused_cols = [
     "proficiency_choices_type",
     "proficiency_choices_from_option_set_type",
-    "proficiency_choices_from_options",
-    "trait_specific_spell_options_choose",
     "trait_specific_spell_options_from_option_set_type",
-    "trait_specific_spell_options_from_options",
     "trait_specific_spell_options_type",
-    "language_options_choose",
     "language_options_type",
     "language_options_from_option_set_type",
-    "language_options_from_options",
-    "trait_specific_subtrait_options_choose",
     "trait_specific_subtrait_options_from_option_set_type",
-    "trait_specific_subtrait_options_from_options",
     "trait_specific_subtrait_options_type",
-    "parent_index",
     "parent_name",
     "parent_url",
     "trait_specific_damage_type_index",
-    "trait_specific_damage_type_name",
     "trait_specific_damage_type_url",
+    "trait_specific_breath_weapon_dc_dc_type_index",
+    "trait_specific_breath_weapon_dc_dc_type_url",
+]
+
+# Columns that are dropped once they've been packaged into the additional_choices column
+unnecessary_cols = [
+    "proficiency_choices_choose",
+    "proficiency_choices_from_options",
+    "trait_specific_spell_options_choose",
+    "trait_specific_spell_options_from_options",
+    "language_options_choose",
+    "language_options_from_options",
+    "trait_specific_subtrait_options_choose",
+    "trait_specific_subtrait_options_from_options",
+    "parent_index",
+    "trait_specific_damage_type_name",
     "trait_specific_breath_weapon_name",
     "trait_specific_breath_weapon_desc",
     "trait_specific_breath_weapon_area_of_effect_size",
     "trait_specific_breath_weapon_area_of_effect_type",
     "trait_specific_breath_weapon_usage_type",
     "trait_specific_breath_weapon_usage_times",
-    "trait_specific_breath_weapon_dc_dc_type_index",
     "trait_specific_breath_weapon_dc_dc_type_name",
-    "trait_specific_breath_weapon_dc_dc_type_url",
     "trait_specific_breath_weapon_dc_success_type",
     "trait_specific_breath_weapon_damage",
 ]
@@ -90,36 +97,22 @@ class DfIterTupleNames(NamedTuple):
     proficiencies: str
     url: str
     proficiency_choices_choose: float
-    proficiency_choices_type: str
-    proficiency_choices_from_option_set_type: str
     proficiency_choices_from_options: dict[Any, Any]
     trait_specific_spell_options_choose: float
-    trait_specific_spell_options_from_option_set_type: str
     trait_specific_spell_options_from_options: dict[Any, Any]
-    trait_specific_spell_options_type: str
     language_options_choose: float
-    language_options_type: str
-    language_options_from_option_set_type: str
     language_options_from_options: dict[Any, Any]
     trait_specific_subtrait_options_choose: float
-    trait_specific_subtrait_options_from_option_set_type: str
     trait_specific_subtrait_options_from_options: dict[Any, Any]
-    trait_specific_subtrait_options_type: str
     parent_index: str
-    parent_name: str
-    parent_url: str
-    trait_specific_damage_type_index: str
     trait_specific_damage_type_name: str
-    trait_specific_damage_type_url: str
     trait_specific_breath_weapon_name: str
     trait_specific_breath_weapon_desc: str
     trait_specific_breath_weapon_area_of_effect_size: float
     trait_specific_breath_weapon_area_of_effect_type: str
     trait_specific_breath_weapon_usage_type: str
     trait_specific_breath_weapon_usage_times: float
-    trait_specific_breath_weapon_dc_dc_type_index: str
     trait_specific_breath_weapon_dc_dc_type_name: str
-    trait_specific_breath_weapon_dc_dc_type_url: str
     trait_specific_breath_weapon_dc_success_type: str
     trait_specific_breath_weapon_damage: str
 
@@ -127,83 +120,84 @@ class DfIterTupleNames(NamedTuple):
 if __name__ == "__main__":
     # load the PROFICIENCIES data
     try:
-        prof_df = pd.read_parquet(
-            save_folder / f"{RuleSet.PROFICIENCIES.value}.parquet"
-        )
+        prof_df = load(RuleSet.PROFICIENCIES)
     except FileNotFoundError:
         raise FileNotFoundError(
             f"The PROFICIENCIES parquet file is missing. You need to run the process_{RuleSet.PROFICIENCIES.value} script first to generate the dataset."
         )
 
     # ---- Defining a helper function to join data from the proficiencies dataset --- #
-    def get_proficiency_reference(prof_url: str) -> dict[str, str]:
-        """Simple function to map profieciency url to the reference details."""
-        ref_value = prof_df[prof_df.url == prof_url].reference.values[0]
-        # Checking if the reference is a dictionary
-        try:
-            return ast.literal_eval(ref_value)
-        except SyntaxError:
-            # If the reference isn't a dictionary, then it's a string. Turn it into a dict before sending it.
-            ref_name = prof_df[prof_df.url == prof_url].name.values[0]
-            return {"name": ref_name, "properties": ref_value}
+    prof_by_url = ReferenceIndex(prof_df, "url")
+
+    def get_proficiency_reference(prof_url: str) -> dict[str, Any]:
+        """Simple function to map profieciency url to the reference details.
+
+        The reference struct is the one of the Proficiencies table, with the fields of every kind of reference.
+        The fields this reference doesn't have are null.
+        """
+        record = prof_by_url.record(prof_url)
+        return {
+            "name": record["name"],
+            "reference_name": record["reference_name"],
+            "reference_type": record["reference_type"],
+            "reference": record["reference"],
+        }
 
     # filename string
     ruleset = RuleSet.TRAITS.value
 
-    # Load the JSON file
-    json_rule_path = data_folder / f"{ruleset}.json"
-    with open(json_rule_path, "r") as file:
-        data = json.load(file)
-
-    # Normalize the JSON data to flatten it
-    df = pd.json_normalize(data, sep="_")
-
-    # Check if the JSON data has the expected schema
-    assert set(df.columns.to_list()) == set(
-        [
-            "index",
-            "races",
-            "subraces",
-            "name",
-            "desc",
-            "proficiencies",
-            "url",
-            "proficiency_choices_choose",
-            "proficiency_choices_type",
-            "proficiency_choices_from_option_set_type",
-            "proficiency_choices_from_options",
-            "trait_specific_spell_options_choose",
-            "trait_specific_spell_options_from_option_set_type",
-            "trait_specific_spell_options_from_options",
-            "trait_specific_spell_options_type",
-            "language_options_choose",
-            "language_options_type",
-            "language_options_from_option_set_type",
-            "language_options_from_options",
-            "trait_specific_subtrait_options_choose",
-            "trait_specific_subtrait_options_from_option_set_type",
-            "trait_specific_subtrait_options_from_options",
-            "trait_specific_subtrait_options_type",
-            "parent_index",
-            "parent_name",
-            "parent_url",
-            "trait_specific_damage_type_index",
-            "trait_specific_damage_type_name",
-            "trait_specific_damage_type_url",
-            "trait_specific_breath_weapon_name",
-            "trait_specific_breath_weapon_desc",
-            "trait_specific_breath_weapon_area_of_effect_size",
-            "trait_specific_breath_weapon_area_of_effect_type",
-            "trait_specific_breath_weapon_usage_type",
-            "trait_specific_breath_weapon_usage_times",
-            "trait_specific_breath_weapon_dc_dc_type_index",
-            "trait_specific_breath_weapon_dc_dc_type_name",
-            "trait_specific_breath_weapon_dc_dc_type_url",
-            "trait_specific_breath_weapon_dc_success_type",
-            "trait_specific_breath_weapon_damage",
-        ]
-    ), "Unexpected data organization, schema has probably changed"
+    # Engine the list columns are processed with, see autodnd.utils.backend
+    backend = get_backend()
 
+    # Stream in the JSON file without the columns that would be dropped straight away, checking the JSON
+    # data has the expected schema on the way. Loads are shared with other stages running in this process
+    json_cols = [
+        "index",
+        "races",
+        "subraces",
+        "name",
+        "desc",
+        "proficiencies",
+        "url",
+        "proficiency_choices_choose",
+        "proficiency_choices_type",
+        "proficiency_choices_from_option_set_type",
+        "proficiency_choices_from_options",
+        "trait_specific_spell_options_choose",
+        "trait_specific_spell_options_from_option_set_type",
+        "trait_specific_spell_options_from_options",
+        "trait_specific_spell_options_type",
+        "language_options_choose",
+        "language_options_type",
+        "language_options_from_option_set_type",
+        "language_options_from_options",
+        "trait_specific_subtrait_options_choose",
+        "trait_specific_subtrait_options_from_option_set_type",
+        "trait_specific_subtrait_options_from_options",
+        "trait_specific_subtrait_options_type",
+        "parent_index",
+        "parent_name",
+        "parent_url",
+        "trait_specific_damage_type_index",
+        "trait_specific_damage_type_name",
+        "trait_specific_damage_type_url",
+        "trait_specific_breath_weapon_name",
+        "trait_specific_breath_weapon_desc",
+        "trait_specific_breath_weapon_area_of_effect_size",
+        "trait_specific_breath_weapon_area_of_effect_type",
+        "trait_specific_breath_weapon_usage_type",
+        "trait_specific_breath_weapon_usage_times",
+        "trait_specific_breath_weapon_dc_dc_type_index",
+        "trait_specific_breath_weapon_dc_dc_type_name",
+        "trait_specific_breath_weapon_dc_dc_type_url",
+        "trait_specific_breath_weapon_dc_success_type",
+        "trait_specific_breath_weapon_damage",
+    ]
+    df = load_json(
+        RuleSet.TRAITS,
+        [i for i in json_cols if i not in unused_cols],
+        expected_columns=json_cols,
+    )
     # Preprocessing these following columns, converting lists into a single string
     df[subraces_col_str] = df[subraces_col_str].apply(
         lambda x: ", ".join([i[subrances_col_name_key_str] for i in x])
@@ -211,9 +205,10 @@ if __name__ == "__main__":
     df[races_col_str] = df[races_col_str].apply(
         lambda x: ", ".join([i[races_col_str_name_key_str] for i in x])
     )
-    df[desc_col_str] = df[desc_col_str].apply(lambda x: " ".join(x))
+    df[desc_col_str] = backend.join_text(df[desc_col_str], " ")
 
-    # Joining the proficiencies with the proficiency table so this dataset is self-contained
+    # Joining the proficiencies with the proficiency table so this dataset is self-contained, as a native list
+    # of structs
     df[proficiencies_col_str] = df[proficiencies_col_str].apply(
         lambda x: [get_proficiency_reference(i["url"]) for i in x]
     )
@@ -295,7 +290,7 @@ if __name__ == "__main__":
     df["additional_choices"] = additional_choices_vec
 
     # ---- drop all these unnecessary columns ---- #
-    df = df.drop([index_col_str] + unnecessary_cols, axis=1).astype(str)
+    df = df.drop([index_col_str] + unnecessary_cols, axis=1)
 
     # Check if the output data has the expected schema before saving
     assert set(df.columns.to_list()) == set(
@@ -310,6 +305,38 @@ if __name__ == "__main__":
         ]
     ), "Unexpected column names, schema has probably changed"
 
+    # Cast to the typed schema
+    df = apply_schema(df, RuleSet.TRAITS)
+
+    # The reference structs come back from the Proficiencies parquet with their ints as floats and the fields
+    # null in every row untyped, they're written with the struct type of the Proficiencies table (across the
+    # layers of the source) instead of the one pyarrow would infer
+    reference_type = (
+        pa.unify_schemas(
+            [pq.read_schema(i) for i in table_paths(RuleSet.PROFICIENCIES)],
+            promote_options="permissive",
+        )
+        .field("reference")
+        .type
+    )
+    schema = pa.Schema.from_pandas(df)
+    schema = schema.set(
+        schema.get_field_index(proficiencies_col_str),
+        pa.field(
+            proficiencies_col_str,
+            pa.list_(
+                pa.struct(
+                    [
+                        ("name", pa.string()),
+                        ("reference_name", pa.string()),
+                        ("reference_type", pa.string()),
+                        ("reference", reference_type),
+                    ]
+                )
+            ),
+        ),
+    )
+
     # Save the table as a parquet file
     save_folder.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(save_folder / f"{ruleset}.parquet")
+    df.to_parquet(save_folder / f"{ruleset}.parquet", engine="pyarrow", schema=schema)
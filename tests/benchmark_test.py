@@ -0,0 +1,107 @@
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+import pyarrow as pa
+import pytest
+
+from autodnd import benchmark
+from autodnd.pipeline import Stage
+from autodnd.utils.ruleset_enum import RuleSet
+
+
+def test_scale_records_makes_unique_copies() -> None:
+    records = [
+        {"index": "stealth", "name": "Stealth", "ability_score": {"index": "dex"}},
+        "not a record",
+    ]
+    scaled = benchmark.scale_records(records, 3)
+    assert len(scaled) == 6
+    assert scaled[:2] == records
+    assert scaled[2] == {
+        "index": "stealth (1)",
+        "name": "Stealth (1)",
+        "ability_score": {"index": "dex"},
+    }
+    assert scaled[4]["name"] == "Stealth (2)"
+    assert scaled[5] == "not a record"
+
+
+def test_make_root_scales_the_fixtures(tmp_path: Path) -> None:
+    counts = benchmark.make_root(tmp_path, 4, [RuleSet.SKILLS, RuleSet.DAMAGE_TYPES])
+    skills = json.loads(
+        (benchmark.fixture_folder / f"{RuleSet.SKILLS.value}.json").read_text()
+    )
+    damage_types = json.loads(
+        (benchmark.fixture_folder / f"{RuleSet.DAMAGE_TYPES.value}.json").read_text()
+    )
+    # Damage types are a closed set, never scaled
+    assert counts == {
+        RuleSet.SKILLS: 4 * len(skills),
+        RuleSet.DAMAGE_TYPES: len(damage_types),
+    }
+    written = json.loads(
+        (tmp_path / "data" / "jsonrules" / f"{RuleSet.SKILLS.value}.json").read_text()
+    )
+    assert len(written) == counts[RuleSet.SKILLS]
+    assert (tmp_path / "scripts" / "process_skills.py").exists()
+
+
+def test_benchmark_runs_the_stages_on_the_fixtures() -> None:
+    results = benchmark.benchmark(scales=[2], targets=[RuleSet.SKILLS])
+    # Skills needs the Ability-Scores stage, which runs first
+    assert [(i["stage"], i["scale"]) for i in results] == [
+        ("Ability-Scores", 2),
+        ("Skills", 2),
+    ]
+    assert not [i for i in results if "error" in i]
+    assert results[1]["output_rows"] == results[1]["input_rows"]
+    assert all(i["seconds"] > 0 for i in results)
+
+
+def test_backends_give_identical_outputs_on_the_fixtures() -> None:
+    results = benchmark.backend_benchmark(scales=[1], targets=[RuleSet.FEATS])
+    assert {i["backend"] for i in results} == {"pandas", "arrow"}
+    assert all(i["identical"] for i in results)
+
+
+def test_backend_benchmark_records_failed_stages(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def run_stage(
+        root: Path, stage: Stage, backend: Optional[str] = None
+    ) -> dict[str, Any]:
+        if stage.output == RuleSet.SKILLS and backend == "arrow":
+            raise RuntimeError(f"Stage {stage.name} failed")
+        return {"seconds": 0.1, "peak_rss_mib": 100.0}
+
+    monkeypatch.setattr(benchmark, "run_stage", run_stage)
+    monkeypatch.setattr(
+        benchmark.pq, "read_table", lambda path: pa.table({"file": [path.name]})
+    )
+    results = benchmark.backend_benchmark(scales=[1], targets=[RuleSet.TRAITS])
+    stages = {(i["stage"], i["backend"]): i for i in results}
+    assert stages["Skills", "arrow"]["error"] == "Stage Skills failed"
+    # What needs Skills is left out on that backend only
+    assert ("Proficiencies", "arrow") not in stages
+    assert ("Traits", "arrow") not in stages
+    assert stages["Traits", "pandas"]["identical"]
+    assert [i for i in results if "error" in i] == [stages["Skills", "arrow"]]
+
+
+def test_regressions_gate_time_memory_and_failures() -> None:
+    baseline = [
+        {"stage": "Skills", "scale": 1, "seconds": 1.0, "peak_rss_mib": 100.0},
+        {"stage": "Feats", "scale": 1, "seconds": 1.0, "peak_rss_mib": 100.0},
+        {"stage": "Spells", "scale": 1, "seconds": 1.0, "peak_rss_mib": 100.0},
+    ]
+    results = [
+        {"stage": "Skills", "scale": 1, "seconds": 1.5, "peak_rss_mib": 101.0},
+        {"stage": "Feats", "scale": 1, "seconds": 1.01, "peak_rss_mib": 100.0},
+        {"stage": "Spells", "scale": 1, "error": "Stage Spells failed"},
+        {"stage": "Skills", "scale": 10, "seconds": 9.0, "peak_rss_mib": 900.0},
+    ]
+    assert benchmark.regressions(results, baseline) == [
+        "Skills x1 seconds 1.000 -> 1.500 (+50%)",
+        "Spells x1 failed",
+    ]
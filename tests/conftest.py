@@ -0,0 +1,40 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from autodnd.benchmark import fixture_folder
+from autodnd.pipeline import run_pipeline
+from autodnd.utils.dataset_cache import clear_cache
+
+
+def use_root(monkeypatch: pytest.MonkeyPatch, root: Path) -> None:
+    """Make root the project root the rule sources (and so every data folder) are found under."""
+    monkeypatch.setattr("autodnd.utils.sources.get_project_root", lambda: root)
+    monkeypatch.setattr(
+        "autodnd.utils.sources.homebrew_folder", root / "data" / "homebrew"
+    )
+    monkeypatch.delenv("AUTODND_SOURCE", raising=False)
+
+
+@pytest.fixture(scope="session")
+def _processed_fixtures(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A project root with the fixture JSONs processed by every stage, built once per session."""
+    root = tmp_path_factory.mktemp("fixtures")
+    shutil.copytree(fixture_folder, root / "data" / "jsonrules")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        use_root(monkeypatch, root)
+        run_pipeline(max_workers=1)
+    clear_cache()
+    return root
+
+
+@pytest.fixture
+def fixture_root(
+    _processed_fixtures: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Path:
+    """A copy of the processed fixtures made the project root, free to be modified by the test."""
+    root = tmp_path / "root"
+    shutil.copytree(_processed_fixtures, root, symlinks=True)
+    use_root(monkeypatch, root)
+    return root
@@ -0,0 +1,96 @@
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from autodnd.utils.dataset_cache import (
+    DatasetCache,
+    DerivedCache,
+    cache_info,
+    clear_cache,
+    load,
+    load_json,
+)
+from autodnd.utils.ruleset_enum import RuleSet
+
+skill_columns = [
+    "index",
+    "name",
+    "desc",
+    "url",
+    "ability_score_index",
+    "ability_score_name",
+    "ability_score_url",
+]
+
+
+def test_load_json_parses_a_file_once(fixture_root: Path) -> None:
+    clear_cache()
+    full = load_json(RuleSet.SKILLS, ["name", "ability_score_name", "url"])
+    assert cache_info()["misses"] == 1
+    # A subset of the columns of an earlier load is served from the cache, as a copy
+    names = load_json(RuleSet.SKILLS, ["url", "name"], expected_columns=skill_columns)
+    assert cache_info()["hits"] == 1
+    assert names.columns.to_list() == ["name", "url"]
+    pd.testing.assert_frame_equal(names, full[["name", "url"]])
+    names.loc[0, "name"] = "Changed"
+    assert load_json(RuleSet.SKILLS, ["name"])["name"][0] == full["name"][0]
+
+    # Touching the file keeps the parsed frame, changing it doesn't
+    path = fixture_root / "data" / "jsonrules" / "Skills.json"
+    os.utime(path, ns=(1, 1))
+    load_json(RuleSet.SKILLS, ["name"])
+    assert cache_info()["misses"] == 1
+    records = json.loads(path.read_text())
+    path.write_text(json.dumps(records[:2]))
+    assert len(load_json(RuleSet.SKILLS, ["name"])) == 2
+    assert cache_info()["misses"] == 2
+
+
+def test_load_json_checks_the_schema(fixture_root: Path) -> None:
+    with pytest.raises(AssertionError, match="schema"):
+        load_json(RuleSet.SKILLS, ["name"], expected_columns=["index", "name"])
+
+
+def test_the_cache_evicts_the_least_recently_used(tmp_path: Path) -> None:
+    cache = DatasetCache(max_bytes=2500)
+    paths = [tmp_path / f"{i}.json" for i in range(3)]
+    for path in paths:
+        path.write_text("[]")
+
+    def parse() -> tuple[pd.DataFrame, set[str]]:
+        return pd.DataFrame({"x": range(100)}), set()
+
+    for path in paths[:2]:
+        cache.get(path, None, parse)
+    cache.get(paths[0], None, parse)
+    cache.get(paths[2], None, parse)
+    assert cache.info()["entries"] == 2
+    assert cache.nbytes <= cache.max_bytes
+    # The second file was the least recently used
+    cache.get(paths[0], None, parse)
+    assert (cache.hits, cache.misses) == (2, 3)
+    cache.get(paths[1], None, parse)
+    assert cache.misses == 4
+
+
+def test_derived_cache_rebuilds_when_a_table_changes(fixture_root: Path) -> None:
+    built: list[str] = []
+
+    def build(source: str) -> int:
+        built.append(source)
+        return len(load(RuleSet.SKILLS, source=source))
+
+    cache = DerivedCache([RuleSet.SKILLS], build)
+    assert cache.get() == cache.get() == 5
+    assert built == ["srd"]
+
+    path = fixture_root / "data" / "processed" / "Skills.parquet"
+    load(RuleSet.SKILLS).head(3).to_parquet(path)
+    assert cache.get() == 3
+    assert built == ["srd", "srd"]
+    cache.clear()
+    cache.get()
+    assert len(built) == 3
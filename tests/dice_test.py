@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from autodnd.utils.dice import compile_dice, distribution, expected_value, roll_many
+from autodnd.utils.game_utils import roll_dice
+
+
+@pytest.mark.parametrize(
+    "expression, mean",
+    [
+        ("2d6+3", 10.0),
+        ("d20", 10.5),
+        ("1d4-1", 1.5),
+        ("d20adv", 13.825),
+        ("d20dis", 7.175),
+        ("2d20kh1", 13.825),
+        ("4d6kh3", 15869 / 1296),
+        ("100d6", 350.0),
+        ("2d8 - 1d4 + 2", 8.5),
+    ],
+)
+def test_exact_means(expression: str, mean: float) -> None:
+    assert expected_value(expression) == pytest.approx(mean)
+    assert distribution(expression).probabilities.sum() == pytest.approx(1.0)
+
+
+def test_distribution_bounds_and_tails() -> None:
+    expression = compile_dice("2d6+3")
+    assert (expression.minimum, expression.maximum) == (5, 15)
+    assert distribution("d20").prob_at_least(11) == pytest.approx(0.5)
+    assert distribution("d20adv").prob_at_least(20) == pytest.approx(39 / 400)
+    assert distribution("4d6kh3").offset == 3
+
+
+@pytest.mark.parametrize("expression", ["2d6+3", "d20adv", "4d6kh3", "10d6", "2d4-3"])
+def test_roll_many_matches_the_distribution(expression: str) -> None:
+    compiled = compile_dice(expression)
+    rolls = roll_many(expression, 200_000, seed=0)
+    assert rolls.dtype == np.int64
+    assert rolls.min() >= compiled.minimum and rolls.max() <= compiled.maximum
+    assert rolls.mean() == pytest.approx(compiled.expected_value, abs=0.05)
+    # Seeded batches are reproducible
+    np.testing.assert_array_equal(rolls, roll_many(expression, 200_000, seed=0))
+
+
+@pytest.mark.parametrize(
+    "expression", ["", "2d", "d0", "0d6", "4d6kh5", "abc", "2d6+", "d20adv3"]
+)
+def test_bad_expressions_are_rejected(expression: str) -> None:
+    with pytest.raises(ValueError):
+        compile_dice(expression)
+
+
+def test_roll_dice() -> None:
+    assert {roll_dice() for _ in range(500)} == set(range(1, 7))
+    assert all(5 <= roll_dice("2d6+3") <= 15 for _ in range(200))
+    assert all(3 <= roll_dice("4d6kh3") <= 18 for _ in range(200))
+    with pytest.raises(ValueError):
+        roll_dice("2d")
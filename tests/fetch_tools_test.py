@@ -0,0 +1,97 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+import requests
+
+from autodnd.utils.fetch_tools import download_files, validators_filename
+
+# Files of the stand-in server, by path, with their ETag
+files = {"/Skills.json": (b'[{"name": "Stealth"}]', '"v1"')}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Conditional headers of every request, in the order received
+    seen: list[dict[str, str]] = []
+
+    def do_GET(self) -> None:
+        self.seen.append({i: self.headers[i] for i in self.headers})
+        if self.path not in files:
+            self.send_error(404)
+            return
+        body, etag = files[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def base_url() -> Iterator[str]:
+    """An offline stand-in for the rules server, on an ephemeral port."""
+    _Handler.seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_downloads_then_skips_unchanged_files(tmp_path: Path, base_url: str) -> None:
+    urls = {"Skills.json": f"{base_url}/Skills.json"}
+
+    assert download_files(tmp_path, urls) == {"Skills.json": True}
+    assert (tmp_path / "Skills.json").read_bytes() == files["/Skills.json"][0]
+    validators = json.loads((tmp_path / validators_filename).read_text())
+    assert validators == {"Skills.json": {"etag": '"v1"'}}
+
+    # The server answers 304 to the ETag sent along, the file is left alone
+    assert download_files(tmp_path, urls) == {"Skills.json": False}
+    assert _Handler.seen[-1]["If-None-Match"] == '"v1"'
+    assert (tmp_path / "Skills.json").read_bytes() == files["/Skills.json"][0]
+
+
+def test_missing_file_fails_after_saving_the_others(
+    tmp_path: Path, base_url: str
+) -> None:
+    urls = {
+        "Skills.json": f"{base_url}/Skills.json",
+        "Feats.json": f"{base_url}/Feats.json",
+    }
+    with pytest.raises(requests.RequestException, match="Feats.json"):
+        download_files(tmp_path, urls)
+
+    assert not (tmp_path / "Feats.json").exists()
+    assert (tmp_path / "Skills.json").exists()
+    validators = json.loads((tmp_path / validators_filename).read_text())
+    assert set(validators) == {"Skills.json"}
+
+
+def test_failed_write_keeps_the_validators_of_the_others(
+    tmp_path: Path, base_url: str
+) -> None:
+    # A directory where a download is to be written makes the write, not the request, fail
+    (tmp_path / "Spells.json").mkdir()
+    urls = {
+        "Skills.json": f"{base_url}/Skills.json",
+        "Spells.json": f"{base_url}/Skills.json",
+    }
+    with pytest.raises(OSError, match="Spells.json"):
+        download_files(tmp_path, urls)
+
+    validators = json.loads((tmp_path / validators_filename).read_text())
+    assert set(validators) == {"Skills.json"}
+    assert not [i for i in tmp_path.iterdir() if i.name.startswith(".Spells.json.")]
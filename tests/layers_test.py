@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from autodnd.layers import get_layered_index
+from autodnd.pipeline import run_pipeline
+from autodnd.utils.dataset_cache import load
+from autodnd.utils.ruleset_enum import RuleSet
+from autodnd.utils.sources import merge_layers
+
+
+def test_merge_layers_overrides_every_row_of_a_key() -> None:
+    srd = pd.DataFrame(
+        {"url": ["/a", "/a", "/b"], "name": ["A", "A", "B"], "classes": ["X", "Y", "X"]}
+    )
+    pack = pd.DataFrame(
+        {"url": ["/a", "/c"], "name": ["A+", "C"], "classes": ["Z"] * 2}
+    )
+    merged = merge_layers([srd, pack])
+    assert merged["name"].to_list() == ["B", "A+", "C"]
+    # Without an override key the rows are added up
+    keyless = merge_layers([pd.DataFrame({"x": [1]}), pd.DataFrame({"x": [2]})])
+    assert keyless["x"].to_list() == [1, 2]
+
+
+@pytest.fixture
+def pack(fixture_root: Path) -> str:
+    """A homebrew pack of two spells over the fixtures, one overriding an SRD spell and one without any of the
+    optional keys, processed."""
+    spells = json.loads(
+        (fixture_root / "data" / "jsonrules" / "Spells.json").read_text()
+    )
+    fire_bolt = {**spells[0], "desc": ["Fire Bolt does more magic."]}
+    frost_bolt = {
+        i: j
+        for i, j in spells[0].items()
+        if i not in ("damage", "attack_type", "material")
+    }
+    frost_bolt.update(
+        index="frost-bolt", name="Frost Bolt", url="/api/homebrew/spells/frost-bolt"
+    )
+    folder = fixture_root / "data" / "homebrew" / "pack" / "jsonrules"
+    folder.mkdir(parents=True)
+    (folder / "Spells.json").write_text(json.dumps([fire_bolt, frost_bolt]))
+    run_pipeline(max_workers=1, source="pack")
+    return "pack"
+
+
+def test_a_small_pack_is_layered_over_the_srd(pack: str) -> None:
+    srd = load(RuleSet.SPELLS)
+    merged = load(RuleSet.SPELLS, source=pack)
+    assert len(merged) == len(srd) + 1
+    by_name = merged.set_index("name")
+    assert by_name.loc["Fire Bolt", "desc"] == "Fire Bolt does more magic."
+    assert pd.isna(by_name.loc["Frost Bolt", "damage_type_name"])
+    # The SRD itself is untouched
+    assert srd.set_index("name").loc["Fire Bolt", "desc"] == "Fire Bolt does magic."
+
+    index = get_layered_index(pack)
+    assert index.sources(RuleSet.SPELLS) == {"srd": len(srd) - 1, "pack": 2}
+    assert [i["source"] for i in index.resolve(RuleSet.SPELLS, "fire bolt")] == ["pack"]
+    assert index.resolve(RuleSet.SPELLS, "Magic Missile")[0]["source"] == "srd"
+    assert index.frame(RuleSet.SPELLS)["name"].to_list() == merged["name"].to_list()
+
+
+def test_a_pack_cannot_add_unknown_keys(fixture_root: Path) -> None:
+    folder = fixture_root / "data" / "homebrew" / "pack" / "jsonrules"
+    folder.mkdir(parents=True)
+    spells = json.loads(
+        (fixture_root / "data" / "jsonrules" / "Spells.json").read_text()
+    )
+    (folder / "Spells.json").write_text(json.dumps([{**spells[0], "mana": 3}]))
+    with pytest.raises(RuntimeError, match="Spells"):
+        run_pipeline(max_workers=1, source="pack")
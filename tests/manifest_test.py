@@ -0,0 +1,58 @@
+import json
+import os
+from pathlib import Path
+
+from autodnd.pipeline import run_pipeline, scripts_folder
+from autodnd.utils.manifest import (
+    code_dependencies,
+    is_up_to_date,
+    manifest_path,
+    read_manifest,
+)
+from autodnd.utils.project_root import get_project_root
+from autodnd.utils.ruleset_enum import RuleSet
+
+
+def test_code_dependencies_follow_the_autodnd_imports() -> None:
+    root = get_project_root()
+    found = code_dependencies(scripts_folder / "process_traits.py")
+    assert scripts_folder / "process_traits.py" in found
+    # Imported by the script, and by the modules it imports
+    assert root / "autodnd" / "utils" / "reference_resolver.py" in found
+    assert root / "autodnd" / "utils" / "dataset_cache.py" in found
+    assert root / "autodnd" / "utils" / "manifest.py" in found
+    assert root / "autodnd" / "__init__.py" in found
+    assert root / "autodnd" / "simulation.py" not in found
+    assert all(i.exists() for i in found)
+
+
+def test_only_the_changed_stage_and_its_dependents_rebuild(fixture_root: Path) -> None:
+    # The manifests of the fixtures record where they were processed, the first run rebuilds everything
+    assert len(run_pipeline(max_workers=1)) == len(RuleSet)
+    assert run_pipeline(max_workers=1) == {}
+
+    # Touching a JSON without changing it keeps the stages up to date
+    source = fixture_root / "data" / "jsonrules" / "Proficiencies.json"
+    os.utime(source)
+    assert run_pipeline(max_workers=1) == {}
+
+    records = json.loads(source.read_text())
+    records[0]["name"] += " (revised)"
+    source.write_text(json.dumps(records))
+    assert set(run_pipeline(max_workers=1)) == {RuleSet.PROFICIENCIES, RuleSet.TRAITS}
+    assert run_pipeline(max_workers=1) == {}
+
+
+def test_a_changed_output_is_rebuilt(fixture_root: Path) -> None:
+    run_pipeline(max_workers=1)
+    output = fixture_root / "data" / "processed" / "Skills.parquet"
+    fingerprint = read_manifest(output)
+    assert fingerprint is not None and manifest_path(output).exists()
+    fingerprint.pop("output")
+    assert is_up_to_date(output, fingerprint)
+
+    output.write_bytes(output.read_bytes() + b"\0")
+    assert not is_up_to_date(output, fingerprint)
+    assert set(run_pipeline(max_workers=1, targets=[RuleSet.SKILLS])) == {
+        RuleSet.SKILLS
+    }
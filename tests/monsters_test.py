@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pytest
+
+from autodnd.monsters import find_monsters, get_monster_index
+from autodnd.utils.dataset_cache import load
+from autodnd.utils.ruleset_enum import RuleSet
+
+
+def names(**filters) -> list[str]:
+    return find_monsters(**filters)["name"].to_list()
+
+
+def test_the_stage_splits_damage_types_and_notes(fixture_root: Path) -> None:
+    monsters = load(RuleSet.MONSTERS).set_index("name")
+    mummy = monsters.loc["Mummy"]
+    # "bludgeoning, piercing, and slashing from nonmagical attacks"
+    assert list(mummy["resistant_to"]) == ["Piercing", "Bludgeoning", "Slashing"]
+    assert list(mummy["vulnerable_to"]) == ["Fire"]
+    assert "Necrotic: Most Undead" in list(mummy["noted_weak_against"])
+    assert list(monsters.loc["Salamander"]["noted_strong_against"]) == [
+        "Cold: Salamanders"
+    ]
+    assert list(monsters.loc["Goblin"]["noted_weak_against"]) == []
+    assert monsters.loc["Ghost", "speed_fly"] == 40
+    assert monsters.loc["Adult Black Dragon", "darkvision"] == 120
+
+
+def test_find_monsters(fixture_root: Path) -> None:
+    # Ordered by challenge rating then name
+    assert names(type="Undead", challenge_rating=(3, 5)) == [
+        "Mummy",
+        "Wight",
+        "Ghost",
+        "Wraith",
+    ]
+    assert names(vulnerable_to="radiant") == ["Shadow"]
+    assert names(immune_to=["acid", "psychic"], challenge_rating=(None, 10)) == [
+        "Clay Golem"
+    ]
+    assert names(resistant_to="Slashing", speed_fly=(1, None)) == ["Swarm of Bats"]
+    assert names(size="Gargantuan") == []
+
+
+def test_the_noted_damage_types_can_be_queried(fixture_root: Path) -> None:
+    assert names(noted_strong_against="cold") == ["Salamander"]
+    assert names(noted_strong_against=["Radiant", "Fire"]) == ["Ice Mephit", "Shadow"]
+    assert len(names(noted_weak_against="Necrotic")) == 6
+    assert names(noted_weak_against="necrotic", vulnerable_to="fire") == ["Mummy"]
+    # Keyed by the damage type, not by the creatures of the note
+    assert names(noted_weak_against="Undead") == []
+
+
+def test_ranking(fixture_root: Path) -> None:
+    assert names(rank_by="hit_points", k=2) == ["Adult Black Dragon", "Clay Golem"]
+    # Missing values come last either way
+    flying = names(rank_by="speed_fly", ascending=True)
+    assert flying[:2] == ["Swarm of Bats", "Ice Mephit"]
+    assert names(rank_by="speed_fly", k=1) == ["Adult Black Dragon"]
+    with pytest.raises(ValueError, match="rank by"):
+        find_monsters(rank_by="name")
+
+
+def test_the_index(fixture_root: Path) -> None:
+    index = get_monster_index()
+    assert index is get_monster_index()
+    with pytest.raises(ValueError, match="noted_weak_against"):
+        index.rows(weak_against="necrotic")
+    # The row numbers of the processed table are kept
+    monsters = load(RuleSet.MONSTERS)
+    assert (
+        index.query(type="dragon").index.to_list()
+        == monsters.index[monsters["name"] == "Adult Black Dragon"].to_list()
+    )
@@ -0,0 +1,51 @@
+import json
+import runpy
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from autodnd.pipeline import scripts_folder
+from autodnd.utils.reference_resolver import ReferenceIndex
+
+
+@pytest.fixture
+def index() -> ReferenceIndex:
+    df = pd.DataFrame(
+        {
+            "url": ["/a", "/b", "/a", "/c"],
+            "name": ["A", "B", "A again", "C"],
+        }
+    )
+    return ReferenceIndex(df, "url")
+
+
+def test_lookups(index: ReferenceIndex) -> None:
+    assert len(index) == 3
+    assert "/b" in index and "/d" not in index
+    # The first row of a duplicated key wins
+    np.testing.assert_array_equal(index.positions(["/c", "/a", "/d"]), [3, 0, -1])
+    assert index.record("/a")["name"] == "A"
+    assert index.get("/b", "name") == "B"
+    assert index.get("/d", "name", "missing") == "missing"
+    resolved = index.resolve(["/c", "/d"], "name")
+    assert resolved[0] == "C" and pd.isna(resolved[1])
+
+
+def test_a_missing_record_is_a_key_error(index: ReferenceIndex) -> None:
+    with pytest.raises(KeyError, match="No row with url == '/d'") as raised:
+        index.record("/d")
+    # Not chained to the pandas lookup error
+    assert raised.value.__cause__ is None and raised.value.__suppress_context__
+
+
+def test_proficiencies_fail_on_a_missing_reference(fixture_root: Path) -> None:
+    source = fixture_root / "data" / "jsonrules" / "Proficiencies.json"
+    records = json.loads(source.read_text())
+    records[0]["reference"]["url"] = "/api/2014/skills/juggling"
+    source.write_text(json.dumps(records))
+    with pytest.raises(AssertionError, match="skills/juggling"):
+        runpy.run_path(
+            str(scripts_folder / "process_proficiencies.py"), run_name="__main__"
+        )
@@ -0,0 +1,73 @@
+import math
+from pathlib import Path
+
+import pytest
+
+from autodnd.search import b, get_index, k1, search, segment_path, tokenize
+from autodnd.utils.dataset_cache import load
+from autodnd.utils.ruleset_enum import RuleSet
+
+
+def test_tokenize_stems_and_drops_stop_words() -> None:
+    assert tokenize("The creature is Grappled, grappling and grapples!") == [
+        "creatur",
+        "grappl",
+        "grappl",
+        "grappl",
+    ]
+
+
+def test_bm25_ranking(fixture_root: Path) -> None:
+    found = search("grapple")
+    # Matches in the titles count twice and rank first
+    assert found[["table", "name"]].head(2).values.tolist() == [
+        ["Conditions", "Grappled"],
+        ["Feats", "Grappler"],
+    ]
+    assert found["score"].is_monotonic_decreasing
+    assert len(search("grapple", k=2)) == 2
+    assert search("xyzzy").empty
+
+    # The BM25 score of a one term query, from the counts of the indexed document
+    index = get_index()
+    segment = index.segments[RuleSet.CONDITIONS]
+    row = int(found["row"][0])
+    doc_ids, term_freqs = segment.postings("grappl")
+    doc_freq = sum(len(i.postings("grappl")[0]) for i in index.segments.values())
+    idf = math.log(1 + (index.num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+    tf = int(term_freqs[list(doc_ids).index(row)])
+    norm = k1 * (1 - b + b * segment.doc_lengths[row] / index.avg_length)
+    assert found["score"][0] == pytest.approx(idf * tf * (k1 + 1) / (tf + norm))
+    # Rows line up with the processed table
+    conditions = load(RuleSet.CONDITIONS)
+    assert conditions["name"][row] == "Grappled"
+
+
+def test_filters(fixture_root: Path) -> None:
+    assert search("fire")["name"].to_list()[:2] == ["Fire Bolt", "Fire"]
+    # Tables without the filtered column don't match
+    assert search("fire", level=0)["name"].to_list() == ["Fire Bolt"]
+    assert search("fire", level=[1, 2]).empty
+    assert search("fire", level=range(3))["name"].to_list() == ["Fire Bolt"]
+    assert set(search("fire", tables=[RuleSet.DAMAGE_TYPES])["table"]) == {
+        "Damage-Types"
+    }
+    assert search("damage", class_name="Wizard")["table"].unique().tolist() == [
+        "Features"
+    ]
+    with pytest.raises(ValueError, match="Can't filter on \\['school'\\]"):
+        search("fire", school="Evocation")
+
+
+def test_a_reprocessed_table_is_reindexed(fixture_root: Path) -> None:
+    index = get_index()
+    path = fixture_root / "data" / "processed" / "Conditions.parquet"
+    conditions = load(RuleSet.CONDITIONS)
+    conditions.loc[0, "desc"] = "Held fast by a kraken."
+    conditions.to_parquet(path)
+
+    assert get_index() is not index
+    assert (
+        segment_path(RuleSet.CONDITIONS).stat().st_mtime_ns >= path.stat().st_mtime_ns
+    )
+    assert search("kraken")["name"].to_list() == [conditions["name"][0]]
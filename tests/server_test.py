@@ -0,0 +1,182 @@
+import asyncio
+import json
+import socket
+import threading
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pytest
+
+from autodnd.server import Address, QueryServer, request, start_server
+
+
+@pytest.fixture
+def processed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A project root with two small processed tables and no homebrew source."""
+    monkeypatch.setattr("autodnd.utils.sources.get_project_root", lambda: tmp_path)
+    monkeypatch.setattr(
+        "autodnd.utils.sources.homebrew_folder", tmp_path / "data" / "homebrew"
+    )
+    monkeypatch.delenv("AUTODND_SOURCE", raising=False)
+    folder = tmp_path / "data" / "processed"
+    folder.mkdir(parents=True)
+    pd.DataFrame(
+        {
+            "index": ["fireball", "magic-missile", "shield", "cure-wounds"],
+            "name": ["Fireball", "Magic Missile", "Shield", "Cure Wounds"],
+            "url": [
+                f"/api/spells/{i}"
+                for i in ("fireball", "magic-missile", "shield", "cure-wounds")
+            ],
+            "level": [3, 1, 1, 1],
+            "school_name": ["Evocation", "Evocation", "Abjuration", "Evocation"],
+            "classes": [["Wizard"], ["Wizard"], ["Wizard"], ["Cleric", "Druid"]],
+        }
+    ).to_parquet(folder / "Spells.parquet")
+    pd.DataFrame(
+        {
+            "index": ["blinded", "prone"],
+            "name": ["Blinded", "Prone"],
+            "url": ["/api/conditions/blinded", "/api/conditions/prone"],
+            "desc": ["Can't see.", "Lying on the ground."],
+        }
+    ).to_parquet(folder / "Conditions.parquet")
+    return folder
+
+
+@pytest.fixture(params=["tcp", "unix"])
+def address(
+    request: pytest.FixtureRequest, processed: Path, tmp_path: Path
+) -> Iterator[Address]:
+    """A server running in a background event loop, on an ephemeral port or a Unix socket."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    listen: Address = (
+        ("127.0.0.1", 0) if request.param == "tcp" else tmp_path / "server.sock"
+    )
+    server = asyncio.run_coroutine_threadsafe(
+        start_server(listen, QueryServer()), loop
+    ).result()
+    yield server.sockets[0].getsockname() if request.param == "tcp" else listen
+    server.close()
+    asyncio.run_coroutine_threadsafe(server.wait_closed(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_resolve_batches_keys_over_tables(address: Address) -> None:
+    results = request(
+        "/resolve",
+        {
+            "keys": ["fireball", "PRONE", "/api/spells/shield", "Unknown"],
+            "columns": ["name"],
+        },
+        address,
+    )["results"]
+    assert [i["key"] for i in results] == [
+        "fireball",
+        "PRONE",
+        "/api/spells/shield",
+        "Unknown",
+    ]
+    assert [[(j["table"], j["record"]) for j in i["matches"]] for i in results] == [
+        [("Spells", {"name": "Fireball"})],
+        [("Conditions", {"name": "Prone"})],
+        [("Spells", {"name": "Shield"})],
+        [],
+    ]
+    only_conditions = request(
+        "/resolve", {"keys": ["fireball"], "tables": ["Conditions"]}, address
+    )
+    assert only_conditions["results"][0]["matches"] == []
+
+
+def test_select(address: Address) -> None:
+    results = request(
+        "/select",
+        {
+            "queries": [
+                {
+                    "table": "Spells",
+                    "where": {"level": 1, "school_name": "evocation"},
+                    "columns": ["name"],
+                },
+                {"table": "Spells", "where": {"level": [1, 3]}, "limit": 2},
+            ]
+        },
+        address,
+    )["results"]
+    assert results[0] == [
+        {"row": 1, "record": {"name": "Magic Missile"}},
+        {"row": 3, "record": {"name": "Cure Wounds"}},
+    ]
+    assert [i["row"] for i in results[1]] == [0, 1]
+
+
+def test_repeated_requests_hit_the_cache(address: Address) -> None:
+    payload = {"keys": ["Blinded"]}
+    first = request("/resolve", payload, address)
+    assert request("/resolve", payload, address) == first
+    cache = request("/stats", address=address)["cache"]
+    assert (cache["hits"], cache["misses"], cache["entries"]) == (1, 1, 1)
+
+
+@pytest.mark.parametrize(
+    "path, payload, status",
+    [
+        ("/nothing", {}, 404),
+        ("/resolve", None, 405),
+        ("/resolve", {"keys": "Fireball"}, 400),
+        ("/records", {"table": "Monsters", "rows": [0]}, 400),
+        (
+            "/select",
+            {"queries": [{"table": "Spells", "where": {"classes": "Wizard"}}]},
+            400,
+        ),
+    ],
+)
+def test_error_statuses(
+    address: Address, path: str, payload: dict, status: int
+) -> None:
+    with pytest.raises(RuntimeError, match=f"^{status} "):
+        request(path, payload, address)
+
+
+def _raw(address: Address, data: bytes) -> bytes:
+    if isinstance(address, tuple):
+        connection = socket.create_connection(address, timeout=10)
+    else:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(10)
+        connection.connect(str(address))
+    with connection:
+        connection.sendall(data)
+        return connection.recv(1024)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"POST /resolve HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+        b"POST /resolve HTTP/1.1\r\nContent-Length: -4\r\n\r\n",
+        b"POST /resolve HTTP/1.1\r\nContent-Length: 7\r\n\r\n{oops}}",
+        b"GARBAGE\r\n\r\n",
+    ],
+)
+def test_malformed_requests_are_bad_requests(address: Address, data: bytes) -> None:
+    assert _raw(address, data).startswith(b"HTTP/1.1 400 ")
+
+
+def test_body_over_the_limit_is_refused(
+    address: Address, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("autodnd.server.max_body_bytes", 16)
+    body = json.dumps({"keys": ["Fireball"] * 10}).encode()
+    response = _raw(
+        address,
+        b"POST /resolve HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body),
+    )
+    assert response.startswith(b"HTTP/1.1 413 ")
@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from autodnd.simulation import (
+    StatBlock,
+    attack_damage,
+    expected_attack_damage,
+    load_weapons,
+    simulate_duel,
+    sweep_weapons,
+)
+
+knight = StatBlock(
+    "knight", armor_class=18, hit_points=52, attack_bonus=5, damage="2d6+3"
+)
+goblin = StatBlock(
+    "goblin", armor_class=15, hit_points=7, attack_bonus=4, damage="1d6+2"
+)
+weapons = pd.DataFrame({"name": ["Dagger", "Greataxe"], "damage_dice": ["1d4", "1d12"]})
+
+
+def test_attack_damage_converges_to_the_exact_expectation() -> None:
+    for advantage in (-1, 0, 1):
+        dealt = attack_damage("1d8+3", 5, 15, 200_000, seed=0, advantage=advantage)
+        assert dealt.min() == 0
+        assert dealt.mean() == pytest.approx(
+            expected_attack_damage("1d8+3", 5, 15, advantage), rel=0.02
+        )
+
+
+def test_simulate_duel() -> None:
+    result = simulate_duel(knight, goblin, 20_000, seed=0)
+    assert result["knight_wins"] + result["goblin_wins"] + result["unfinished"] == 1
+    assert result["knight_wins"] > 0.95
+    assert result["mean_rounds"] >= 1
+    assert simulate_duel(knight, goblin, 20_000, seed=0) == result
+
+
+def test_a_duel_without_damage_never_ends() -> None:
+    harmless = StatBlock("pacifist", 10, 10, 0, "1d1-5")
+    result = simulate_duel(harmless, harmless, 100, seed=0, max_rounds=7)
+    assert result["unfinished"] == 1.0
+    assert result["mean_rounds"] == 7
+
+
+def test_sweep_weapons() -> None:
+    result = sweep_weapons(
+        weapons, levels=[1, 9], armor_classes=[10, 18], n=50_000, seed=0
+    )
+    assert len(result) == 2 * 2 * 2
+    assert result.attrs["rolls_per_second"] > 0
+    cell = result.set_index(["weapon", "level", "armor_class"])
+    # Proficiency bonus +2 at level 1, +4 at level 9, with the +3 ability modifier
+    assert cell.loc[("Greataxe", 1, 10), "expected_damage"] == pytest.approx(
+        expected_attack_damage("1d12+3", 5, 10), rel=0.03
+    )
+    assert cell.loc[("Dagger", 9, 18), "hit_rate"] == pytest.approx(0.5, abs=0.01)
+    greataxe = result[result["weapon"] == "Greataxe"].set_index(
+        ["level", "armor_class"]
+    )["expected_damage"]
+    assert greataxe[(9, 18)] < greataxe[(9, 10)]
+
+
+def test_sweep_weapons_over_processes_matches_in_process() -> None:
+    def sweep(max_workers: int) -> pd.DataFrame:
+        return sweep_weapons(
+            weapons, [1, 5], [12, 16], n=5_000, seed=1, max_workers=max_workers
+        )
+
+    pd.testing.assert_frame_equal(sweep(2), sweep(1))
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_sweeping_no_weapon_is_empty(max_workers: int) -> None:
+    result = sweep_weapons(weapons.iloc[:0], max_workers=max_workers)
+    assert result.empty
+    assert "expected_damage" in result.columns
+
+
+def test_load_weapons(fixture_root: Path) -> None:
+    loaded = load_weapons()
+    assert {"Dagger", "Longsword"} <= set(loaded["name"])
+    assert loaded["damage_dice"].notna().all()
+    assert load_weapons(two_handed=True)["name"].to_list() == ["Longsword"]
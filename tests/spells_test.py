@@ -0,0 +1,65 @@
+import json
+import runpy
+from pathlib import Path
+
+import pytest
+
+from autodnd.pipeline import scripts_folder
+from autodnd.spells import find_spells, get_spell_index
+from autodnd.utils.dataset_cache import load
+from autodnd.utils.ruleset_enum import RuleSet
+
+
+def names(**filters) -> list[str]:
+    return find_spells(**filters)["name"].to_list()
+
+
+def test_find_spells(fixture_root: Path) -> None:
+    # Ordered by level then name
+    assert names(classes="Wizard", max_level=1) == [
+        "Fire Bolt",
+        "Detect Magic",
+        "Magic Missile",
+        "Shield",
+    ]
+    assert names(classes="wizard", school="Evocation", min_level=1) == [
+        "Magic Missile",
+        "Fireball",
+    ]
+    assert names(classes=["Cleric", "Sorcerer"], level=[0, 3]) == [
+        "Fire Bolt",
+        "Fireball",
+    ]
+    assert names(subclasses="Lore") == ["Cure Wounds"]
+    assert names(ritual=True) == ["Detect Magic"]
+    assert names(concentration=True, school="necromancy") == ["Animate Dead"]
+    assert names(classes="Bard") == []
+
+
+def test_spell_index(fixture_root: Path) -> None:
+    index = get_spell_index()
+    assert index is get_spell_index()
+    assert index.get("Fireball")["level"] == 3
+    assert "wizard" in index.classes and "evocation" in index.schools
+    with pytest.raises(KeyError):
+        index.get("Meteor Swarm")
+    # The row numbers of the processed table are kept
+    spells = load(RuleSet.SPELLS)
+    assert (
+        index.find(level=9).index.to_list()
+        == spells.index[spells["name"] == "Wish"].to_list()
+    )
+
+
+def test_new_level_keys_pass_the_schema_check(fixture_root: Path) -> None:
+    source = fixture_root / "data" / "jsonrules" / "Spells.json"
+    spells = json.loads(source.read_text())
+    fireball = next(i for i in spells if i["name"] == "Fireball")
+    fireball["damage"]["damage_at_slot_level"]["10"] = "13d6"
+    fireball["heal_at_slot_level"] = {"3": "1d4"}
+    source.write_text(json.dumps(spells))
+    runpy.run_path(str(scripts_folder / "process_spells.py"), run_name="__main__")
+
+    processed = get_spell_index().get("Fireball")
+    assert processed["damage_at_slot_level"][-1] == {"level": 10, "dice": "13d6"}
+    assert list(processed["heal_at_slot_level"]) == [{"level": 3, "dice": "1d4"}]
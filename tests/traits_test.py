@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from autodnd.utils.dataset_cache import load
+from autodnd.utils.ruleset_enum import RuleSet
+
+
+def test_proficiencies_are_typed_reference_structs(fixture_root: Path) -> None:
+    folder = fixture_root / "data" / "processed"
+    reference = pq.read_schema(folder / "Proficiencies.parquet").field("reference")
+    element = pq.read_schema(folder / "Traits.parquet").field("proficiencies").type
+    assert pa.types.is_list(element)
+    assert element.value_type.field("reference").type == reference.type
+    assert element.value_type.field("reference_name").type == pa.string()
+
+    traits = load(RuleSet.TRAITS)
+    proficiencies = [j for i in traits["proficiencies"] for j in i]
+    assert proficiencies
+    by_name = {i["name"]: i for i in proficiencies}
+    assert all(isinstance(i, dict) for i in proficiencies)
+    assert {i["reference_type"] for i in proficiencies} <= {
+        "equipment",
+        "equipment-categories",
+        "ability-scores",
+        "skills",
+    }
+    # Fields of other kinds of reference are there, null
+    skill = next(i for i in by_name.values() if i["reference_type"] == "skills")
+    assert skill["reference"]["weapon_category"] is None
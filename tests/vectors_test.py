@@ -0,0 +1,35 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from autodnd.vectors import VectorIndex, _kmeans, chunk_tables
+
+
+def test_chunks_all_have_text(fixture_root: Path) -> None:
+    chunks = chunk_tables()
+    assert len(chunks)
+    assert chunks["text"].str.strip().astype(bool).all()
+    # Levels rows have neither a title nor prose
+    assert "Levels" not in set(chunks["table"])
+
+
+def test_kmeans_never_makes_nan_centroids() -> None:
+    vectors = np.zeros((6, 4), dtype=np.float32)
+    vectors[0, 0] = vectors[1, 1] = 1
+    centroids, assignment = _kmeans(vectors, 4, np.random.default_rng(0))
+    assert not np.isnan(centroids).any()
+    assert len(centroids) == 2
+    assert len(assignment) == len(vectors)
+
+
+@pytest.mark.parametrize("query", ["grapple a creature", "fire damage", "longsword"])
+def test_default_nprobe_finds_the_exact_hits(fixture_root: Path, query: str) -> None:
+    index = VectorIndex.build()
+    assert not np.isnan(index.centroids).any()
+    assert np.asarray(index.vectors).any(axis=1).all()
+    exact = index.search(query, k=5, nprobe=None)
+    found = index.search(query, k=5)
+    assert len(exact) and exact["score"].iloc[0] > 0
+    assert found["chunk"].iloc[0] == exact["chunk"].iloc[0]
+    assert len(set(found["chunk"]) & set(exact["chunk"])) >= 3